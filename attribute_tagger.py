@@ -0,0 +1,242 @@
+import re
+import threading
+from metrics import registry
+
+# Vocabularies matched against product titles, phrase to the value written to the item. Plural forms are
+# matched through the singular, so only singulars are listed.
+COLORS = {phrase: phrase.title() for phrase in [
+    "black", "white", "ivory", "cream", "off white", "beige", "tan", "camel", "khaki", "brown", "chocolate",
+    "grey", "charcoal", "silver", "gold", "rose gold", "red", "burgundy", "wine", "maroon", "pink", "blush",
+    "fuchsia", "magenta", "coral", "orange", "rust", "peach", "yellow", "mustard", "green", "olive", "sage",
+    "emerald", "mint", "teal", "turquoise", "aqua", "blue", "navy", "navy blue", "light blue", "royal blue",
+    "cobalt", "indigo", "denim", "purple", "lavender", "lilac", "violet", "plum", "mauve", "nude", "multi",
+    "multicolor", "leopard", "animal print", "floral", "jade", "neon", "pastel", "metallic",
+]}
+COLORS.update({"gray": "Grey", "multi color": "Multicolor", "multicolour": "Multicolor", "colour block": "Color Block",
+               "color block": "Color Block", "light wash": "Light Wash", "dark wash": "Dark Wash",
+               "hellgruen": "Green"})
+
+TYPES = {
+    "dress": "Dress", "maxi dress": "Dress", "midi dress": "Dress", "mini dress": "Dress", "gown": "Dress",
+    "skirt": "Skirt", "top": "Top", "tank top": "Tank Top", "tank": "Tank Top", "crop top": "Top",
+    "tube top": "Top", "camisole": "Top", "cami": "Top", "blouse": "Blouse", "shirt": "Shirt",
+    "t shirt": "T-Shirt", "tee": "T-Shirt", "polo": "Shirt", "bodysuit": "Bodysuit", "sweater": "Sweater",
+    "pullover": "Sweater", "cardigan": "Sweater", "jumper": "Sweater", "hoodie": "Sweatshirt",
+    "sweatshirt": "Sweatshirt", "jacket": "Jacket", "blazer": "Blazer", "coat": "Coat", "trench coat": "Coat",
+    "parka": "Coat", "vest": "Vest", "jean": "Jeans", "pant": "Pants", "trouser": "Pants", "legging": "Leggings",
+    "jogger": "Pants", "short": "Shorts", "jumpsuit": "Jumpsuit", "romper": "Romper", "overall": "Overalls",
+    "bikini": "Swimwear", "swimsuit": "Swimwear", "one piece": "Swimwear", "swim": "Swimwear", "bra": "Lingerie",
+    "bralette": "Lingerie", "chemise": "Lingerie", "lingerie": "Lingerie", "corset": "Corset", "panty": "Lingerie",
+    "brief": "Underwear", "boxer": "Underwear", "kimono": "Kimono", "scarf": "Scarf", "shoe": "Shoe",
+    "sneaker": "Shoe", "running shoe": "Shoe", "boot": "Boots", "sandal": "Sandals", "heel": "Heels",
+    "pump": "Heels", "loafer": "Shoe", "ballet flat": "Shoe", "slipper": "Shoe", "bag": "Bag", "handbag": "Handbag",
+    "crossbody": "Bag", "crossbody bag": "Bag", "tote": "Bag", "clutch": "Bag", "backpack": "Bag",
+    "wallet": "Wallet", "sunglass": "Sunglasses", "hat": "Hat", "cap": "Hat", "beanie": "Hat", "belt": "Belt",
+    "ring": "Jewelry", "earring": "Jewelry", "necklace": "Jewelry", "bracelet": "Jewelry", "jewelry": "Jewelry",
+    "watch": "Watch", "sock": "Socks",
+}
+
+MATERIALS = {phrase: phrase.title() for phrase in [
+    "cotton", "organic cotton", "linen", "silk", "satin", "wool", "merino", "cashmere", "alpaca", "leather",
+    "faux leather", "vegan leather", "suede", "denim", "polyester", "nylon", "viscose", "rayon", "modal",
+    "lyocell", "tencel", "spandex", "elastane", "lace", "mesh", "velvet", "chiffon", "crepe", "jersey",
+    "fleece", "sherpa", "tweed", "corduroy", "canvas", "knit", "crochet", "sequin", "crystal", "14k gold",
+    "sterling silver", "gold plated",
+]}
+
+GENDERS = {
+    "women": "Women", "woman": "Women", "womens": "Women", "ladies": "Women", "lady": "Women", "female": "Women",
+    "her": "Women", "maternity": "Women", "men": "Men", "man": "Men", "mens": "Men", "male": "Men", "him": "Men",
+    "unisex": "Unisex", "kid": "Kids", "girl": "Kids", "boy": "Kids", "baby": "Kids", "toddler": "Kids",
+}
+
+# Phrases consumed without tagging anything, so "Short Sleeve Tee" is not read as shorts
+NEUTRAL_PHRASES = ["short sleeve", "long sleeve", "cap sleeve", "top handle", "flat front", "tank strap"]
+
+# Garment types only made for women, as the LLM prompt assumes for skirts, corsets and dresses
+WOMEN_TYPES = {"Dress", "Skirt", "Blouse", "Bodysuit", "Lingerie", "Corset", "Swimwear", "Handbag", "Heels"}
+
+# Words after which a title describes details rather than the product itself, e.g. "Romper Without Tube Top"
+DETAIL_WORDS = {"with", "without", "featuring", "plus", "incl", "including"}
+
+# Item keys filled by the tagger, as spelled by extractPage: the JSON-LD extractor writes TYPE, the meta
+# tag extractor Type
+FIELD_KEYS = {"BRAND": ("BRAND",), "COLOR": ("COLOR",), "TYPE": ("TYPE", "Type"), "MATERIAL": ("MATERIAL",),
+              "GENDER": ("GENDER",)}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+registry.describe("attribute_tagger_fields_total", "counter", "Item fields filled by the local attribute tagger.")
+
+########### FUNCTION DEFINITIONS ############
+
+def itemKey(item, field):
+    """
+    :param item: item dictionary as returned by extractPage
+    :param field: tagger field, one of FIELD_KEYS
+    :return: the key the item holds the field under, or None if it has none
+    """
+    return next((key for key in FIELD_KEYS[field] if key in item), None)
+
+
+def missingKeys(item, fields=None):
+    """
+    :param item: item dictionary as returned by extractPage
+    :param fields: tagger fields to look at, defaults to all of FIELD_KEYS
+    :return: list of the item keys of those fields that are still None
+    """
+    return [key for field in fields or FIELD_KEYS if (key := itemKey(item, field)) is not None and item[key] is None]
+
+
+def tokenize(text):
+    """
+    :param text: product title or vocabulary phrase
+    :return: list of lowercase word tokens, with "women's" read as "women" and "t-shirt" as "t shirt"
+    """
+    text = text.lower().replace("’", "'").replace("'s", "")
+    return TOKEN_PATTERN.findall(text)
+
+
+class PhraseTrie:
+    """
+    Trie over word tokens holding every vocabulary phrase, so a title is matched against all the phrases
+    of all the fields in one left-to-right pass.
+    """
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, phrase, field=None, value=None):
+        node = self._root
+        for token in tokenize(phrase):
+            node = node.setdefault(token, {})
+        fields = node.setdefault(None, {})
+        if field is not None:
+            fields[field] = value
+
+    def matches(self, tokens):
+        """
+        Scans the tokens once, taking the longest phrase starting at each position and continuing after it.
+
+        :param tokens: list of word tokens
+        :return: list of (position, dictionary of field to value) for every phrase found
+        """
+        found = []
+        i = 0
+        while i < len(tokens):
+            node, end, fields = self._root, i, None
+            for j in range(i, len(tokens)):
+                node = self._child(node, tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    end, fields = j + 1, node[None]
+            if fields is None:
+                i += 1
+                continue
+            found.append((i, fields))
+            i = end
+        return found
+
+    @staticmethod
+    def _child(node, token):
+        # Plurals fall back to the singular the vocabularies are written in
+        child = node.get(token)
+        if child is None and token.endswith("s") and len(token) > 3:
+            child = node.get(token[:-1])
+            if child is None and token.endswith("es"):
+                child = node.get(token[:-2])
+        return child
+
+
+class AttributeTagger:
+    """
+    Fills the brand, colour, garment type, material and gender of an item from its title with compiled
+    vocabularies and a brand dictionary learned from past extractions, so the LLM only has to be asked
+    for what is left.
+    """
+
+    def __init__(self, brands=()):
+        """
+        :param brands: brand names known from past extractions
+        """
+        self._trie = PhraseTrie()
+        self._lock = threading.Lock()
+        self.brands = set()
+        for vocabulary, field in ((COLORS, "COLOR"), (TYPES, "TYPE"), (MATERIALS, "MATERIAL"), (GENDERS, "GENDER")):
+            for phrase, value in vocabulary.items():
+                self._trie.add(phrase, field, value)
+        for phrase in NEUTRAL_PHRASES:
+            self._trie.add(phrase)
+        for brand in brands:
+            self.addBrand(brand)
+
+    def addBrand(self, brand):
+        """
+        :param brand: brand name as it should be written to the item
+        """
+        if not isinstance(brand, str):
+            return
+        brand = brand.strip()
+        tokens = tokenize(brand)
+        # Single short tokens such as "AE" would match far too many titles
+        if not tokens or (len(tokens) == 1 and len(tokens[0]) < 3) or brand in self.brands:
+            return
+        with self._lock:
+            self.brands.add(brand)
+            self._trie.add(brand, "BRAND", brand)
+
+    def learn(self, items):
+        """
+        Adds the brands of already extracted items to the brand dictionary.
+
+        :param items: iterable of item dictionaries
+        """
+        for item in items:
+            if isinstance(item, dict):
+                self.addBrand(item.get("BRAND"))
+
+    def tag(self, title):
+        """
+        :param title: product title
+        :return: dictionary of BRAND, COLOR, TYPE, MATERIAL and GENDER values found in the title
+        """
+        if not title:
+            return {}
+        tokens = tokenize(title)
+        detail_at = next((i for i, token in enumerate(tokens) if token in DETAIL_WORDS), len(tokens))
+        tags, colors = {}, []
+        with self._lock:
+            matches = self._trie.matches(tokens)
+        for position, fields in matches:
+            for field, value in fields.items():
+                if field == "COLOR":
+                    if value not in colors:
+                        colors.append(value)
+                elif field == "TYPE":
+                    # The last garment word before the details is the product, "Shirt Dress" is a dress
+                    if position < detail_at or "TYPE" not in tags:
+                        tags["TYPE"] = value
+                else:
+                    tags.setdefault(field, value)
+        if colors:
+            tags["COLOR"] = " and ".join(colors[:2])
+        if "GENDER" not in tags and tags.get("TYPE") in WOMEN_TYPES:
+            tags["GENDER"] = "Women"
+        return tags
+
+    def fill(self, extracted_info):
+        """
+        Sets the item fields that are still None from the tags of its title.
+
+        :param extracted_info: item dictionary with a TITLE key, updated in place
+        :return: list of the item keys that were filled
+        """
+        filled = []
+        for field, value in self.tag(extracted_info.get("TITLE")).items():
+            key = itemKey(extracted_info, field)
+            if key is not None and extracted_info[key] is None:
+                extracted_info[key] = value
+                filled.append(key)
+                registry.inc("attribute_tagger_fields_total", {"field": key})
+        return filled
@@ -0,0 +1,96 @@
+"""
+Aggregate pages per minute of a mixed-host crawl through the CrawlScheduler used by testLinks, against
+the serial loop it replaced. Every host is a separate fake retailer server.
+
+    python benchmarks/bench_crawl.py --hosts 6 --pages 120 --latency 150 --workers 8 --rate 2 --json crawl.json
+
+URLs are listed host by host, the worst order for a serial crawl and for a naive parallel one, which
+would hit the first host with every worker at once. Reports the pages per minute of both runs and the
+most pages any one host served at the same time.
+"""
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+from bench_utils import writeResults
+from fake_retailer import startServer
+
+# Keep the benchmark from reading or writing a cache, an archive or learned strategies on disk
+os.environ["CACHE_PATH"] = ""
+os.environ["STRATEGY_STATE_PATH"] = ""
+os.environ.pop("SNAPSHOT_ARCHIVE_DIR", None)
+
+import main as scraper
+from crawl_scheduler import CrawlScheduler
+from fetcher import isStaticAdequate
+from page_facts import parsePage
+
+
+class HostConcurrency:
+    """
+    Wraps scrapeLink to count the pages in flight per host.
+    """
+
+    def __init__(self):
+        self.active = Counter()
+        self.peak = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = url.split("/")[2]
+        with self._lock:
+            self.active[host] += 1
+            self.peak[host] = max(self.peak[host], self.active[host])
+        try:
+            return scraper.scrapeLink(url)
+        finally:
+            with self._lock:
+                self.active[host] -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=6)
+    parser.add_argument("--pages", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=150, help="server response delay in milliseconds")
+    parser.add_argument("--jitter", type=float, default=30, help="random delay variation in milliseconds")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=2, help="pages per second allowed per host")
+    parser.add_argument("--concurrency", type=int, default=2, help="pages in flight allowed per host")
+    parser.add_argument("--skip-serial", action="store_true")
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    servers = [startServer(latency=args.latency / 1000, jitter=args.jitter / 1000) for _ in range(args.hosts)]
+    names = sorted(name for name, page in servers[0].pages.items() if isStaticAdequate(parsePage(page)))
+    per_host = args.pages // args.hosts
+    urls = [f"http://127.0.0.1:{server.server_port}/products/{names[i % len(names)]}?n={i}"
+            for server in servers for i in range(per_host)]
+    print(f"{len(urls)} pages over {args.hosts} hosts")
+
+    results = {}
+    if not args.skip_serial:
+        started = time.perf_counter()
+        for url in urls:
+            scraper.scrapeLink(url)
+        wall = time.perf_counter() - started
+        results["serial"] = {"wall_s": wall, "pages_per_minute": len(urls) * 60 / wall}
+        print(f"serial: {results['serial']['pages_per_minute']:.0f} pages/minute")
+
+    counted = HostConcurrency()
+    scheduler = CrawlScheduler(workers=args.workers, rate=args.rate, concurrency=args.concurrency)
+    errors = sum(error is not None for _, _, error in scheduler.run(counted, urls))
+    stats = scheduler.stats()
+    results["scheduled"] = {"wall_s": stats["seconds"], "pages_per_minute": stats["pages_per_minute"],
+                            "errors": errors, "max_host_concurrency": max(counted.peak.values())}
+    print(f"scheduled x{args.workers}: {stats['pages_per_minute']:.0f} pages/minute, {errors} errors, "
+          f"at most {results['scheduled']['max_host_concurrency']} pages in flight per host")
+
+    for server in servers:
+        server.shutdown()
+    writeResults(args.json, "crawl", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Per-item latency, throughput and token cost of LLM enrichment against the local stand-in completions
+server (fake_llm.py): one request per title as the old per-item prompt did, the batched concurrent EnrichmentClient,
+and the same client again once its cache is warm.
+
+    python benchmarks/bench_enrichment.py --titles 200 --batch-size 20 --concurrency 4 --json enrichment.json
+
+Titles are combinations of brands, colours, materials and garment types, with --duplicates of them
+repeated, as the same product is often listed under several URLs.
+"""
+import argparse
+import random
+import time
+from bench_utils import writeResults
+from fake_llm import startServer
+from attribute_tagger import COLORS, MATERIALS, TYPES
+from llm_enrichment import EnrichmentClient, normalizeTitle
+from metrics import registry
+
+BRANDS = ["FARM Rio", "Reformation", "Free People", "Aritzia", "Universal Thread", "Emery Rose", "Nike",
+          "Savage X Fenty", "Anthropologie", "Madewell"]
+
+
+def benchmarkTitles(count, duplicates, seed=7):
+    rng = random.Random(seed)
+    unique = [f"{rng.choice(BRANDS)} {rng.choice(list(MATERIALS))} {rng.choice(list(COLORS))} {rng.choice(list(TYPES))}".title()
+              for _ in range(int(count * (1 - duplicates)) or 1)]
+    return [unique[i] if i < len(unique) else rng.choice(unique) for i in range(count)]
+
+
+def tokens():
+    return sum(registry.value("llm_tokens_total", {"kind": kind}) for kind in ("prompt", "completion"))
+
+
+def run(server, client, titles):
+    requests_before, tokens_before = server.requests, tokens()
+    started = time.perf_counter()
+    answers = client.details(titles)
+    wall = time.perf_counter() - started
+    return {"wall_s": wall, "items_per_s": len(titles) / wall, "ms_per_item": wall * 1000 / len(titles),
+            "requests": server.requests - requests_before, "tokens_per_item": (tokens() - tokens_before) / len(titles),
+            "answered": sum(1 for key in set(map(normalizeTitle, titles)) if key in answers)}
+
+
+def report(name, result):
+    print(f"{name:<10}{result['items_per_s']:>10.1f} items/s{result['ms_per_item']:>9.1f} ms/item"
+          f"{result['requests']:>7} requests{result['tokens_per_item']:>8.0f} tokens/item")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=200)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="share of titles that repeat another one")
+    parser.add_argument("--latency", type=float, default=400, help="server delay per request in milliseconds")
+    parser.add_argument("--per-item", type=float, default=40, help="server delay per title in milliseconds")
+    parser.add_argument("--rate-limit", type=float, default=0.05, help="share of requests answered with a 429")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=float, default=600)
+    parser.add_argument("--skip-single", action="store_true")
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    server = startServer(latency=args.latency / 1000, per_item=args.per_item / 1000, rate_limit=args.rate_limit,
+                         brands=BRANDS)
+    api_base = f"http://127.0.0.1:{server.server_port}/v1"
+    titles = benchmarkTitles(args.titles, args.duplicates)
+    print(f"{len(titles)} titles, {len(set(titles))} distinct")
+
+    results = {}
+    if not args.skip_single:
+        # One request per title, repeated titles included, as the old per-item prompt did
+        single = EnrichmentClient(api_key="fake", api_base=api_base, batch_size=1, max_concurrency=1,
+                                  requests_per_minute=0, backoff=0.05)
+        results["single"] = run(server, single, [f"{title} #{i}" for i, title in enumerate(titles)])
+        single.close()
+        report("single", results["single"])
+
+    client = EnrichmentClient(api_key="fake", api_base=api_base, batch_size=args.batch_size,
+                              max_concurrency=args.concurrency, requests_per_minute=args.requests_per_minute,
+                              backoff=0.05)
+    results["batched"] = run(server, client, titles)
+    report("batched", results["batched"])
+    results["cached"] = run(server, client, titles)
+    report("cached", results["cached"])
+    client.close()
+
+    server.shutdown()
+    writeResults(args.json, "enrichment", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Microbenchmarks of the extraction functions over the bundled product-page fixtures.
+
+    python benchmarks/bench_extraction.py --repeat 200 --scale 20 --json extraction.json
+
+Each function is called on the same pre-parsed page, so the timings exclude parsing; parsePage itself is
+measured separately. --scale pads the fixtures with product-grid blocks to approximate real page sizes.
+"""
+import argparse
+import time
+from bench_utils import fixtureNames, loadFixture, summarize, writeResults
+from bench_page_facts import FILLER_BLOCK
+from html_requests import getProductSchema, extractSchemaFields, extractFromTags, extractPage
+from image_extract import extract_image_url
+from page_facts import extractPageFacts, parsePage
+
+
+def timeCalls(fn, arg, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def benchmarkFixture(markup, repeat):
+    html = parsePage(markup)
+    facts = extractPageFacts(html)
+    results = {
+        "parsePage": timeCalls(parsePage, markup, max(1, repeat // 10)),
+        "extractPageFacts": timeCalls(extractPageFacts, html, repeat),
+        "getProductSchema": timeCalls(getProductSchema, html, repeat),
+        "extractFromTags": timeCalls(extractFromTags, html, repeat),
+        "extract_image_url": timeCalls(extract_image_url, html, repeat),
+        "extractPage": timeCalls(lambda page: extractPage(page, "https://fixture.test/product"), facts, repeat),
+    }
+    if facts.product is not None:
+        results["extractSchemaFields"] = timeCalls(extractSchemaFields, facts.product, repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'fixture':<22}{'function':<22}{'median us':>11}{'p95 us':>10}")
+    for name in fixtureNames():
+        markup = loadFixture(name)
+        if args.scale:
+            markup = markup.replace("</body>", FILLER_BLOCK * args.scale + "</body>")
+        for function, summary in benchmarkFixture(markup, args.repeat).items():
+            results[f"{name}/{function}"] = summary
+            print(f"{name:<22}{function:<22}{summary['median_ms'] * 1000:>11.1f}{summary['p95_ms'] * 1000:>10.1f}")
+
+    writeResults(args.json, "extraction", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Image downloads against local fake retailer servers: the old fetch_image_data loop (one bare
+requests.get per image, bodies held in memory) against the ImageDownloader, and the ImageDownloader
+again over the same URLs, which it revalidates with conditional requests.
+
+    python benchmarks/bench_images.py --hosts 4 --images 200 --latency 80 --workers 16 --json images.json
+
+Every host is a separate server. --duplicates of the URLs serve the same bytes as another URL, as
+retailers serve one picture under several sizes and query strings; the downloader stores those once.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import requests
+from bench_utils import writeResults
+from fake_retailer import startServer
+from image_downloader import ImageDownloader
+
+
+def benchmarkUrls(servers, count, duplicates, size, seed=7):
+    rng = random.Random(seed)
+    unique = max(1, int(count * (1 - duplicates)))
+    urls = []
+    for i in range(count):
+        content = i if i < unique else rng.randrange(unique)
+        server = servers[i % len(servers)]
+        urls.append(f"http://127.0.0.1:{server.server_port}/images/{i}.png?content=img{content}&size={size}")
+    return urls
+
+
+def runNaive(urls):
+    started = time.perf_counter()
+    received = 0
+    for url in urls:
+        response = requests.get(url)
+        received += len(response.content)
+    wall = time.perf_counter() - started
+    return {"wall_s": wall, "images_per_s": len(urls) / wall, "mb_received": received / 1e6}
+
+
+def runDownloader(downloader, servers, urls):
+    requests_before = sum(server.image_requests for server in servers)
+    not_modified_before = sum(server.not_modified for server in servers)
+    statuses = {}
+    errors = 0
+    started = time.perf_counter()
+    for url, record, error in downloader.downloadMany(urls):
+        if error is not None:
+            errors += 1
+            continue
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    wall = time.perf_counter() - started
+    files = sum(len(names) for _, _, names in os.walk(os.path.join(downloader.root, "objects")))
+    return {"wall_s": wall, "images_per_s": len(urls) / wall, "errors": errors, "statuses": statuses,
+            "requests": sum(server.image_requests for server in servers) - requests_before,
+            "not_modified": sum(server.not_modified for server in servers) - not_modified_before, "files": files}
+
+
+def report(name, result):
+    detail = ", ".join(f"{count} {status}" for status, count in sorted(result.get("statuses", {}).items()))
+    print(f"{name:<12}{result['images_per_s']:>9.1f} images/s{result['wall_s']:>8.2f} s  {detail}"
+          + (f", {result['files']} files stored" if "files" in result else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size", type=int, default=60000, help="bytes per image")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="share of URLs serving another URL's bytes")
+    parser.add_argument("--latency", type=float, default=80, help="server response delay in milliseconds")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--host-concurrency", type=int, default=4)
+    parser.add_argument("--host-rate", type=float, default=50, help="images per second allowed per host")
+    parser.add_argument("--skip-naive", action="store_true")
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    servers = [startServer(latency=args.latency / 1000) for _ in range(args.hosts)]
+    urls = benchmarkUrls(servers, args.images, args.duplicates, args.size)
+    print(f"{len(urls)} images of {args.size} bytes over {args.hosts} hosts")
+
+    results = {}
+    if not args.skip_naive:
+        results["naive"] = runNaive(urls)
+        report("naive", results["naive"])
+
+    root = tempfile.mkdtemp(prefix="bench-images-")
+    try:
+        downloader = ImageDownloader(root, workers=args.workers, host_rate=args.host_rate,
+                                     host_concurrency=args.host_concurrency)
+        results["downloader"] = runDownloader(downloader, servers, urls)
+        report("downloader", results["downloader"])
+        results["revalidate"] = runDownloader(downloader, servers, urls)
+        report("revalidate", results["revalidate"])
+        downloader.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    for server in servers:
+        server.shutdown()
+    writeResults(args.json, "images", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Compares the per-page extraction CPU of the single-pass PageFacts extractors against the previous
+implementation, which searched the parsed tree separately for the schema, the tag fields and the image.
+
+    python benchmarks/bench_page_facts.py --repeat 200 --scale 20
+
+--scale pads every fixture with copies of a product-grid block to approximate the size of real retailer
+pages. Parsing is excluded from the timings, both variants start from the same BeautifulSoup tree.
+"""
+import argparse
+import json
+import os
+import time
+from bs4 import BeautifulSoup
+from bench_utils import FIXTURES_DIR, writeResults
+from html_requests import getProductSchema, extractSchemaFields, extractFromTags
+from image_extract import extract_image_url
+from page_facts import extractPageFacts
+
+FILLER_BLOCK = """
+<div class="grid__item"><div class="card"><div class="card__media"><img src="/img/tile.jpg" alt=""></div>
+<div class="card__content"><a href="/products/tile">Recommended product</a><span class="price-item">$49.00</span>
+<span class="badge">New</span><ul class="swatches"><li>Red</li><li>Blue</li><li>Green</li></ul></div></div></div>
+"""
+
+########### LEGACY IMPLEMENTATION ############
+
+def legacyGetProductSchema(item_html):
+    scripts = item_html.find_all('script', {'type': 'application/ld+json'})
+    if scripts is None or len(scripts) == 0:
+        return None
+    product_info = None
+    for script in scripts:
+        try:
+            data = json.loads(script.string)
+            if isinstance(data, list):
+                for item in data:
+                    if isinstance(item, dict) and item.get("@type") == "Product":
+                        product_info = item
+                        break
+            elif isinstance(data, dict) and data.get("@type") == "Product":
+                product_info = data
+        except (json.JSONDecodeError, TypeError):
+            continue
+    return product_info
+
+
+def legacyExtractFromTags(html):
+    extracted_info = {"TITLE": None, "BRAND": None, "Type": None, "PRICE": None, "COLOR": None, "GENDER": None}
+    product_name = html.find("meta", {"name": "title"}) or html.find("meta", {"property": "og:title"})
+    extracted_info["TITLE"] = product_name.get("content") if product_name else html.find("title").text
+    brand = html.find("meta", {"property": "og:site_name"}) or html.find("div", {"class": "brand-name"})
+    extracted_info["BRAND"] = brand.get("content") if brand else None
+    price = html.find("meta", {"name": "twitter:data1"})
+    if price is None:
+        price = html.find(lambda tag: tag.name in ['div', 'span'] and 'product-price' in tag.get('class', ''))
+    extracted_info["PRICE"] = price.get("content") if price and price.name == 'meta' else price.text.strip() if price else None
+    color = html.find("span", {"class": "product-color"})
+    extracted_info["COLOR"] = color.text if color else None
+    gender = html.find("span", {"class": "product-gender"})
+    extracted_info["GENDER"] = gender.text if gender else None
+    return extracted_info
+
+
+def legacyExtractImageUrl(html_content):
+    scripts = html_content.find_all('script', {'type': 'application/ld+json'})
+    for script in scripts:
+        try:
+            data = json.loads(script.string)
+            if isinstance(data, list):
+                for item in data:
+                    if isinstance(item, dict) and item.get("@type") == "Product" and "image" in item:
+                        return item["image"]
+            elif isinstance(data, dict) and data.get("@type") == "Product" and "image" in data:
+                return data["image"]
+        except (json.JSONDecodeError, TypeError):
+            continue
+    meta_image = html_content.find("meta", {"property": "og:image"})
+    return meta_image.get("content") if meta_image else None
+
+########### BENCHMARK ############
+
+def legacyPage(html):
+    legacyExtractImageUrl(html)
+    if (product_info := legacyGetProductSchema(html)) is not None:
+        return extractSchemaFields(product_info)
+    return legacyExtractFromTags(html)
+
+
+def singlePassPage(html):
+    facts = extractPageFacts(html)
+    extract_image_url(facts)
+    if (product_info := getProductSchema(facts)) is not None:
+        return extractSchemaFields(product_info)
+    return extractFromTags(facts)
+
+
+def loadFixtures(scale):
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+            markup = f.read()
+        if scale:
+            markup = markup.replace("</body>", FILLER_BLOCK * scale + "</body>")
+        fixtures[name] = BeautifulSoup(markup, "html.parser")
+    return fixtures
+
+
+def cpuPerCall(fn, html, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn(html)
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--scale", type=int, default=20)
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    total_legacy = total_single = 0.0
+    print(f"{'fixture':<24}{'legacy ms':>12}{'single ms':>12}{'speedup':>10}")
+    for name, html in loadFixtures(args.scale).items():
+        legacy = cpuPerCall(legacyPage, html, args.repeat)
+        single = cpuPerCall(singlePassPage, html, args.repeat)
+        total_legacy += legacy
+        total_single += single
+        results[name] = {"legacy_ms": legacy * 1000, "single_pass_ms": single * 1000}
+        print(f"{name:<24}{legacy * 1000:>12.3f}{single * 1000:>12.3f}{legacy / single:>9.2f}x")
+    print(f"{'total':<24}{total_legacy * 1000:>12.3f}{total_single * 1000:>12.3f}{total_legacy / total_single:>9.2f}x")
+    writeResults(args.json, "page_facts", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compares a full BeautifulSoup parse against parsePage, which only builds the fragments the extractors
+read, on the bundled fixtures. Reports parse + extraction CPU, peak traced memory per page and whether the
+extracted fields are identical to the full parse.
+
+    python benchmarks/bench_partial_parse.py --repeat 50 --scale 200
+"""
+import argparse
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from bench_utils import fixtureNames, loadFixture, writeResults
+from image_extract import extract_image_url
+from page_facts import DEFAULT_PARSER, parsePage
+from bench_page_facts import FILLER_BLOCK, singlePassPage
+
+
+def loadMarkup(scale):
+    fixtures = {}
+    for name in fixtureNames():
+        markup = loadFixture(name)
+        fixtures[name] = markup.replace("</body>", FILLER_BLOCK * scale + "</body>") if scale else markup
+    return fixtures
+
+
+def extractAll(html):
+    return singlePassPage(html), extract_image_url(html)
+
+
+def measure(parse, markup, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        extractAll(parse(markup))
+    cpu = (time.process_time() - start) / repeat
+
+    tracemalloc.start()
+    result = extractAll(parse(markup))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--scale", type=int, default=200)
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    variants = {
+        "full html.parser": lambda markup: BeautifulSoup(markup, "html.parser"),
+        "partial html.parser": lambda markup: parsePage(markup, "html.parser"),
+    }
+    if DEFAULT_PARSER == "lxml":
+        variants["partial lxml"] = lambda markup: parsePage(markup, "lxml")
+
+    results = {}
+    print(f"{'fixture':<22}{'variant':<22}{'cpu ms':>10}{'peak KiB':>11}{'same fields':>13}")
+    for name, markup in loadMarkup(args.scale).items():
+        reference = None
+        for variant, parse in variants.items():
+            cpu, peak, result = measure(parse, markup, args.repeat)
+            reference = result if reference is None else reference
+            print(f"{name:<22}{variant:<22}{cpu * 1000:>10.2f}{peak / 1024:>11.0f}{str(result == reference):>13}")
+            results[f"{name}/{variant}"] = {"cpu_ms": cpu * 1000, "peak_kib": peak / 1024,
+                                            "same_fields": result == reference}
+    writeResults(args.json, "partial_parse", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
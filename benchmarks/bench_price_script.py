@@ -0,0 +1,94 @@
+"""
+Compares the in-browser cost of the original price finder (LEGACY_PRICE_SCRIPT) against PRICE_SCRIPT, the
+layout-cheap rewrite used by extractPriceWithJS, on archived pages or on the bundled fixtures. Needs Chrome.
+
+    python benchmarks/bench_price_script.py --archive <archive dir> --repeat 10
+    python benchmarks/bench_price_script.py --scale 500 --repeat 10
+
+Every page is written to a temporary file and opened once, then both scripts run --repeat times on the
+same rendered document. Reports the execute_script time of each and whether both picked the same price.
+"""
+import argparse
+import os
+import tempfile
+import time
+from bench_utils import fixtureNames, loadFixture, summarize, writeResults
+from bench_page_facts import FILLER_BLOCK
+from driver_pool import createDriver
+from price_parser import LEGACY_PRICE_SCRIPT, PRICE_MAX_Y, PRICE_SCRIPT
+from snapshot_archive import SnapshotArchive
+
+
+def loadPages(archive, scale, limit):
+    """
+    :return: dictionary of page name to HTML string
+    """
+    if archive is None:
+        return {name: loadFixture(name).replace("</body>", FILLER_BLOCK * scale + "</body>") for name in fixtureNames()}
+    snapshots = SnapshotArchive(archive)
+    try:
+        entries = snapshots.snapshots()[:limit]
+        return {f"{entry['url']} ({entry['digest'][:8]})": snapshots.load(entry["digest"]).decode("utf-8", "replace")
+                for entry in entries}
+    finally:
+        snapshots.close()
+
+
+def timeScript(driver, script, repeat, *args):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = driver.execute_script(script, *args)
+        samples.append(time.perf_counter() - start)
+    return samples, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", default=None, help="snapshot archive directory, defaults to the fixtures")
+    parser.add_argument("--limit", type=int, default=50, help="maximum number of archived pages")
+    parser.add_argument("--scale", type=int, default=200, help="filler blocks added to each fixture")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    pages = loadPages(args.archive, args.scale, args.limit)
+    # Wait for the load event so both scripts measure the same fully laid out document
+    driver = createDriver(page_load_strategy="normal")
+    results = {}
+    legacy_all, rewrite_all = [], []
+    try:
+        print(f"{'page':<48}{'legacy ms':>11}{'rewrite ms':>12}{'speedup':>9}  same price")
+        with tempfile.TemporaryDirectory() as directory:
+            for index, (name, markup) in enumerate(pages.items()):
+                path = os.path.join(directory, f"page{index}.html")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(markup)
+                driver.get("file://" + path)
+
+                legacy, legacy_price = timeScript(driver, LEGACY_PRICE_SCRIPT, args.repeat)
+                rewrite, candidate = timeScript(driver, PRICE_SCRIPT, args.repeat, PRICE_MAX_Y)
+                rewrite_price = candidate["text"] if candidate else None
+                legacy_all += legacy
+                rewrite_all += rewrite
+
+                legacy_ms, rewrite_ms = summarize(legacy)["median_ms"], summarize(rewrite)["median_ms"]
+                same = legacy_price == rewrite_price
+                print(f"{name[:47]:<48}{legacy_ms:>11.2f}{rewrite_ms:>12.2f}{legacy_ms / max(rewrite_ms, 1e-6):>8.1f}x  "
+                      f"{same}" + ("" if same else f" ({legacy_price!r} vs {rewrite_price!r})"))
+                results[name] = {"legacy": summarize(legacy), "rewrite": summarize(rewrite), "same_price": same,
+                                 "legacy_price": legacy_price, "rewrite_price": rewrite_price,
+                                 "rewrite_path": candidate["path"] if candidate else None}
+    finally:
+        driver.quit()
+
+    if legacy_all:
+        results["all"] = {"legacy": summarize(legacy_all), "rewrite": summarize(rewrite_all)}
+        print(f"{'all pages (median)':<48}{results['all']['legacy']['median_ms']:>11.2f}"
+              f"{results['all']['rewrite']['median_ms']:>12.2f}")
+    writeResults(args.json, "price_script", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+End-to-end throughput and latency of getData and of the /items batch stream against the local fake
+retailer server.
+
+    python benchmarks/bench_throughput.py --pages 200 --latency 150 --concurrency 16 --json throughput.json
+
+Every URL is distinct, so neither the result cache nor request coalescing hides any work. Only fixtures
+the plain HTTP tier accepts are used unless --include-browser is given, which needs Chrome. With
+--processes the batch run scrapes in that many worker processes instead of threads of this one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from bench_utils import summarize, writeResults
+from fake_retailer import startServer
+
+# Keep the benchmark from reading or writing a cache, an archive or learned strategies on disk
+os.environ["CACHE_PATH"] = ""
+os.environ["STRATEGY_STATE_PATH"] = ""
+os.environ.pop("SNAPSHOT_ARCHIVE_DIR", None)
+
+import main as scraper
+from fetcher import isStaticAdequate
+from page_facts import parsePage
+from scrape_executor import ScrapeExecutor
+from scrape_supervisor import ScrapeSupervisor
+
+
+def benchmarkUrls(server, pages, include_browser):
+    base = f"http://127.0.0.1:{server.server_port}/products"
+    names = sorted(name for name, page in server.pages.items() if include_browser or isStaticAdequate(parsePage(page)))
+    return [f"{base}/{names[i % len(names)]}?n={i}" for i in range(pages)], names
+
+
+def runSequential(urls):
+    samples = []
+    started = time.perf_counter()
+    for url in urls:
+        start = time.perf_counter()
+        scraper.getData(url)
+        samples.append(time.perf_counter() - start)
+    wall = time.perf_counter() - started
+    return {"latency": summarize(samples), "wall_s": wall, "pages_per_s": len(urls) / wall}
+
+
+async def consumeBatch(urls, timeout):
+    completions = []
+    errors = 0
+    started = time.perf_counter()
+    async for line in scraper.streamItems(urls, timeout, max_age=0):
+        completions.append(time.perf_counter() - started)
+        errors += "error" in json.loads(line)
+    wall = time.perf_counter() - started
+    return {"time_to_result": summarize(completions), "first_result_s": completions[0], "wall_s": wall,
+            "pages_per_s": len(urls) / wall, "errors": errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=100, help="server response delay in milliseconds")
+    parser.add_argument("--jitter", type=float, default=20, help="random delay variation in milliseconds")
+    parser.add_argument("--concurrency", type=int, default=16, help="scrapes in flight for the batch run")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--processes", type=int, default=0, help="worker processes for the batch run, 0 for none")
+    parser.add_argument("--include-browser", action="store_true")
+    parser.add_argument("--skip-sequential", action="store_true")
+    parser.add_argument("--json", default=None, help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    server = startServer(latency=args.latency / 1000, jitter=args.jitter / 1000)
+    urls, names = benchmarkUrls(server, args.pages, args.include_browser)
+    print(f"{len(urls)} pages over fixtures {', '.join(names)}")
+
+    results = {}
+    if not args.skip_sequential:
+        results["sequential"] = runSequential(urls)
+        print(f"sequential: {results['sequential']['pages_per_s']:.1f} pages/s, "
+              f"median {results['sequential']['latency']['median_ms']:.1f} ms")
+
+    if args.processes:
+        threads = -(-args.concurrency // args.processes)
+        scraper.scrape_supervisor = ScrapeSupervisor(processes=args.processes, threads_per_process=threads).start()
+        # One scrape per worker first, so the timings leave out each process importing main.py
+        warmups = [scraper.scrape_supervisor.submit("getTimedData", f"{urls[0]}&warmup={i}") for i in range(args.processes)]
+        for warmup in warmups:
+            warmup.result()
+    scraper.scrape_executor = ScrapeExecutor(max_in_flight=args.concurrency, max_queue=0)
+    results["batch"] = asyncio.run(consumeBatch(urls, args.timeout))
+    print(f"batch x{args.concurrency}{f' over {args.processes} processes' if args.processes else ''}: "
+          f"{results['batch']['pages_per_s']:.1f} pages/s, "
+          f"first result after {results['batch']['first_result_s'] * 1000:.1f} ms, {results['batch']['errors']} errors")
+
+    if scraper.scrape_supervisor is not None:
+        scraper.scrape_supervisor.close()
+    server.shutdown()
+    writeResults(args.json, "throughput", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Helpers shared by the benchmark scripts: fixture loading, timing summaries and JSON result files that
+compare.py can diff between runs.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+
+def fixtureNames():
+    """
+    :return: sorted file names of the bundled HTML fixtures
+    """
+    return sorted(name for name in os.listdir(FIXTURES_DIR) if name.endswith(".html"))
+
+
+def loadFixture(name):
+    """
+    :param name: file name inside benchmarks/fixtures
+    :return: the fixture HTML as a string
+    """
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def summarize(samples):
+    """
+    :param samples: list of durations in seconds
+    :return: dictionary of count, mean, median, p95, min and max in milliseconds
+    """
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def environment():
+    """
+    :return: dictionary describing the machine and revision the benchmark ran on
+    """
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                  text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def writeResults(path, benchmark, parameters, results):
+    """
+    Writes a benchmark run as JSON.
+
+    :param path: output file, nothing is written if None
+    :param benchmark: name of the benchmark
+    :param parameters: dictionary of the arguments the benchmark ran with
+    :param results: dictionary of metric name to value or summary dictionary
+    """
+    if path is None:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"benchmark": benchmark, "environment": environment(), "parameters": parameters,
+                   "results": results}, f, indent=2)
@@ -0,0 +1,47 @@
+"""
+Compares two JSON result files written by the benchmarks with --json.
+
+    python benchmarks/compare.py before.json after.json
+
+Prints every numeric metric present in both runs with its relative change.
+"""
+import argparse
+import json
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    if before["benchmark"] != after["benchmark"]:
+        print(f"Warning: comparing {before['benchmark']} against {after['benchmark']}")
+    print(f"before: {before['environment'].get('revision')}  after: {after['environment'].get('revision')}")
+
+    old, new = flatten(before["results"]), flatten(after["results"])
+    width = max((len(name) for name in old if name in new), default=10)
+    for name in sorted(old):
+        if name not in new:
+            continue
+        change = f"{100 * (new[name] - old[name]) / old[name]:+.1f}%" if old[name] else "n/a"
+        print(f"{name:<{width}}  {old[name]:>12.3f}  {new[name]:>12.3f}  {change:>8}")
+
+
+if __name__ == "__main__":
+    main()
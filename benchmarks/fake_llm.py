@@ -0,0 +1,116 @@
+"""
+Local stand-in for the OpenAI completions API, so the enrichment client can be tested and benchmarked
+offline. Answers with the attribute tagger's guesses in the "Key - Value" format of the real prompts,
+one "### <number>" block per description of a batched prompt.
+
+    python benchmarks/fake_llm.py --port 8701 --latency 400 --per-item 40 --rate-limit 0.05
+
+then point the client at it with OPENAI_API_BASE=http://127.0.0.1:8701/v1. Every request waits
+--latency plus --per-item milliseconds per description, like a model generating the answers, and
+--rate-limit is the share of requests answered with a 429.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bench_utils  # puts the repository on sys.path
+from attribute_tagger import AttributeTagger
+
+# The descriptions asked about, after the few-shot examples
+BATCH_DESCRIPTION = re.compile(r"^\s*###\s*(\d+)\s*\n\s*Description:\s*(.*)$", re.M)
+SINGLE_DESCRIPTION = re.compile(r"Description:\s*(.*)\s*$")
+
+DETAIL_KEYS = [("Brand", "BRAND"), ("Color", "COLOR"), ("Type", "TYPE"), ("Material", "MATERIAL"),
+               ("Fit", None), ("Gender", "GENDER")]
+
+
+class FakeLlmHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/completions"):
+            self.reply(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        with server.lock:
+            server.requests += 1
+        if random.random() < server.rate_limit:
+            self.reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}})
+            return
+
+        prompt = body.get("prompt", "")
+        batch = [(int(number), title.strip()) for number, title in BATCH_DESCRIPTION.findall(prompt)]
+        if batch:
+            text = "\n".join(f"### {number}\n{self.details(title)}" for number, title in batch)
+        else:
+            single = SINGLE_DESCRIPTION.search(prompt)
+            text = self.details(single.group(1).strip() if single else "")
+        time.sleep(server.latency + server.per_item * max(1, len(batch)))
+        self.reply(200, {"object": "text_completion", "model": body.get("model", "fake"),
+                         "choices": [{"text": "\n" + text, "index": 0, "finish_reason": "stop"}],
+                         "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                                   "total_tokens": (len(prompt) + len(text)) // 4}})
+
+    def details(self, title):
+        tags = self.server.tagger.tag(title)
+        return "\n".join(f"{key} - {tags.get(field) or 'Not specified'}" for key, field in DETAIL_KEYS)
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def startServer(port=0, latency=0.0, per_item=0.0, rate_limit=0.0, brands=()):
+    """
+    Starts the fake completions API on a background thread.
+
+    :param port: port to listen on, 0 picks a free one
+    :param latency: seconds each response is delayed
+    :param per_item: seconds added per description in the prompt
+    :param rate_limit: share of requests answered with a 429
+    :param brands: brand names the answers can recognize
+    :return: the running ThreadingHTTPServer; its API base is http://127.0.0.1:<server.server_port>/v1
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeLlmHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.per_item = per_item
+    server.rate_limit = rate_limit
+    server.tagger = AttributeTagger(brands)
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8701)
+    parser.add_argument("--latency", type=float, default=400, help="response delay in milliseconds")
+    parser.add_argument("--per-item", type=float, default=40, help="delay per description in milliseconds")
+    parser.add_argument("--rate-limit", type=float, default=0, help="share of requests answered with a 429")
+    args = parser.parse_args()
+
+    server = startServer(args.port, args.latency / 1000, args.per_item / 1000, args.rate_limit)
+    print(f"Serving completions at http://127.0.0.1:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Local HTTP server that serves the benchmark fixtures as product pages with configurable latency, so
+end-to-end benchmarks run offline.
+
+    python benchmarks/fake_retailer.py --port 8700 --latency 150 --jitter 50
+
+serves benchmarks/fixtures/<name>.html at http://127.0.0.1:8700/products/<name>, ignoring the query
+string. /images/<name>?size=<bytes>&content=<key> serves a generated PNG body of that size, the same
+bytes for the same content key (the name by default), with an ETag and Last-Modified, and answers
+conditional requests for an unchanged image with a 304. Any other path answers 404.
+"""
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from bench_utils import fixtureNames, loadFixture
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+LAST_MODIFIED = "Mon, 02 Oct 2023 10:00:00 GMT"
+
+
+class FakeRetailerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without this delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        name = parts.path.rsplit("/", 1)[-1]
+        page = server.pages.get(name)
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if parts.path.startswith("/images/"):
+            self.image(name, parse_qs(parts.query))
+            return
+        if page is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def image(self, name, query):
+        server = self.server
+        key = query.get("content", [name])[0]
+        size = int(query.get("size", ["40000"])[0])
+        body = imageBody(key, size)
+        etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        with server.lock:
+            server.image_requests += 1
+        if self.headers.get("If-None-Match") == etag:
+            with server.lock:
+                server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the body, e.g. once it passed its size cap
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def imageBody(key, size):
+    """
+    :param key: content key, equal keys give equal bodies
+    :param size: body length in bytes
+    :return: a PNG signature followed by bytes derived from the key
+    """
+    block = hashlib.sha256(key.encode("utf-8")).digest()
+    filler = block * (size // len(block) + 1)
+    return (PNG_SIGNATURE + filler)[:max(size, len(PNG_SIGNATURE))]
+
+
+def startServer(port=0, latency=0.0, jitter=0.0):
+    """
+    Starts the fake retailer on a background thread.
+
+    :param port: port to listen on, 0 picks a free one
+    :param latency: seconds each response is delayed
+    :param jitter: maximum seconds added to or removed from the latency
+    :return: the running ThreadingHTTPServer; its base URL is http://127.0.0.1:<server.server_port>
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeRetailerHandler)
+    server.daemon_threads = True
+    server.pages = {os.path.splitext(name)[0]: loadFixture(name).encode("utf-8") for name in fixtureNames()}
+    server.latency = latency
+    server.jitter = jitter
+    server.image_requests = 0
+    server.not_modified = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency", type=float, default=0, help="response delay in milliseconds")
+    parser.add_argument("--jitter", type=float, default=0, help="random delay variation in milliseconds")
+    args = parser.parse_args()
+
+    server = startServer(args.port, args.latency / 1000, args.jitter / 1000)
+    print(f"Serving {', '.join(sorted(server.pages))} at http://127.0.0.1:{server.server_port}/products/<name>")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from page_facts import extractPageFacts, parsePage
+
+# Longest outerHTML of a price-class element that is still shipped, wrappers around whole sections of the
+# page are skipped and their smaller price descendants are sent instead
+MAX_FRAGMENT_LENGTH = 5000
+
+# Most price-class elements shipped, matching page_facts.MAX_PRICE_TEXTS
+MAX_PRICE_ELEMENTS = 20
+
+# Collects, in document order, the outerHTML of exactly the elements parsePage would keep, plus the values of
+# the per-host selectors, and returns both in one round-trip. The price finder is not part of it: it forces a
+# layout, and extractPriceWithJS only runs it when the collected facts hold no static price
+FACTS_SCRIPT = r"""
+    const SELECTOR = 'title, meta, script[type="application/ld+json"], [itemprop="price"], [itemprop="priceCurrency"], ' +
+                     'div.brand-name, div.product-price, span.product-price, span.product-color, span.product-gender, ' +
+                     'div[class*="price" i], span[class*="price" i]';
+    const MAX_FRAGMENT_LENGTH = arguments[0];
+    const MAX_PRICE_ELEMENTS = arguments[1];
+    const fragments = [];
+    let last = null;
+    let priceElements = 0;
+    for (const element of document.querySelectorAll(SELECTOR)) {
+        // Descendants of an element already shipped are part of its outerHTML
+        if (last !== null && last.contains(element)) {
+            continue;
+        }
+        const name = element.tagName;
+        const isPriceElement = (name === 'DIV' || name === 'SPAN') && !element.hasAttribute('itemprop') &&
+                               /price/i.test(element.className) && !/brand-name|product-color|product-gender/.test(element.className);
+        if (isPriceElement && priceElements >= MAX_PRICE_ELEMENTS) {
+            continue;
+        }
+        const html = element.outerHTML;
+        if ((name === 'DIV' || name === 'SPAN') && html.length > MAX_FRAGMENT_LENGTH) {
+            continue;
+        }
+        fragments.push(html);
+        last = element;
+        if (isPriceElement) {
+            priceElements++;
+        }
+    }
+    // Per-host selector overrides are matched against the live DOM, their elements are not in the fragments
+    const selected = {};
+    for (const [field, selector] of Object.entries(arguments[2] || {})) {
+        const element = document.querySelector(selector);
+        const value = element && (element.getAttribute('content') || element.textContent.trim());
+        if (value) {
+            selected[field] = value;
+        }
+    }
+    return {fragments: '<html><head></head><body>' + fragments.join('\n') + '</body></html>', selected: selected};
+"""
+
+########### FUNCTION DEFINITIONS ############
+
+def collectPageFacts(driver, selectors=None):
+    """
+    Extracts the product facts inside the browser instead of shipping the whole serialized DOM with
+    driver.page_source: one script returns the meta tags, the title, the JSON-LD blocks, the price
+    microdata and the candidate div/span tags, along with the values of the per-host selectors.
+
+    :param driver: Selenium WebDriver instance on a loaded product page
+    :param selectors: dictionary of item field to CSS selector overriding the extractors for this host
+    :return: a tuple of the compact HTML document holding the collected fragments, its PageFacts and the
+    item fields read with the selectors
+    """
+    payload = driver.execute_script(FACTS_SCRIPT, MAX_FRAGMENT_LENGTH, MAX_PRICE_ELEMENTS, selectors or {})
+    fragments = payload["fragments"]
+    return fragments, extractPageFacts(parsePage(fragments)), payload["selected"]
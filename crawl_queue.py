@@ -0,0 +1,159 @@
+"""
+Durable crawl of large URL lists: URLs are ingested from JSONL files into a SQLite job queue that several
+worker processes drain at once, each driving its own browsers through the extraction pipeline of main.py.
+
+    python crawl_queue.py ingest urls.jsonl
+    python crawl_queue.py work --processes 4
+    python crawl_queue.py status
+    python crawl_queue.py export --output results.jsonl
+
+A crawl that is stopped or crashes resumes where it stopped with the next `work`: finished jobs keep
+their results, and the jobs a dead worker held go back to the queue once their lease expires. Failed
+jobs are retried with exponential backoff, then dead-lettered (`export --dead`, `retry-dead`).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from job_queue import DEAD, DEFAULT_BACKOFF, DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, DONE, JobQueue
+
+DEFAULT_QUEUE_PATH = "crawl_queue.sqlite3"
+
+# Longest sleep of an idle worker between two looks at the queue
+MAX_IDLE_SLEEP = 30
+
+########### FUNCTION DEFINITIONS ############
+
+def runWorker(queue_path, batch_size=8, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+              backoff=DEFAULT_BACKOFF, processes=1):
+    """
+    Drains the queue until every job is done or dead-lettered. Meant to run in its own process: it
+    imports main.py, which gives the process its own driver pool, caches and crawl scheduler. A page
+    the pipeline got no item fields out of counts as a failed attempt.
+
+    :param queue_path: SQLite file of the job queue
+    :param batch_size: jobs leased at once and spread over the hosts by the crawl scheduler
+    :param lease_seconds: seconds a leased batch may take before its jobs are handed to another worker
+    :param max_attempts: attempts before a job is dead-lettered
+    :param backoff: seconds before the first retry, doubled on every further retry
+    :param processes: number of worker processes draining the queue, which share the per-host limits
+    :return: number of jobs this worker finished
+    """
+    import main as scraper
+
+    scraper.crawl_scheduler.shareHosts(processes)
+
+    queue = JobQueue(queue_path, max_attempts=max_attempts, backoff=backoff)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    finished = 0
+    try:
+        while True:
+            jobs = queue.lease(owner, batch_size, lease_seconds)
+            if not jobs:
+                wait = queue.nextAvailable()
+                if wait is None:
+                    break
+                time.sleep(min(max(wait, 1), MAX_IDLE_SLEEP))
+                continue
+            ids = {url: job_id for job_id, url, _ in jobs}
+            for url, result, error in scraper.crawl_scheduler.run(scraper.scrapeLink, list(ids)):
+                if error is not None:
+                    state = queue.fail(ids[url], owner, f'{type(error).__name__}: {error}')
+                    logging.warning(f'{owner} failed {url} ({state}): {str(error)}')
+                    continue
+                item_fields, result_dict = result
+                if not item_fields:
+                    # scrapePage turns navigation and driver errors into an empty item
+                    state = queue.fail(ids[url], owner, "No item fields extracted")
+                    logging.warning(f'{owner} got nothing out of {url} ({state})')
+                    continue
+                if queue.complete(ids[url], owner, {"item": item_fields, "result": result_dict}):
+                    finished += 1
+            progress = queue.progress()
+            print(f"[{owner}] {progress[DONE]}/{progress['total']} done, {progress[DEAD]} dead, "
+                  f"{progress['leased']} in progress")
+    finally:
+        queue.close()
+        scraper.driver_pool.close()
+    return finished
+
+
+def work(queue_path, processes, **options):
+    """
+    Starts the worker processes and waits for them to drain the queue.
+
+    :param queue_path: SQLite file of the job queue
+    :param processes: number of worker processes
+    :param options: keyword arguments passed on to runWorker
+    """
+    # Spawned rather than forked, so no process inherits another's browsers or SQLite connections
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=runWorker, args=(queue_path,), kwargs=dict(options, processes=processes),
+                           name=f"crawl-worker-{i}") for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        # Their leases expire and the next run picks the jobs up again
+        for worker in workers:
+            worker.terminate()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queue", default=os.environ.get("CRAWL_QUEUE_PATH", DEFAULT_QUEUE_PATH),
+                        help="SQLite file of the job queue")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    parser.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF, help="seconds before the first retry")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="enqueue the URLs of JSONL files")
+    ingest.add_argument("files", nargs="+", help='JSONL files of {"url": ...} objects, JSON strings or bare URLs')
+
+    worker = commands.add_parser("work", help="drain the queue with several worker processes")
+    worker.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    worker.add_argument("--batch", type=int, default=8, help="jobs leased at once by each worker")
+    worker.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="seconds a leased batch may take")
+
+    commands.add_parser("status", help="print the number of jobs in each state")
+
+    export = commands.add_parser("export", help="write the results, or the dead letters, as JSONL")
+    export.add_argument("--output", default=None, help="defaults to stdout")
+    export.add_argument("--dead", action="store_true", help="export the dead-lettered jobs with their last error")
+
+    commands.add_parser("retry-dead", help="give the dead-lettered jobs a fresh set of attempts")
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue, max_attempts=args.max_attempts, backoff=args.backoff)
+    try:
+        if args.command == "ingest":
+            for path in args.files:
+                print(f"{path}: {queue.ingest(path)} new jobs")
+        elif args.command == "work":
+            work(args.queue, args.processes, batch_size=args.batch, lease_seconds=args.lease,
+                 max_attempts=args.max_attempts, backoff=args.backoff)
+        elif args.command == "export":
+            output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            count = 0
+            for record in queue.results(DEAD if args.dead else DONE):
+                output.write(json.dumps(record) + "\n")
+                count += 1
+            if output is not sys.stdout:
+                output.close()
+                print(f"Exported {count} jobs to {args.output}")
+        elif args.command == "retry-dead":
+            print(f"Requeued {queue.retryDead()} dead jobs")
+        print(json.dumps(queue.progress()))
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from metrics import registry
+
+# Pages per second and burst allowed per host before any slowdown
+DEFAULT_HOST_RATE = 0.5
+DEFAULT_HOST_BURST = 2
+
+# Pages of one host scraped at the same time
+DEFAULT_HOST_CONCURRENCY = 2
+
+# A throttled host's rate is divided by this factor, up to MAX_SLOWDOWN, and every clean page after
+# that gives back RECOVERY of the slowdown
+SLOWDOWN_FACTOR = 2.0
+MAX_SLOWDOWN = 32.0
+RECOVERY = 0.8
+
+registry.describe("crawl_pages_total", "counter", "Pages finished by the crawl scheduler, per host and outcome.")
+registry.describe("crawl_throttled_total", "counter", "Pages that hit a rate limit or a challenge page, per host.")
+registry.describe("crawl_pages_per_minute", "gauge", "Pages per minute of the last crawl, across all hosts.")
+
+_local = threading.local()
+
+########### FUNCTION DEFINITIONS ############
+
+def reportThrottle(url, reason):
+    """
+    Tells the crawl scheduler running the current scrape that its host answered with a rate limit or a
+    challenge page. Does nothing outside a throttleWatch, e.g. for /item requests.
+
+    :param url: URL of the page that was throttled
+    :param reason: short label such as "429" or "challenge"
+    """
+    watch = getattr(_local, "throttled", None)
+    if watch is None:
+        return
+    watch["reason"] = reason
+    logging.info(f'Throttled by {urlsplit(url).netloc} ({reason})')
+
+
+@contextmanager
+def throttleWatch():
+    """
+    Collects the reportThrottle calls made on the current thread during the with-block. A watch opened
+    inside another one passes what it saw on to the outer one.
+
+    :return: a context manager yielding a dictionary whose "reason" is the last reason reported, False
+    while none was
+    """
+    outer = getattr(_local, "throttled", None)
+    watch = _local.throttled = {"reason": False}
+    try:
+        yield watch
+    finally:
+        _local.throttled = outer
+        if outer is not None and watch["reason"]:
+            outer["reason"] = watch["reason"]
+
+
+def forwardThrottle(fn):
+    """
+    :param fn: callable about to run on another thread, e.g. the hedge of a hedged scrape
+    :return: a callable running fn with its reportThrottle calls going to the current thread's watch
+    """
+    watch = getattr(_local, "throttled", None)
+    if watch is None:
+        return fn
+
+    def run(*args, **kwargs):
+        _local.throttled = watch
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.throttled = None
+    return run
+
+
+class HostQueue:
+    """
+    Pending URLs of one host with its token bucket, in-flight count and current slowdown.
+    """
+
+    def __init__(self, host, rate, burst, concurrency):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.slowdown = 1.0
+        self.active = 0
+        self.urls = deque()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate / self.slowdown)
+        self.updated = now
+
+    def readyIn(self, now):
+        """
+        :return: seconds until this host may start another page, 0 if it may now, None if it has to
+        wait for one of its pages to finish first
+        """
+        if not self.urls or self.active >= self.concurrency:
+            return None
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) * self.slowdown / self.rate
+
+    def throttled(self):
+        self.slowdown = min(MAX_SLOWDOWN, self.slowdown * SLOWDOWN_FACTOR)
+        self.tokens = 0.0
+
+    def succeeded(self):
+        self.slowdown = max(1.0, self.slowdown * RECOVERY)
+
+
+class CrawlScheduler:
+    """
+    Runs a scrape function over a mixed-host URL list on a pool of worker threads while keeping every
+    host polite: each host has its own queue, a token bucket limiting its pages per second and a cap on
+    its concurrent pages. Hosts are served round-robin, so the workers stay busy with other hosts while
+    one waits for tokens. A host that answers with a 429 or a challenge page is slowed down, and sped
+    back up gradually as its pages come through clean.
+
+    Per-host limits are keyed by host and may set "rate", "burst" and "concurrency". A host's tokens
+    and slowdown carry over from one run to the next, so crawling a list in batches is as polite as
+    crawling it at once. Schedulers in several processes crawling the same hosts each keep to their
+    share of the limits.
+    """
+
+    def __init__(self, workers=4, rate=DEFAULT_HOST_RATE, burst=DEFAULT_HOST_BURST,
+                 concurrency=DEFAULT_HOST_CONCURRENCY, host_limits=None, share=1):
+        """
+        :param workers: number of pages scraped at the same time across all hosts
+        :param rate: pages per second allowed per host
+        :param burst: pages a host may start back to back before the rate applies
+        :param concurrency: pages of one host scraped at the same time
+        :param host_limits: dictionary of host to a dictionary overriding rate, burst and concurrency
+        :param share: number of schedulers crawling the same hosts at once, this one included
+        """
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.host_limits = host_limits or {}
+        self.share = share
+        self._hosts = {}
+        self.pages = 0
+        self.elapsed = 0.0
+        self.throttles = {}
+
+    def run(self, fn, urls):
+        """
+        Scrapes the URLs and yields the outcome of each one as it finishes, in completion order.
+
+        :param fn: blocking callable taking one URL
+        :param urls: iterable of URLs
+        :return: generator of (url, result, exception) tuples, exception is None when fn returned
+        """
+        hosts = {}
+        for url in urls:
+            host = urlsplit(url).netloc.lower()
+            if host not in hosts:
+                hosts[host] = self._hostQueue(host)
+            hosts[host].urls.append(url)
+        rotation = deque(hosts.values())
+        running = {}
+        started = time.monotonic()
+        pages = 0
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl") as pool:
+                while rotation or running:
+                    # Start pages round-robin across the hosts that have a token and a free slot
+                    wait_for = None
+                    checked = 0
+                    while rotation and len(running) < self.workers and checked < len(rotation):
+                        queue = rotation[0]
+                        rotation.rotate(-1)
+                        ready_in = queue.readyIn(time.monotonic())
+                        if ready_in == 0:
+                            queue.tokens -= 1
+                            queue.active += 1
+                            url = queue.urls.popleft()
+                            running[pool.submit(self._scrape, fn, url)] = (queue, url)
+                            if not queue.urls:
+                                rotation.remove(queue)
+                            checked = 0
+                            continue
+                        checked += 1
+                        if ready_in is not None:
+                            wait_for = ready_in if wait_for is None else min(wait_for, ready_in)
+
+                    if not running:
+                        time.sleep(wait_for if wait_for is not None else 0.01)
+                        continue
+                    done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        queue, url = running.pop(future)
+                        queue.active -= 1
+                        result, error, throttled = future.result()
+                        if throttled:
+                            queue.throttled()
+                            self.throttles[queue.host] = self.throttles.get(queue.host, 0) + 1
+                            registry.inc("crawl_throttled_total", {"host": queue.host, "reason": throttled})
+                        else:
+                            queue.succeeded()
+                        registry.inc("crawl_pages_total", {"host": queue.host, "result": "error" if error else "ok"})
+                        pages += 1
+                        yield url, result, error
+        finally:
+            # A run abandoned early leaves its hosts as it found them, bar the tokens it spent
+            for queue, _ in running.values():
+                queue.active -= 1
+            for queue in hosts.values():
+                queue.urls.clear()
+
+        self.pages += pages
+        self.elapsed += time.monotonic() - started
+        registry.set("crawl_pages_per_minute", self.pagesPerMinute())
+
+    def shareHosts(self, share):
+        """
+        Divides the per-host limits between this scheduler and share - 1 others crawling the same hosts,
+        e.g. in the other worker processes of a crawl, so that together they stay within them.
+
+        :param share: number of schedulers crawling the same hosts at once, this one included
+        """
+        self.share = share
+        self._hosts.clear()
+
+    def pagesPerMinute(self):
+        """
+        :return: pages finished per minute of crawling, across all hosts and runs
+        """
+        return self.pages * 60 / self.elapsed if self.elapsed else 0.0
+
+    def stats(self):
+        """
+        :return: dictionary with the pages crawled, the seconds spent, the pages per minute and the
+        throttles per host
+        """
+        return {"pages": self.pages, "seconds": round(self.elapsed, 3),
+                "pages_per_minute": round(self.pagesPerMinute(), 2), "throttles": dict(self.throttles)}
+
+    def _hostQueue(self, host):
+        if host not in self._hosts:
+            limits = self.host_limits.get(host, {})
+            self._hosts[host] = HostQueue(host, limits.get("rate", self.rate) / self.share,
+                                          max(1, limits.get("burst", self.burst) / self.share),
+                                          max(1, limits.get("concurrency", self.concurrency) // self.share))
+        return self._hosts[host]
+
+    def _scrape(self, fn, url):
+        with throttleWatch() as watch:
+            try:
+                return fn(url), None, watch["reason"]
+            except Exception as e:
+                logging.warning(f'Crawl of {url} failed: {str(e)}')
+                return None, e, watch["reason"]
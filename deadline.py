@@ -0,0 +1,184 @@
+import logging
+import math
+import threading
+import time
+from metrics import registry
+
+# Seconds an optional stage needs at least; with less budget left it is skipped and the result is partial
+MIN_STAGE_SECONDS = 0.5
+
+registry.describe("scrape_partial_total", "counter", "Scrape stages skipped or cut short by the deadline, by stage.")
+registry.describe("scrape_hedges_total", "counter", "Hedged scrapes, by the attempt whose result was used.")
+
+########### FUNCTION DEFINITIONS ############
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised by a stage that cannot start because the scrape's deadline has passed.
+    """
+
+
+class Deadline:
+    """
+    End-to-end time budget of one scrape, handed down through its stages so each one only uses what
+    is left: the fetch timeout, the wait for a browser, the navigation and the optional stages are all
+    capped by remaining(). Stages skipped or cut short are listed in skipped, so the caller knows the
+    fields it got are partial.
+
+    A child deadline shares its parent's expiry and can also be cancelled on its own, which is how the
+    losing attempt of a hedged scrape is told to stop. Deadlines survive pickling as the time remaining,
+    so they can be sent to worker processes.
+    """
+
+    def __init__(self, seconds=None, parent=None):
+        """
+        :param seconds: budget in seconds from now, None for no limit
+        :param parent: deadline this one may not outlive
+        """
+        self.expires = math.inf if seconds is None else time.monotonic() + seconds
+        self.parent = parent
+        if parent is not None:
+            self.expires = min(self.expires, parent.expires)
+        self.skipped = []
+        self._cancelled = threading.Event()
+
+    def remaining(self):
+        """
+        :return: seconds left, 0 once expired or cancelled, math.inf without a limit
+        """
+        if self.cancelled():
+            return 0.0
+        return max(0.0, self.expires - time.monotonic())
+
+    def budget(self, cap=None):
+        """
+        :param cap: the most a stage would take without a deadline, None for no cap
+        :return: seconds the stage may take, None when neither the deadline nor the cap limits it
+        """
+        remaining = min(self.remaining(), math.inf if cap is None else cap)
+        return None if remaining == math.inf else remaining
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def cancelled(self):
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled())
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def child(self):
+        """
+        :return: a deadline with the same expiry that can be cancelled without cancelling this one
+        """
+        return Deadline(parent=self)
+
+    def allows(self, stage, needed=MIN_STAGE_SECONDS):
+        """
+        Decides whether an optional stage still fits in the budget, and records it as skipped if not.
+
+        :param stage: stage name, e.g. js_price
+        :param needed: seconds the stage needs at least
+        :return: True if the stage should run
+        """
+        if self.remaining() >= needed:
+            return True
+        self.skip(stage)
+        return False
+
+    def skip(self, stage):
+        """
+        :param stage: name of a stage that was skipped or cut short
+        """
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+            registry.inc("scrape_partial_total", {"stage": stage})
+
+    def check(self, stage):
+        """
+        :param stage: name of the stage about to start
+        :raise DeadlineExceeded: if no time is left for it
+        """
+        if self.expired():
+            raise DeadlineExceeded(f'No time left for {stage}')
+
+    def __getstate__(self):
+        remaining = self.remaining()
+        return {"remaining": None if remaining == math.inf else remaining, "skipped": list(self.skipped)}
+
+    def __setstate__(self, state):
+        self.__init__(state["remaining"])
+        self.skipped = state["skipped"]
+
+
+def runHedged(primary, hedge, delay, deadline, accept=None):
+    """
+    Runs primary and, if it has not signalled readiness after delay seconds, starts hedge alongside it.
+    The first attempt to finish with an accepted result wins and the other one is cancelled through its
+    deadline. The primary runs on the calling thread, so thread-local state such as the scrape trace
+    follows it; the hedge runs on a thread of its own.
+
+    :param primary: callable taking a Deadline and a threading.Event it sets once it is ready
+    :param hedge: callable with the same signature, e.g. the same scrape on another tier or browser
+    :param delay: seconds to wait for the primary's readiness before hedging
+    :param deadline: Deadline of the whole scrape
+    :param accept: callable deciding whether a result counts as a success, defaults to any result
+    :return: the result of the winning attempt; when both fail, the primary's result or error
+    """
+    accept = accept or (lambda result: True)
+    primary_deadline, hedge_deadline = deadline.child(), deadline.child()
+    ready = threading.Event()
+    lock = threading.Lock()
+    outcome = {}
+    hedge_done = threading.Event()
+
+    def runHedge():
+        try:
+            result = hedge(hedge_deadline, threading.Event())
+        except Exception as e:
+            logging.info(f'Hedged attempt failed: {str(e)}')
+            hedge_done.set()
+            return
+        with lock:
+            won = "winner" not in outcome and accept(result)
+            if won:
+                outcome["winner"] = "hedge"
+                outcome["result"] = result
+        if won:
+            primary_deadline.cancel()
+        hedge_done.set()
+
+    def startHedge():
+        with lock:
+            if "winner" in outcome or ready.is_set() or deadline.expired():
+                return
+            outcome["hedged"] = True
+        threading.Thread(target=runHedge, name="hedge", daemon=True).start()
+
+    timer = threading.Timer(delay, startHedge)
+    timer.daemon = True
+    timer.start()
+    error = result = None
+    try:
+        result = primary(primary_deadline, ready)
+    except Exception as e:
+        error = e
+    finally:
+        timer.cancel()
+
+    with lock:
+        if "winner" not in outcome and error is None and accept(result):
+            outcome["winner"] = "primary"
+        hedged = outcome.get("hedged", False)
+    if outcome.get("winner") == "primary":
+        hedge_deadline.cancel()
+    elif hedged and "winner" not in outcome:
+        # The primary failed, the hedge may still get the page
+        hedge_done.wait(deadline.budget())
+    if hedged:
+        registry.inc("scrape_hedges_total", {"winner": outcome.get("winner", "none")})
+    if outcome.get("winner") == "hedge":
+        return outcome["result"]
+    if error is not None:
+        raise error
+    return result
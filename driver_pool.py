@@ -0,0 +1,228 @@
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium_stealth import stealth
+from metrics import stage
+from page_loader import enableResourceBlocking
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+########### FUNCTION DEFINITIONS ############
+
+def getDriverPath():
+    """
+    Resolves the chromedriver binary once per process instead of once per browser launch.
+
+    :return: the filesystem path of the chromedriver executable installed by ChromeDriverManager
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            with stage("driver_install"):
+                _driver_path = ChromeDriverManager().install()
+    return _driver_path
+
+
+def createDriver(page_load_strategy="none", blocked_urls=None, capture_network=False):
+    """
+    Launches a headless, stealth-configured Chrome instance.
+
+    :param page_load_strategy: "none" or "eager" let page_loader.loadPage return before the load event,
+    "normal" makes driver.get wait for it
+    :param blocked_urls: URL patterns Chrome refuses to fetch, defaults to page_loader.BLOCKED_URL_PATTERNS,
+    an empty list blocks nothing and leaves images enabled
+    :param capture_network: record network events in the performance log for network_capture.NetworkCapture
+    :return: a new Selenium WebDriver instance ready to navigate
+    """
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless")  # Run in headless mode
+    chrome_options.add_argument("start-maximized")
+    chrome_options.page_load_strategy = page_load_strategy
+    if capture_network:
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if blocked_urls != []:
+        # Images are refused by type as well as by URL, which catches CDN URLs without an extension
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    driver = webdriver.Chrome(service=ChromeService(getDriverPath()), options=chrome_options)
+
+    stealth(driver,
+            languages=["en-US", "en"],
+            vendor="Google Inc.",
+            platform="Win32",
+            webgl_vendor="Intel Inc.",
+            renderer="Intel Iris OpenGL Engine",
+            fix_hairline=True,
+            )
+    if blocked_urls != []:
+        enableResourceBlocking(driver, blocked_urls)
+    if capture_network:
+        # Network.getResponseBody only answers for requests seen while the domain is enabled
+        driver.execute_cdp_cmd("Network.enable", {})
+    return driver
+
+
+class DriverPool:
+    """
+    A fixed-size pool of pre-launched Chrome drivers that callers lease for one page at a time.
+
+    Drivers are health checked before every lease, have their cookies, extra tabs and storage
+    cleared when they are returned, and are replaced with a fresh browser after max_pages pages.
+    """
+
+    def __init__(self, size=2, max_pages=50, lease_timeout=None, driver_factory=createDriver):
+        """
+        :param size: maximum number of browsers alive at once
+        :param max_pages: number of leases after which a browser is quit and relaunched
+        :param lease_timeout: default number of seconds to wait for a free browser, None waits forever
+        :param driver_factory: callable returning a new WebDriver instance
+        """
+        self.size = size
+        self.max_pages = max_pages
+        self.lease_timeout = lease_timeout
+        self._driver_factory = driver_factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        """
+        Launches browsers until the pool holds `size` idle drivers, so the first requests do not pay
+        for Chrome start-up.
+        """
+        for _ in range(self.size - self._idle.qsize()):
+            if not self._slots.acquire(blocking=False):
+                break
+            try:
+                self._idle.put(self._launch())
+            except Exception as e:
+                logging.warning(f'Could not pre-launch browser: {str(e)}')
+                break
+            finally:
+                self._slots.release()
+
+    def idle(self):
+        """
+        :return: number of launched browsers waiting in the pool for a lease
+        """
+        return self._idle.qsize()
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Leases a healthy driver for the duration of the with-block and returns it to the pool after.
+
+        :param timeout: seconds to wait for a free driver, defaults to the pool's lease_timeout
+        :return: a context manager yielding a Selenium WebDriver instance
+        """
+        if self._closed:
+            raise RuntimeError('Driver pool is closed')
+        timeout = self.lease_timeout if timeout is None else timeout
+        with stage("lease_wait"):
+            acquired = self._slots.acquire(timeout=timeout)
+        if not acquired:
+            raise TimeoutError(f'No browser available after {timeout} seconds')
+        driver = None
+        try:
+            with stage("driver_checkout"):
+                driver = self._checkout()
+            yield driver
+        except BaseException:
+            # The page may have left the browser in an unknown state, do not hand it out again
+            self._discard(driver)
+            driver = None
+            raise
+        finally:
+            if driver is not None:
+                self._checkin(driver)
+            self._slots.release()
+
+    def close(self):
+        """
+        Quits every idle browser and refuses further leases.
+        """
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def _launch(self):
+        with stage("driver_launch"):
+            driver = self._driver_factory()
+        with self._lock:
+            self._pages[id(driver)] = 0
+        return driver
+
+    def _checkout(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                return self._launch()
+            if self._isHealthy(driver):
+                return driver
+            logging.warning('Discarding unresponsive browser from pool')
+            self._discard(driver)
+
+    def _checkin(self, driver):
+        with self._lock:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+            pages = self._pages[id(driver)]
+        if self._closed or pages >= self.max_pages:
+            self._discard(driver)
+            return
+        with stage("driver_reset"):
+            reset = self._resetState(driver)
+        if not reset:
+            self._discard(driver)
+        else:
+            self._idle.put(driver)
+
+    def _discard(self, driver):
+        if driver is None:
+            return
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f'Error quitting browser: {str(e)}')
+
+    def _isHealthy(self, driver):
+        try:
+            return len(driver.window_handles) > 0 and driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _resetState(self, driver):
+        """
+        Clears everything one page could leak into the next lease: extra tabs, storage and cookies.
+
+        :return: True if the browser was reset and can be reused, False otherwise
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            logging.warning(f'Could not reset browser state: {str(e)}')
+            return False
@@ -0,0 +1,200 @@
+import logging
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from page_facts import PageFacts, extractPageFacts, parsePage
+from metrics import stage
+from crawl_scheduler import reportThrottle
+from static_price import extractStaticPrice
+
+HTTP_TIER = "http"
+BROWSER_TIER = "browser"
+
+# Headers of a desktop Chrome so the plain HTTP tier is served the same page as the browser
+REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Markup left behind by bot walls (Cloudflare, PerimeterX, DataDome, Incapsula, Akamai)
+CHALLENGE_MARKERS = ["cf-browser-verification", "challenge-platform", "_cf_chl_opt", "px-captcha",
+                     "captcha-delivery.com", "_incapsula_resource", "/_sec/cp_challenge"]
+CHALLENGE_TITLES = ["just a moment", "access denied", "attention required", "are you a robot",
+                    "verify you are a human", "robot or human", "pardon our interruption"]
+
+_session = None
+_session_lock = threading.Lock()
+
+########### FUNCTION DEFINITIONS ############
+
+class ChallengePage(Exception):
+    """
+    Raised for a bot-wall or challenge page the browser was served instead of the product, so its title
+    and other fields are neither returned nor cached.
+    """
+
+
+def getSession():
+    """
+    Returns the process-wide requests session, whose keep-alive connections are reused across pages.
+
+    :return: a requests.Session with a pooled HTTP adapter and browser-like default headers
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers.update(REQUEST_HEADERS)
+    return _session
+
+
+def fetchStatic(url, timeout=10):
+    """
+    Fetches the raw HTML of a page without a browser.
+
+    :param url: URL of the product page
+    :param timeout: seconds to wait for the server before giving up
+    :return: a tuple of the HTTP status code and the response body as bytes, or None if the request failed
+    """
+    try:
+        response = getSession().get(url, timeout=timeout)
+        return response.status_code, response.content
+    except requests.RequestException as e:
+        logging.warning(f'Static fetch failed for {url}: {str(e)}')
+        return None
+
+
+def isChallengePage(html, status=200, markup=None):
+    """
+    Detects bot-wall and challenge pages served instead of the product.
+
+    :param html: BeautifulSoup object of the fetched page, or its PageFacts
+    :param status: HTTP status code the page was served with
+    :param markup: raw HTML the page was parsed from, needed when html only holds some fragments of it
+    or is a PageFacts object
+    :return: True if the page looks like a challenge or block page
+    """
+    if status in (403, 429, 503):
+        return True
+    if isinstance(html, PageFacts):
+        title_text = (html.title or "").strip().lower()
+    else:
+        title = html.find("title")
+        title_text = title.text.strip().lower() if title else ""
+    if any(marker in title_text for marker in CHALLENGE_TITLES):
+        return True
+    if markup is None:
+        markup = "" if isinstance(html, PageFacts) else str(html)
+    if isinstance(markup, bytes):
+        return any(marker.encode() in markup for marker in CHALLENGE_MARKERS)
+    return any(marker in markup for marker in CHALLENGE_MARKERS)
+
+
+def isStaticAdequate(html, status=200, markup=None):
+    """
+    Decides whether the static HTML already carries the product facts, so no browser is needed.
+
+    :param html: BeautifulSoup object of the fetched page
+    :param status: HTTP status code the page was served with
+    :param markup: raw HTML the page was parsed from, needed when html only holds some fragments of it
+    :return: True if the page has a Product JSON-LD block, or an og:title meta tag plus an og:image meta
+    tag or a price, and is not a challenge page
+    """
+    if status != 200 or isChallengePage(html, status, markup):
+        return False
+    facts = extractPageFacts(html)
+    if facts.product is not None:
+        return True
+    return (facts.metaTag("property", "og:title") is not None and
+            (facts.metaTag("property", "og:image") is not None or extractStaticPrice(facts) is not None))
+
+
+def fetchAdequateHtml(url, timeout=10):
+    """
+    Fetches a page over plain HTTP and returns it only if it is good enough to extract from.
+
+    :param url: URL of the product page
+    :param timeout: seconds to wait for the server before giving up
+    :return: a tuple of the raw response body and the BeautifulSoup object of the page, or None if the
+    page has to be rendered in a browser
+    """
+    with stage("http_fetch"):
+        fetched = fetchStatic(url, timeout)
+    if fetched is None:
+        return None
+    status, content = fetched
+    if status == 429:
+        # An explicit rate limit, unlike 403/503 bot walls which the browser tier may still get past
+        reportThrottle(url, "429")
+    with stage("parse"):
+        html = parsePage(content)
+    with stage("detect"):
+        adequate = isStaticAdequate(html, status, content)
+    if not adequate:
+        return None
+    return content, html
+
+
+def hostOf(url):
+    return urlsplit(url).netloc.lower()
+
+
+class HostTierRegistry:
+    """
+    Remembers per host which fetch tier last produced a usable page, so later URLs from the same host
+    skip straight to it. Hosts that needed the browser are re-probed over HTTP every reprobe_every pages.
+    """
+
+    def __init__(self, reprobe_every=50):
+        self.reprobe_every = reprobe_every
+        self._tiers = {}
+        self._browser_pages = {}
+        self._lock = threading.Lock()
+
+    def preferredTier(self, url):
+        """
+        :param url: URL about to be scraped
+        :return: HTTP_TIER or BROWSER_TIER
+        """
+        host = hostOf(url)
+        with self._lock:
+            if self._tiers.get(host) != BROWSER_TIER:
+                return HTTP_TIER
+            # Browser pages routed since the last probe; only counted here, so a failed probe that the
+            # browser then records does not shorten the interval
+            pages = self._browser_pages.get(host, 0) + 1
+            if self.reprobe_every and pages >= self.reprobe_every:
+                self._browser_pages[host] = 0
+                return HTTP_TIER
+            self._browser_pages[host] = pages
+            return BROWSER_TIER
+
+    def record(self, url, tier):
+        """
+        :param url: URL that was scraped
+        :param tier: the tier that produced the page
+        """
+        host = hostOf(url)
+        with self._lock:
+            self._tiers[host] = tier
+            if tier != BROWSER_TIER:
+                self._browser_pages.pop(host, None)
+
+    def snapshot(self):
+        """
+        :return: a copy of the host to tier mapping
+        """
+        with self._lock:
+            return dict(self._tiers)
+
+    def restore(self, tiers):
+        """
+        :param tiers: a host to tier mapping as returned by snapshot
+        """
+        with self._lock:
+            self._tiers.update(tiers)
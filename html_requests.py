@@ -1,5 +1,15 @@
 import json
 import logging
+from page_facts import PageFacts, pageFacts
+from image_extract import extract_image_url
+from static_price import extractStaticPrice, offerPrice, parsePriceText
+from metrics import stage, recordFailure
+
+# Strategies extractPage fills the item fields with, in the order they run unless told otherwise
+DEFAULT_STRATEGIES = ["jsonld", "tags"]
+
+# Fields whose source strategy is reported to the strategy registry
+SOURCED_FIELDS = ["TITLE", "BRAND", "PRICE", "COLOR", "GENDER"]
 
 ########### FUNCTION DEFINITIONS ############
 
@@ -8,30 +18,13 @@ def getProductSchema(item_html):
     """
     This function extracts product information from HTML code in JSON-LD format.
     
-    :param item_html: It is a string containing the HTML code of a webpage that contains information
-    about a product
+    :param item_html: BeautifulSoup object of a webpage that contains information about a product, or the
+    PageFacts already collected from it
     :return: a dictionary containing information about a product, extracted from the input HTML using
     the schema.org markup format. If no such information is found, the function returns None.
     """
-    scripts = item_html.find_all('script', {'type': 'application/ld+json'})
-    if scripts is None or len(scripts) == 0:
-        return None
-    
-    product_info = None
-
-    for script in scripts:
-        try:
-            data = json.loads(script.string)
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict) and item.get("@type") == "Product":
-                            product_info = item
-                            break
-            elif isinstance(data, dict) and data.get("@type") == "Product":
-                product_info = data
-        except json.JSONDecodeError:
-                continue
-    return product_info
+    facts = pageFacts(item_html)
+    return facts.product if facts is not None else None
 
 
 def extractSchemaFields(product_schema):
@@ -49,14 +42,16 @@ def extractSchemaFields(product_schema):
         return None
 
     # Initialize an empty dictionary to hold the extracted fields
-    extracted_fields = {"TITLE": None, "BRAND": None, "TYPE": None, "PRICE": None, "COLOR": None, "GENDER": None}
+    extracted_fields = {"TITLE": None, "BRAND": None, "TYPE": None, "PRICE": None, "COLOR": None, "GENDER": None,
+                        "MATERIAL": None}
 
     # Extract 'PRODUCT_TYPE', 'PRICE', 'COLOR', and 'BRAND'
     if "name" in product_schema:
         extracted_fields["TITLE"] = product_schema["name"]
     
-    if "offers" in product_schema and "price" in product_schema["offers"]:
-        extracted_fields["PRICE"] = product_schema["offers"]["price"]
+    # offers may be a single Offer, an AggregateOffer or a list of offers
+    if "offers" in product_schema and (price := offerPrice(product_schema["offers"])) is not None:
+        extracted_fields["PRICE"] = price[0]
 
     if "brand" in product_schema and "name" in product_schema["brand"]:
         extracted_fields["BRAND"] = product_schema["brand"]["name"]
@@ -67,6 +62,9 @@ def extractSchemaFields(product_schema):
     if "gender" in product_schema:
         extracted_fields["GENDER"] = product_schema["gender"]
 
+    if isinstance(product_schema.get("material"), str):
+        extracted_fields["MATERIAL"] = product_schema["material"]
+
     return extracted_fields
 
 
@@ -75,35 +73,159 @@ def extractFromTags(html):
     """
     The function extracts product attributes from HTML tags and returns it in a dictionary format.
     
-    :param html: The HTML code of a webpage that contains information about a product
+    :param html: The HTML code of a webpage that contains information about a product, or the PageFacts
+    already collected from it
     :return: a dictionary containing information extracted from the input HTML. The dictionary has keys
-    for "TITLE", "BRAND", "PRICE", "COLOR", "GENDER", and "Type". The values for these keys are
+    for "TITLE", "BRAND", "PRICE", "COLOR", "GENDER", "MATERIAL" and "Type". The values for these keys are
     extracted from the HTML using various methods such as finding specific HTML tags or attributes. If
     any of the information cannot be extracted, the corresponding value in the dictionary will be None
     """
-    if html is None:
-        logging.warning('Invalid or empty HTML.')
+    facts = pageFacts(html)
+    if facts is None:
         return None
 
-    extracted_info = {"TITLE": None, "BRAND": None,"Type": None, "PRICE": None, "COLOR": None, "GENDER": None}
+    extracted_info = {"TITLE": None, "BRAND": None,"Type": None, "PRICE": None, "COLOR": None, "GENDER": None,
+                      "MATERIAL": None}
 
-    product_name = html.find("meta", {"name": "title"}) or html.find("meta", {"property": "og:title"})
-    extracted_info["TITLE"] = product_name.get("content") if product_name else html.find("title").text
+    product_name = facts.metaTag("name", "title") or facts.metaTag("property", "og:title")
+    extracted_info["TITLE"] = product_name.get("content") if product_name else facts.title
 
-    brand = html.find("meta", {"property": "og:site_name"}) or html.find("div", {"class": "brand-name"})
+    brand = facts.metaTag("property", "og:site_name") or facts.brand_tag
     extracted_info["BRAND"] = brand.get("content") if brand else None
 
-    price = html.find("meta", {"name": "twitter:data1"}) 
-    if price is None:
-        price = html.find(lambda tag: tag.name in ['div', 'span'] and 
-                        'product-price' in tag.get('class', ''))
+    price = facts.metaTag("name", "twitter:data1") or facts.price_tag
     extracted_info["PRICE"] = price.get("content") if price and price.name == 'meta' else price.text.strip() if price else None
 
-
-    color = html.find("span", {"class": "product-color"})
+    color = facts.color_tag
     extracted_info["COLOR"] = color.text if color else None
 
-    gender = html.find("span", {"class": "product-gender"})
+    gender = facts.gender_tag
     extracted_info["GENDER"] = gender.text if gender else None
 
     return extracted_info
+
+
+def extractWithSelectors(html, selectors):
+    """
+    Reads item fields with hand-written CSS selectors.
+
+    :param html: BeautifulSoup object of the full product page
+    :param selectors: dictionary of item field, e.g. "BRAND", to CSS selector
+    :return: dictionary of item field to the content attribute or text of the first matching element
+    """
+    fields = {}
+    for field, selector in selectors.items():
+        tag = html.select_one(selector)
+        if tag is None:
+            continue
+        value = tag.get("content") or tag.get_text(" ", strip=True)
+        if value:
+            fields[field] = value
+    return fields
+
+
+def strategiesRun(strategies, sources):
+    """
+    :param strategies: field strategies extractPage was given, in order
+    :param sources: the sources dictionary extractPage filled
+    :return: the strategies that actually ran, up to the one that provided the fields
+    """
+    used = set(sources.values())
+    for position, strategy in enumerate(strategies):
+        if strategy in used:
+            return list(strategies[:position + 1])
+    return list(strategies)
+
+
+def extractPage(html, link, price=None, strategies=None, overrides=None, sources=None):
+    """
+    Extracts the product attributes from a parsed product page.
+
+    :param html: BeautifulSoup object of the product page, or the PageFacts already collected from it
+    :param link: URL of the product page
+    :param price: price found by extractPriceWithJS, None when the page was not rendered in a browser or
+    the static HTML already had a price
+    :param strategies: field strategies to try in order, "jsonld" and/or "tags", defaults to
+    DEFAULT_STRATEGIES. The first one that finds anything provides all the fields and the later ones do
+    not run, as with the JSON-LD, otherwise meta tags rule this replaces
+    :param overrides: item fields already read with per-host selectors, they take precedence
+    :param sources: optional dictionary filled with the strategy that produced each item field
+    :return: a tuple of the extracted item fields and the 0/1 success flags written to results.csv. PRICE
+    is the numeric price and CURRENCY its ISO code when either is known
+    """
+    sources = {} if sources is None else sources
+    item_fields = []
+    result_dict = {"Link": link, "Title": "0", "Brand": "0", "Price": "0", "Color": "0", "Gender": "0"}
+    with stage("extract"):
+        try:
+            # Collect the JSON-LD, meta tags and tag candidates once and let every extractor read from them
+            facts = pageFacts(html)
+
+            img = extract_image_url(facts)
+            if img:
+                result_dict["Image"] = "1"
+            else:
+                print(f"Image not extracted for {link}")
+                result_dict["Image"] = "0"
+
+            item_fields = {}
+            for strategy in strategies or DEFAULT_STRATEGIES:
+                if strategy == "jsonld":
+                    product_info = getProductSchema(facts)
+                    fields = extractSchemaFields(product_info) if product_info is not None else None
+                else:
+                    fields = extractFromTags(facts)
+                if fields:
+                    item_fields = dict(fields)
+                    sources.update((field, strategy) for field in SOURCED_FIELDS if fields.get(field))
+                    break
+            item_fields["IMAGE"] = img
+
+            for field, value in (overrides or {}).items():
+                if field == "PRICE":
+                    if (parsed := parsePriceText(value, require_currency=False)) is None:
+                        continue
+                    item_fields["PRICE"], item_fields["CURRENCY"] = parsed
+                else:
+                    item_fields[field] = value
+                sources[field] = "override"
+
+            if item_fields.get("IMAGE"):
+                result_dict["Image"] = "1"
+            if item_fields.get("TITLE"):
+                result_dict["Title"] = "1"
+            if item_fields.get("BRAND"):
+                result_dict["Brand"] = "1"
+            if item_fields.get("COLOR"):
+                result_dict["Color"] = "1"
+            if item_fields.get("GENDER"):
+                result_dict["Gender"] = "1"
+
+            # Prefer the price in the static HTML, fall back to the one the browser rendered
+            item_fields.setdefault("CURRENCY", None)
+            if sources.get("PRICE") == "override":
+                result_dict["Price"] = "1"
+            elif (static_price := extractStaticPrice(facts)) is not None:
+                item_fields["PRICE"] = static_price["value"]
+                item_fields["CURRENCY"] = static_price["currency"]
+                sources["PRICE"] = "static"
+                result_dict["Price"] = "1"
+            elif price:
+                if (parsed := parsePriceText(price, require_currency=False)) is not None:
+                    item_fields["PRICE"], item_fields["CURRENCY"] = parsed
+                else:
+                    item_fields["PRICE"] = price
+                sources["PRICE"] = "js_price"
+                result_dict["Price"] = "1"
+            else:
+                item_fields["PRICE"] = item_fields.get("PRICE") 
+                if item_fields["PRICE"] is None or item_fields["PRICE"] in ["0", "1"]:
+                    item_fields["PRICE"] = 0
+                elif item_fields["PRICE"]:
+                    result_dict["Price"] = "1"
+
+        except Exception as e:
+            print(f"Error processing {link}: {str(e)}")
+            recordFailure(e)
+
+    return item_fields, result_dict
@@ -0,0 +1,350 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from crawl_scheduler import CrawlScheduler, reportThrottle
+from fetcher import REQUEST_HEADERS
+from metrics import registry
+from page_facts import imageUrls, pageFacts
+
+# Largest image body downloaded, bigger ones are abandoned mid-stream
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Seconds to connect, and to wait between two chunks of the body
+DEFAULT_TIMEOUT = (5, 20)
+
+# Images of one host downloaded per second and at the same time; image CDNs take far more than product pages
+DEFAULT_HOST_RATE = 10
+DEFAULT_HOST_CONCURRENCY = 4
+
+IMAGE_HEADERS = dict(REQUEST_HEADERS, Accept="image/avif,image/webp,image/apng,image/*,*/*;q=0.8")
+
+# Leading bytes of the image formats retailers serve, to name stored files and to reject error pages
+SIGNATURES = [(b"\xff\xd8\xff", ".jpg"), (b"\x89PNG\r\n\x1a\n", ".png"), (b"GIF87a", ".gif"), (b"GIF89a", ".gif"),
+              (b"BM", ".bmp"), (b"II*\x00", ".tif"), (b"MM\x00*", ".tif"), (b"\x00\x00\x01\x00", ".ico")]
+
+registry.describe("image_downloads_total", "counter", "Image downloads, by outcome.")
+registry.describe("image_bytes_total", "counter", "Image bytes received.")
+
+_session = None
+_session_lock = threading.Lock()
+
+########### FUNCTION DEFINITIONS ############
+
+class ImageDownloadError(Exception):
+    """
+    Raised for an image that could not be downloaded: an HTTP error, a body that is not an image, or
+    one that is too large.
+    """
+
+
+class ImageTooLarge(ImageDownloadError):
+    """
+    Raised for an image body larger than the byte cap, before more than the cap is read.
+    """
+
+
+def getImageSession():
+    """
+    :return: the process-wide requests session for images, whose keep-alive connections are reused
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = createSession(32)
+    return _session
+
+
+def createSession(pool_size):
+    """
+    :param pool_size: keep-alive connections kept per host
+    :return: a requests.Session with a pooled HTTP adapter and image Accept headers
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(IMAGE_HEADERS)
+    return session
+
+
+def imageCandidates(html_content, base_url=None):
+    """
+    Lists every image a product page declares, best first: the images of its Product JSON-LD nodes,
+    then og:image and twitter:image.
+
+    :param html_content: BeautifulSoup object of the product page, or the PageFacts already collected from it
+    :param base_url: URL of the page, relative and protocol-relative image URLs are resolved against it
+    :return: list of absolute http(s) image URLs without duplicates
+    """
+    facts = pageFacts(html_content)
+    if facts is None:
+        return []
+    found = [url for product in facts.products for url in imageUrls(product.get("image"))]
+    found += [facts.metaContent("property", "og:image"), facts.metaContent("name", "twitter:image"),
+              facts.metaContent("property", "twitter:image")]
+    return normalizeCandidates(found, base_url)
+
+
+def normalizeCandidates(images, base_url=None):
+    """
+    :param images: an image URL, a schema.org image value, or a list of them; None entries are skipped
+    :param base_url: URL relative image URLs are resolved against
+    :return: list of absolute http(s) image URLs without duplicates
+    """
+    urls = []
+    for url in imageUrls([image for image in (images if isinstance(images, list) else [images]) if image]):
+        if url.startswith("//"):
+            url = f"{urlsplit(base_url).scheme if base_url else 'https'}:{url}"
+        elif base_url:
+            url = urljoin(base_url, url)
+        if urlsplit(url).scheme in ("http", "https") and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def imageExtension(head, content_type=None):
+    """
+    :param head: first bytes of the body
+    :param content_type: Content-Type header of the response
+    :return: file extension of the image format, or None if the body is not an image
+    """
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return ".avif"
+    if b"<svg" in head[:512].lower():
+        return ".svg"
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type.startswith("image/"):
+        return mimetypes.guess_extension(media_type) or ".img"
+    return None
+
+
+def streamBody(response, max_bytes=DEFAULT_MAX_BYTES, chunk_size=CHUNK_SIZE):
+    """
+    Yields the body of a streamed response in chunks, stopping before more than max_bytes are read.
+
+    :param response: requests response opened with stream=True
+    :param max_bytes: largest body accepted
+    :param chunk_size: bytes read at a time
+    :return: generator of byte chunks
+    """
+    declared = response.headers.get("Content-Length")
+    if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+        raise ImageTooLarge(f'Image of {declared} bytes is larger than {max_bytes}')
+    received = 0
+    for chunk in response.iter_content(chunk_size):
+        received += len(chunk)
+        if received > max_bytes:
+            raise ImageTooLarge(f'Image is larger than {max_bytes} bytes')
+        registry.inc("image_bytes_total", value=len(chunk))
+        yield chunk
+
+
+def fetchImageBytes(image, max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_TIMEOUT, session=None):
+    """
+    Downloads one image into memory over the shared keep-alive session.
+
+    :param image: an image URL, or a schema.org image value whose first URL is fetched
+    :param max_bytes: largest body accepted
+    :param timeout: seconds to connect and to wait between two chunks
+    :param session: requests session to use, defaults to getImageSession()
+    :return: the image bytes, or None if the download failed
+    """
+    urls = normalizeCandidates(image)
+    if not urls:
+        return None
+    try:
+        with (session or getImageSession()).get(urls[0], stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                if response.status_code == 429:
+                    reportThrottle(urls[0], "429")
+                registry.inc("image_downloads_total", {"result": "error"})
+                return None
+            data = b"".join(streamBody(response, max_bytes))
+    except (requests.RequestException, ImageDownloadError) as e:
+        logging.warning(f'Could not fetch image {urls[0]}: {str(e)}')
+        registry.inc("image_downloads_total", {"result": "too_large" if isinstance(e, ImageTooLarge) else "error"})
+        return None
+    registry.inc("image_downloads_total", {"result": "downloaded"})
+    return data
+
+
+class ImageDownloader:
+    """
+    Downloads product images into a content-addressed directory. Bodies stream to disk in chunks under
+    a byte cap and are stored once per sha256 digest, however many URLs serve them. An SQLite index
+    maps every URL to its image with the ETag and Last-Modified it was served with, so fetching a URL
+    again sends a conditional request and a 304 costs no body. Many images download at once over
+    keep-alive connections, with each host held to its own rate and concurrency by a CrawlScheduler.
+    """
+
+    def __init__(self, root, workers=8, host_rate=DEFAULT_HOST_RATE, host_concurrency=DEFAULT_HOST_CONCURRENCY,
+                 max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_TIMEOUT, session=None):
+        """
+        :param root: directory holding the objects folder and index.sqlite3, created if missing
+        :param workers: images downloaded at the same time across all hosts
+        :param host_rate: images per second started on any one host
+        :param host_concurrency: images of one host downloaded at the same time
+        :param max_bytes: largest image accepted
+        :param timeout: seconds to connect and to wait between two chunks
+        :param session: requests session to use, defaults to one with a connection pool per worker
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.scheduler = CrawlScheduler(workers=workers, rate=host_rate, burst=host_concurrency,
+                                        concurrency=host_concurrency)
+        self._session = session or createSession(max(workers, host_concurrency))
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS images (
+                                url TEXT PRIMARY KEY,
+                                digest TEXT NOT NULL,
+                                path TEXT NOT NULL,
+                                bytes INTEGER NOT NULL,
+                                content_type TEXT,
+                                etag TEXT,
+                                last_modified TEXT,
+                                fetched_at REAL NOT NULL,
+                                checked_at REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS images_digest ON images (digest)")
+        self._db.commit()
+
+    def download(self, url):
+        """
+        Downloads an image, or revalidates the stored copy of a URL fetched before.
+
+        :param url: absolute URL of the image
+        :return: dictionary with the url, digest, path relative to the root, bytes, content_type and
+        status: "downloaded", "duplicate" when another URL already stored the same image, or
+        "not_modified" when the server confirmed the stored copy
+        """
+        known = self.lookup(url)
+        headers = {}
+        if known is not None and os.path.exists(os.path.join(self.root, known["path"])):
+            if known["etag"]:
+                headers["If-None-Match"] = known["etag"]
+            if known["last_modified"]:
+                headers["If-Modified-Since"] = known["last_modified"]
+        try:
+            with self._session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 304 and headers:
+                    with self._lock:
+                        self._db.execute("UPDATE images SET checked_at = ? WHERE url = ?", (time.time(), url))
+                        self._db.commit()
+                    registry.inc("image_downloads_total", {"result": "not_modified"})
+                    return self._record(known, "not_modified")
+                if response.status_code != 200:
+                    if response.status_code == 429:
+                        reportThrottle(url, "429")
+                    raise ImageDownloadError(f'HTTP {response.status_code} for {url}')
+                digest, path, size = self._store(response)
+                entry = {"url": url, "digest": digest, "path": path, "bytes": size,
+                         "content_type": response.headers.get("Content-Type"),
+                         "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        except (requests.RequestException, ImageDownloadError) as e:
+            registry.inc("image_downloads_total", {"result": "too_large" if isinstance(e, ImageTooLarge) else "error"})
+            raise
+        with self._lock:
+            duplicate = self._db.execute("SELECT 1 FROM images WHERE digest = ? AND url != ? LIMIT 1",
+                                         (digest, url)).fetchone() is not None
+            now = time.time()
+            self._db.execute("INSERT OR REPLACE INTO images (url, digest, path, bytes, content_type, etag, last_modified, "
+                             "fetched_at, checked_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (url, digest, path, size, entry["content_type"], entry["etag"], entry["last_modified"],
+                              now, now))
+            self._db.commit()
+        status = "duplicate" if duplicate else "downloaded"
+        registry.inc("image_downloads_total", {"result": status})
+        return self._record(entry, status)
+
+    def downloadMany(self, urls):
+        """
+        Downloads images concurrently and yields each outcome as it finishes, in completion order.
+
+        :param urls: iterable of image URLs, duplicates are downloaded once
+        :return: generator of (url, record, exception) tuples, exception is None when the download worked
+        """
+        return self.scheduler.run(self.download, list(dict.fromkeys(urls)))
+
+    def downloadFirst(self, candidates):
+        """
+        :param candidates: image URLs of one product, best first, e.g. from imageCandidates
+        :return: the record of the first candidate that downloads, or None if none does
+        """
+        for url in candidates:
+            try:
+                return self.download(url)
+            except (requests.RequestException, ImageDownloadError) as e:
+                logging.info(f'Image candidate {url} failed: {str(e)}')
+        return None
+
+    def lookup(self, url):
+        """
+        :param url: image URL
+        :return: the index entry of the URL as a dictionary, or None if it was never downloaded
+        """
+        with self._lock:
+            row = self._db.execute("SELECT url, digest, path, bytes, content_type, etag, last_modified FROM images "
+                                   "WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("url", "digest", "path", "bytes", "content_type", "etag", "last_modified"), row))
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        self._session.close()
+
+    def _store(self, response):
+        objects = os.path.join(self.root, "objects")
+        descriptor, temp_path = tempfile.mkstemp(dir=objects, suffix=".tmp")
+        digest = hashlib.sha256()
+        size = 0
+        extension = None
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                for chunk in streamBody(response, self.max_bytes):
+                    if extension is None:
+                        extension = imageExtension(chunk, response.headers.get("Content-Type"))
+                        if extension is None:
+                            raise ImageDownloadError(f'{response.url} is not an image '
+                                                     f'({response.headers.get("Content-Type")})')
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            if size == 0:
+                raise ImageDownloadError(f'{response.url} returned an empty body')
+            hex_digest = digest.hexdigest()
+            path = os.path.join("objects", hex_digest[:2], hex_digest + extension)
+            target = os.path.join(self.root, path)
+            if os.path.exists(target):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return hex_digest, path, size
+
+    def _record(self, entry, status):
+        return {"url": entry["url"], "digest": entry["digest"], "path": entry["path"], "bytes": entry["bytes"],
+                "content_type": entry["content_type"], "status": status}
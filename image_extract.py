@@ -1,48 +1,35 @@
 import json 
-import requests
+from page_facts import pageFacts
+from image_downloader import DEFAULT_MAX_BYTES, fetchImageBytes
 
 def extract_image_url(html_content):
     """
     Extracts the main product image URL from the provided HTML content.
     
-    :param html_content: BeautifulSoup object of the HTML content of the product page.
-    :return: URL of the main product image or None if not found.
+    :param html_content: BeautifulSoup object of the HTML content of the product page, or the PageFacts
+    already collected from it.
+    :return: URL of the main product image or None if not found. Lists of images and ImageObjects are
+    reduced to the first URL.
     """
+    facts = pageFacts(html_content)
+    if facts is None:
+        return None
+
     # First, try to extract the image from the product schema
-    scripts = html_content.find_all('script', {'type': 'application/ld+json'})
-    for script in scripts:
-        try:
-            data = json.loads(script.string)
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict) and item.get("@type") == "Product":
-                        if "image" in item:
-                            return item["image"]
-            elif isinstance(data, dict) and data.get("@type") == "Product":
-                if "image" in data:
-                    return data["image"]
-        except json.JSONDecodeError:
-            continue
+    if (image := facts.productImage()) is not None:
+        return image
     
     # If the image URL is not in the product schema, try to extract it from meta tags
-    meta_image = html_content.find("meta", {"property": "og:image"})
-    if meta_image:
-        return meta_image.get("content")
-    
-    # If the above methods fail, add more methods or return None
-    return None
+    return facts.metaContent("property", "og:image")
 
-def fetch_image_data(image_url):
+def fetch_image_data(image_url, max_bytes=DEFAULT_MAX_BYTES):
     """
-    Fetches the image data from the provided URL.
+    Fetches the image data from the provided URL, streamed over the shared keep-alive session with a
+    timeout and a size cap. Use image_downloader.ImageDownloader to download many images to disk.
     
-    :param image_url: URL of the image to fetch.
+    :param image_url: URL of the image to fetch, or a list of URLs or ImageObjects as found in JSON-LD,
+    whose first URL is fetched.
+    :param max_bytes: largest image accepted, bigger ones are abandoned mid-download.
     :return: Binary content of the image or None if fetching fails.
     """
-    try:
-        response = requests.get(image_url)
-        if response.status_code == 200:
-            return response.content
-        return None
-    except Exception as e:
-        return None
+    return fetchImageBytes(image_url, max_bytes)
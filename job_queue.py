@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+# Seconds a worker may hold a job before it is handed to another worker
+DEFAULT_LEASE_SECONDS = 600
+
+# Attempts before a job is dead-lettered, and the backoff between them
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF = 30
+MAX_BACKOFF = 3600
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        url TEXT UNIQUE NOT NULL,
+        state TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at REAL NOT NULL,
+        lease_owner TEXT,
+        lease_expires REAL,
+        last_error TEXT,
+        result TEXT,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at);
+    CREATE INDEX IF NOT EXISTS jobs_leases ON jobs (state, lease_expires);
+    CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+        source TEXT PRIMARY KEY,
+        offset INTEGER NOT NULL,
+        lines INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    );
+"""
+
+########### FUNCTION DEFINITIONS ############
+
+def urlFromLine(line):
+    """
+    :param line: one line of a JSONL file, either a JSON object with a "url" (or "link") key or a JSON string
+    :return: the URL, or None if the line holds none
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        # A bare URL per line is accepted as well
+        return line if line.startswith(("http://", "https://")) else None
+    if isinstance(record, str):
+        return record
+    if isinstance(record, dict):
+        return record.get("url") or record.get("link")
+    return None
+
+
+class JobQueue:
+    """
+    Durable queue of URLs to scrape in a SQLite file that several worker processes drain at once.
+
+    Workers lease jobs for a limited time. A job whose lease expires, because its worker crashed or hung,
+    goes back to the queue. Failed jobs are retried with exponential backoff and dead-lettered after
+    max_attempts. Completed jobs keep their result, so a stopped crawl resumes exactly where it stopped.
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff=DEFAULT_BACKOFF):
+        """
+        :param path: SQLite file holding the queue, shared by every worker process
+        :param max_attempts: attempts before a job is dead-lettered
+        :param backoff: seconds before the first retry, doubled on every further retry
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly: every write takes the database lock up front with BEGIN
+        # IMMEDIATE, so two processes never both claim a job or deadlock upgrading a read to a write
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def add(self, urls):
+        """
+        :param urls: URLs to enqueue, the ones already in the queue are ignored
+        :return: number of new jobs
+        """
+        now = time.time()
+        with self._transaction():
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO jobs (url, state, available_at, updated_at) VALUES (?, ?, ?, ?)",
+                                 ((url, QUEUED, now, now) for url in urls))
+            return self._db.total_changes - before
+
+    def ingest(self, path, batch_size=1000):
+        """
+        Enqueues the URLs of a JSONL file, resuming after the last line a previous ingest of the same file
+        committed, so ingesting a file that is still being appended to only picks up the new lines.
+
+        :param path: JSONL file with one URL per line
+        :param batch_size: lines committed per transaction, along with the checkpoint
+        :return: number of new jobs
+        """
+        source = os.path.abspath(path)
+        with self._lock:
+            row = self._db.execute("SELECT offset, lines FROM ingest_checkpoints WHERE source = ?", (source,)).fetchone()
+        offset, lines = row if row is not None else (0, 0)
+        added = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                urls, read = [], 0
+                for raw in f:
+                    # A last line without its newline may still be being written
+                    if not raw.endswith(b"\n"):
+                        break
+                    read += 1
+                    offset += len(raw)
+                    if (url := urlFromLine(raw.decode("utf-8", "replace"))) is not None:
+                        urls.append(url)
+                    if read == batch_size:
+                        break
+                if read == 0:
+                    break
+                lines += read
+                now = time.time()
+                with self._transaction():
+                    before = self._db.total_changes
+                    self._db.executemany("INSERT OR IGNORE INTO jobs (url, state, available_at, updated_at) "
+                                         "VALUES (?, ?, ?, ?)", ((url, QUEUED, now, now) for url in urls))
+                    added += self._db.total_changes - before
+                    self._db.execute("INSERT OR REPLACE INTO ingest_checkpoints (source, offset, lines, updated_at) "
+                                     "VALUES (?, ?, ?, ?)", (source, offset, lines, now))
+                if read < batch_size:
+                    break
+        return added
+
+    def lease(self, owner, limit=1, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Claims the next ready jobs for a worker.
+
+        :param owner: identifier of the worker, e.g. host and process id
+        :param limit: most jobs claimed at once
+        :param lease_seconds: seconds the worker may hold them before they are handed to another worker
+        :return: list of (job id, URL, attempt number) tuples, empty when no job is ready
+        """
+        now = time.time()
+        with self._transaction():
+            self._requeueExpired(now)
+            rows = self._db.execute("SELECT id, url, attempts FROM jobs WHERE state = ? AND available_at <= ? "
+                                    "ORDER BY available_at, id LIMIT ?", (QUEUED, now, limit)).fetchall()
+            self._db.executemany("UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, "
+                                 "lease_expires = ?, updated_at = ? WHERE id = ?",
+                                 ((LEASED, owner, now + lease_seconds, now, row[0]) for row in rows))
+        return [(job_id, url, attempts + 1) for job_id, url, attempts in rows]
+
+    def complete(self, job_id, owner, result):
+        """
+        :param job_id: id returned by lease
+        :param owner: the worker holding the lease
+        :param result: JSON-serializable result stored with the job
+        :return: False if the lease had expired and the job was handed to another worker
+        """
+        with self._transaction():
+            cursor = self._db.execute("UPDATE jobs SET state = ?, result = ?, last_error = NULL, lease_owner = NULL, "
+                                      "lease_expires = NULL, updated_at = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                                      (DONE, json.dumps(result), time.time(), job_id, LEASED, owner))
+            return cursor.rowcount == 1
+
+    def fail(self, job_id, owner, error):
+        """
+        Puts a failed job back with a backoff, or dead-letters it once it used up its attempts.
+
+        :param job_id: id returned by lease
+        :param owner: the worker holding the lease
+        :param error: description of the failure
+        :return: the new state of the job, None if the lease had expired
+        """
+        now = time.time()
+        with self._transaction():
+            row = self._db.execute("SELECT attempts FROM jobs WHERE id = ? AND state = ? AND lease_owner = ?",
+                                   (job_id, LEASED, owner)).fetchone()
+            if row is None:
+                return None
+            state = DEAD if row[0] >= self.max_attempts else QUEUED
+            delay = min(MAX_BACKOFF, self.backoff * 2 ** (row[0] - 1))
+            self._db.execute("UPDATE jobs SET state = ?, available_at = ?, last_error = ?, lease_owner = NULL, "
+                             "lease_expires = NULL, updated_at = ? WHERE id = ?",
+                             (state, now + delay, str(error)[:2000], now, job_id))
+        return state
+
+    def retryDead(self):
+        """
+        Gives the dead-lettered jobs a fresh set of attempts.
+
+        :return: number of jobs requeued
+        """
+        now = time.time()
+        with self._transaction():
+            return self._db.execute("UPDATE jobs SET state = ?, attempts = 0, available_at = ?, updated_at = ? "
+                                    "WHERE state = ?", (QUEUED, now, now, DEAD)).rowcount
+
+    def progress(self):
+        """
+        :return: dictionary of job state to number of jobs, with the "ready" queued jobs and the total
+        """
+        counts = {state: 0 for state in (QUEUED, LEASED, DONE, DEAD)}
+        with self._lock:
+            counts.update(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            counts["ready"] = self._db.execute("SELECT COUNT(*) FROM jobs WHERE state = ? AND available_at <= ?",
+                                               (QUEUED, time.time())).fetchone()[0]
+        counts["total"] = sum(counts[state] for state in (QUEUED, LEASED, DONE, DEAD))
+        return counts
+
+    def nextAvailable(self):
+        """
+        :return: seconds until the next queued or leased job may be claimed, None when every job is done
+        or dead
+        """
+        with self._lock:
+            row = self._db.execute("SELECT MIN(CASE WHEN state = ? THEN available_at ELSE lease_expires END) FROM jobs "
+                                   "WHERE state IN (?, ?)", (QUEUED, QUEUED, LEASED)).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def results(self, state=DONE):
+        """
+        :param state: DONE for the results, DEAD for the dead letters
+        :return: generator of dictionaries with the url, attempts, last_error and stored result of each job
+        """
+        last_id = 0
+        while True:
+            # Read in pages, so exporting millions of jobs never holds the connection for long
+            with self._lock:
+                rows = self._db.execute("SELECT id, url, attempts, last_error, result FROM jobs WHERE state = ? "
+                                        "AND id > ? ORDER BY id LIMIT 1000", (state, last_id)).fetchall()
+            if not rows:
+                return
+            for last_id, url, attempts, last_error, result in rows:
+                yield {"url": url, "attempts": attempts, "error": last_error,
+                       "result": json.loads(result) if result else None}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _requeueExpired(self, now):
+        expired = self._db.execute("SELECT id, url, attempts, lease_owner FROM jobs WHERE state = ? AND lease_expires < ?",
+                                   (LEASED, now)).fetchall()
+        for job_id, url, attempts, owner in expired:
+            logging.warning(f'Lease of {url} held by {owner} expired, requeueing it')
+            state = DEAD if attempts >= self.max_attempts else QUEUED
+            self._db.execute("UPDATE jobs SET state = ?, available_at = ?, last_error = ?, lease_owner = NULL, "
+                             "lease_expires = NULL, updated_at = ? WHERE id = ?",
+                             (state, now, f'Lease expired while held by {owner}', now, job_id))
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
@@ -0,0 +1,281 @@
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import openai
+from deadline import Deadline, DeadlineExceeded
+from metrics import registry
+
+# Few-shot examples the batched prompt starts with
+FEW_SHOT_PROMPT = """
+    I am an AI model trained to identify details about a product from a given description. Here are a few examples:
+
+    Description: "Buy Blue & Grey Handbags for Women by BAGGIT Online | Ajio.com"
+    Details:
+    Brand - Aijo
+    Color - Blue and Grey
+    Type - Handbag
+    Material - Not Specified
+    Fit - Not Specified
+    Gender - Women
+
+    Description: "NIKE Air Force 1 Low LV8 1-Womens 7.5 CW0984-100"
+    Details:
+    Brand - Nike
+    Color - White
+    Type - Shoe
+    Material - Not specified
+    Fit - Not specified
+    Gender - Women
+
+    Description: "Amazon.com: Swarovski Attract Trilogy Drop Pierced Earrings with White Crystals on a Rhodium Plated Setting with Hinged Closure, 1 1/8 inches: Clothing, Shoes & Jewelry"
+    Details:
+    Brand - Swarovski
+    Color - White
+    Type - Jewelry
+    Material - Crystals
+    Fit - Not specified
+    Gender - Women
+
+    You can assume products like skirts, corsets, and dresses have the gender attribute "Women"
+"""
+
+BATCH_INSTRUCTIONS = """
+    Now, identify the product details of each of the following descriptions. Answer with one block per
+    description, in the same order, starting with its "### <number>" line followed by its details:
+"""
+
+# Splits a batched response into the blocks of its items
+ITEM_MARKER = re.compile(r"^\s*###\s*(\d+)\s*$", re.M)
+
+# Completion tokens allowed per item of a batch, the single-title prompt allowed 100
+TOKENS_PER_ITEM = 80
+
+DEFAULT_ENGINE = "text-davinci-003"
+
+registry.describe("llm_requests_total", "counter", "Completion requests sent to the LLM, by outcome.")
+registry.describe("llm_items_total", "counter", "Titles enriched, by whether the answer came from the cache or the LLM.")
+registry.describe("llm_tokens_total", "counter", "Tokens billed by the LLM, by prompt and completion.")
+registry.describe("llm_request_seconds", "histogram", "Latency of the completion requests sent to the LLM.")
+
+########### FUNCTION DEFINITIONS ############
+
+def normalizeTitle(title):
+    """
+    :param title: product title
+    :return: the cache key of the title, lowercased with whitespace collapsed
+    """
+    return " ".join(str(title).lower().split())
+
+
+def buildBatchPrompt(titles):
+    """
+    :param titles: product titles of one batch
+    :return: the few-shot prompt asking for the details of every title in one "### <number>" block each
+    """
+    descriptions = "\n".join(f"    ### {number}\n    Description: {title}" for number, title in enumerate(titles, 1))
+    return f"{FEW_SHOT_PROMPT}{BATCH_INSTRUCTIONS}\n{descriptions}\n"
+
+
+def splitBatchResponse(text, count):
+    """
+    Splits a batched response back into the "Key - Value" details of each item, as parseOutput reads them.
+
+    :param text: completion text answering buildBatchPrompt
+    :param count: number of titles in the batch
+    :return: list of count detail strings, None for the items the response has no block for
+    """
+    blocks = [None] * count
+    parts = ITEM_MARKER.split(text)
+    # parts alternates the text before the first marker, then number and block for every marker
+    for number, block in zip(parts[1::2], parts[2::2]):
+        index = int(number) - 1
+        if 0 <= index < count and blocks[index] is None:
+            blocks[index] = block.strip()
+    return blocks
+
+
+class EnrichmentClient:
+    """
+    Asks the LLM for the details of many product titles at once: titles are packed into batches sharing
+    one few-shot prompt, batches run concurrently under a requests-per-minute limit with retries, and
+    answers are cached by normalized title in memory and optionally in SQLite.
+
+    Pointing api_base at a local stand-in server (see benchmarks/fake_llm.py) exercises the whole client
+    without an API key.
+    """
+
+    RETRYABLE = (openai.error.RateLimitError, openai.error.APIError, openai.error.Timeout,
+                 openai.error.APIConnectionError, openai.error.ServiceUnavailableError, openai.error.TryAgain)
+
+    def __init__(self, api_key=None, api_base=None, engine=DEFAULT_ENGINE, batch_size=20, max_concurrency=4,
+                 requests_per_minute=60, max_retries=4, backoff=1.0, cache_path=None, timeout=60):
+        """
+        :param api_key: OpenAI API key
+        :param api_base: API base URL, None for the OpenAI API
+        :param engine: completion engine
+        :param batch_size: titles packed into one request
+        :param max_concurrency: requests in flight at the same time
+        :param requests_per_minute: requests started per minute, 0 for no limit
+        :param max_retries: retries of a request that failed with a rate limit or a server error
+        :param backoff: seconds before the first retry, doubled on every further retry
+        :param cache_path: SQLite file caching the answers across runs, None keeps them in memory only
+        :param timeout: seconds a request may take
+        """
+        self.api_key = api_key
+        self.api_base = api_base
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._interval = 60 / requests_per_minute if requests_per_minute else 0
+        self._next_start = 0.0
+        self._rate_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._memory = {}
+        self._cache_lock = threading.Lock()
+        self._db = None
+        if cache_path is not None:
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS enrichments (key TEXT PRIMARY KEY, stored_at REAL, value TEXT)")
+            self._db.commit()
+
+    def details(self, titles, deadline=None):
+        """
+        :param titles: product titles, duplicates are only asked for once
+        :param deadline: optional Deadline; requests and retries only use what is left of it, and the
+        batches still running when it passes are left out of the answer but cached when they arrive
+        :return: dictionary of normalized title to its "Key - Value" details, missing for the titles the
+        LLM gave no answer for
+        """
+        deadline = deadline or Deadline()
+        answers = {}
+        pending = {}
+        for title in titles:
+            key = normalizeTitle(title)
+            if key in answers or key in pending:
+                continue
+            if (cached := self._cached(key)) is not None:
+                answers[key] = cached
+                registry.inc("llm_items_total", {"source": "cache"})
+            else:
+                pending[key] = title
+        keys = list(pending)
+
+        # The titles are sent as first seen, the model reads brands better in their original case
+        batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+        futures = [self._pool.submit(self._askBatch, batch, [pending[key] for key in batch], deadline)
+                   for batch in batches]
+        done, late = wait(futures, timeout=deadline.budget())
+        for future in done:
+            answers.update(future.result())
+        if late:
+            deadline.skip("enrichment")
+        return answers
+
+    def enrich(self, items, parse, deadline=None):
+        """
+        Fills the items with the details of their titles.
+
+        :param items: item dictionaries with a TITLE key
+        :param parse: callable taking an item and its details string, e.g. openai_nlp.parseOutput
+        :param deadline: optional Deadline, the items whose answers did not arrive in time keep their fields
+        :return: the items, updated in place; an item whose answer cannot be parsed keeps its fields too
+        """
+        answers = self.details([item["TITLE"] for item in items if item.get("TITLE")], deadline)
+        for item in items:
+            if item.get("TITLE") and (block := answers.get(normalizeTitle(item["TITLE"]))) is not None:
+                try:
+                    parse(item, block)
+                except ValueError as e:
+                    logging.warning(f'Could not parse the LLM details of {item["TITLE"]!r}: {str(e)}')
+        return items
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._cache_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _askBatch(self, keys, titles, deadline):
+        """
+        :return: dictionary of normalized title to details for the titles of the batch that were answered
+        """
+        try:
+            blocks = splitBatchResponse(self._complete(buildBatchPrompt(titles), TOKENS_PER_ITEM * len(titles),
+                                                       deadline), len(titles))
+        except (openai.error.OpenAIError, DeadlineExceeded) as e:
+            logging.warning(f'LLM batch of {len(titles)} titles failed: {str(e)}')
+            blocks = [None] * len(titles)
+        answers = {}
+        for key, block in zip(keys, blocks):
+            if block is None:
+                registry.inc("llm_items_total", {"source": "missing"})
+                continue
+            answers[key] = block
+            self._store(key, block)
+            registry.inc("llm_items_total", {"source": "llm"})
+        return answers
+
+    def _complete(self, prompt, max_tokens, deadline):
+        for attempt in range(self.max_retries + 1):
+            self._waitForSlot()
+            deadline.check("enrichment")
+            started = time.perf_counter()
+            try:
+                response = openai.Completion.create(engine=self.engine, prompt=prompt, temperature=0,
+                                                    max_tokens=max_tokens, api_key=self.api_key,
+                                                    api_base=self.api_base,
+                                                    request_timeout=max(1, deadline.budget(self.timeout)))
+            except self.RETRYABLE as e:
+                delay = self.backoff * 2 ** attempt * random.uniform(0.8, 1.2)
+                # A retry that cannot finish before the deadline is not worth its tokens
+                if attempt < self.max_retries and deadline.remaining() <= delay:
+                    registry.inc("llm_requests_total", {"result": "failed"})
+                    raise
+                registry.inc("llm_requests_total", {"result": "retry" if attempt < self.max_retries else "failed"})
+                if attempt == self.max_retries:
+                    raise
+                logging.info(f'LLM request failed ({str(e)}), retrying in {delay:.1f}s')
+                time.sleep(delay)
+                continue
+            registry.observe("llm_request_seconds", time.perf_counter() - started)
+            registry.inc("llm_requests_total", {"result": "ok"})
+            usage = response.get("usage") or {}
+            for kind in ("prompt", "completion"):
+                registry.inc("llm_tokens_total", {"kind": kind}, usage.get(f"{kind}_tokens", 0))
+            return response["choices"][0]["text"]
+
+    def _waitForSlot(self):
+        # Spaces request starts evenly instead of letting them burst into the rate limit
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+        if start > now:
+            time.sleep(start - now)
+
+    def _cached(self, key):
+        with self._cache_lock:
+            if key in self._memory:
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM enrichments WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._memory[key] = json.loads(row[0])
+                    return self._memory[key]
+        return None
+
+    def _store(self, key, value):
+        with self._cache_lock:
+            self._memory[key] = value
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO enrichments (key, stored_at, value) VALUES (?, ?, ?)",
+                                 (key, time.time(), json.dumps(value)))
+                self._db.commit()
@@ -8,90 +8,436 @@ from selenium_stealth import stealth
 from price_parser import extractPriceWithJS
 from html_requests import *
 from image_extract import *
+from page_facts import pageFacts, parsePage, DEFAULT_PARSER
+from static_price import extractStaticPrice
+from driver_pool import DriverPool, createDriver
+from page_loader import loadPage
+from browser_facts import collectPageFacts
+from network_capture import HOST_RULES, NetworkCapture, mergeCapturedFields
+from fetcher import ChallengePage, HostTierRegistry, fetchAdequateHtml, isChallengePage, HTTP_TIER, BROWSER_TIER
+from crawl_scheduler import CrawlScheduler, forwardThrottle, reportThrottle
+from scrape_executor import ScrapeExecutor, ExecutorSaturated
+from scrape_supervisor import ScrapeSupervisor
+from result_cache import ResultCache, canonicalizeUrl
+from single_flight import SingleFlight
+from strategy_registry import StrategyRegistry
+from snapshot_archive import SnapshotArchive
+from output_sinks import makeRecord, openSink
+from deadline import Deadline, runHedged
+from image_downloader import ImageDownloader, normalizeCandidates
+from metrics import registry, traceScrape, stage, recordTier, recordAttributes, recordFailure
 from seleniumbase import Driver 
 import time
-import csv
 from collections import defaultdict
 import os
+import atexit
+import functools
+import asyncio
+import json
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
 import urllib.parse
 
 app = FastAPI()
 
+# Opt-in capture of the product JSON single-page retailers load from their own APIs, with per-host URL rules
+NETWORK_CAPTURE = os.environ.get("NETWORK_CAPTURE", "0") == "1"
+network_rules = dict(HOST_RULES, **json.loads(os.environ.get("NETWORK_CAPTURE_RULES", "{}")))
+
+# Browsers return from navigation before the load event and skip images, fonts, media and trackers
+PAGE_LOAD_DEADLINE = float(os.environ.get("PAGE_LOAD_DEADLINE", "15"))
+driver_factory = functools.partial(createDriver,
+                                   page_load_strategy=os.environ.get("PAGE_LOAD_STRATEGY", "none"),
+                                   blocked_urls=None if os.environ.get("BLOCK_RESOURCES", "1") == "1" else [],
+                                   capture_network=NETWORK_CAPTURE)
+
+# Collect the product facts inside the browser instead of transferring and parsing the whole page_source
+BROWSER_FACTS = os.environ.get("BROWSER_FACTS", "1") == "1"
+
+# Pre-launched browsers shared by /item and testLinks
+driver_pool = DriverPool(size=int(os.environ.get("DRIVER_POOL_SIZE", "2")),
+                         max_pages=int(os.environ.get("DRIVER_MAX_PAGES", "50")),
+                         driver_factory=driver_factory)
+atexit.register(driver_pool.close)
+
+# Remembers per host whether plain HTTP is enough or the page needs the browser
+tier_registry = HostTierRegistry()
+
+# Set in the worker processes of scrape_supervisor, which send what they learn to the parent instead of saving it
+SCRAPE_WORKER = os.environ.get("SCRAPE_WORKER") == "1"
+
+# Learns per host which extraction strategies work, persisted with the host tiers across restarts
+strategy_registry = StrategyRegistry(path=os.environ.get("STRATEGY_STATE_PATH", "strategy_state.json") or None,
+                                     overrides=json.loads(os.environ.get("STRATEGY_OVERRIDES", "{}")),
+                                     tier_registry=tier_registry, read_only=SCRAPE_WORKER)
+if not SCRAPE_WORKER:
+    atexit.register(strategy_registry.save)
+
+SCRAPE_TIMEOUT = float(os.environ.get("SCRAPE_TIMEOUT", "60"))
+
+# Opt-in worker processes, each with its own DRIVER_POOL_SIZE browsers, so parsing runs on every core
+SCRAPE_PROCESSES = int(os.environ.get("SCRAPE_PROCESSES", "0"))
+scrape_supervisor = ScrapeSupervisor(processes=SCRAPE_PROCESSES, threads_per_process=driver_pool.size,
+                                     strategy_registry=strategy_registry,
+                                     scrape_timeout=SCRAPE_TIMEOUT) if SCRAPE_PROCESSES > 0 else None
+if scrape_supervisor is not None:
+    atexit.register(scrape_supervisor.close)
+scrape_capacity = scrape_supervisor.capacity if scrape_supervisor is not None else driver_pool.size
+
+# Keeps blocking scrapes off the event loop and rejects callers once the wait queue is full
+scrape_executor = ScrapeExecutor(max_in_flight=int(os.environ.get("SCRAPE_MAX_IN_FLIGHT", scrape_capacity)),
+                                 max_queue=int(os.environ.get("SCRAPE_MAX_QUEUE", "16")))
+# Admission slots all /items batches share, see batchSlots
+batch_slots = None
+# Seconds /item waits past the deadline for the partial fields of a scrape the deadline cut short
+DEADLINE_GRACE = 5
+# Seconds a page may go without a readiness signal before it is also tried in a second browser, 0 never hedges
+HEDGE_DELAY = float(os.environ.get("HEDGE_DELAY", "0"))
+
+# Spreads testLinks crawls across hosts while holding each host to its own rate and concurrency limits
+crawl_scheduler = CrawlScheduler(workers=int(os.environ.get("CRAWL_WORKERS", scrape_capacity * 2)),
+                                 rate=float(os.environ.get("CRAWL_HOST_RATE", "0.5")),
+                                 concurrency=int(os.environ.get("CRAWL_HOST_CONCURRENCY", "2")),
+                                 host_limits=json.loads(os.environ.get("CRAWL_HOST_LIMITS", "{}")))
+
+# Where testLinks writes its results, the extension picks CSV, JSONL or SQLite
+RESULTS_PATH = os.environ.get("RESULTS_PATH", "results.csv")
+# When set, testLinks downloads the product images into this content-addressed directory
+IMAGE_DIR = os.environ.get("IMAGE_DIR")
+
+# Extracted items keyed by canonical URL, so popular products are not re-scraped on every request
+result_cache = ResultCache(path=os.environ.get("CACHE_PATH", "scrape_cache.sqlite3") or None,
+                           max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", "1024")),
+                           default_ttl=float(os.environ.get("CACHE_TTL", "3600")),
+                           host_ttls=json.loads(os.environ.get("CACHE_HOST_TTLS", "{}")))
+atexit.register(result_cache.close)
+
+# Concurrent requests for the same canonical URL share one scrape
+in_flight = SingleFlight()
+
+# Opt-in archive of every fetched page, replayed offline with replay.py
+snapshot_archive = SnapshotArchive(os.environ["SNAPSHOT_ARCHIVE_DIR"]) if os.environ.get("SNAPSHOT_ARCHIVE_DIR") else None
+
+@app.on_event("startup")
+def warmDriverPool():
+    if scrape_supervisor is not None:
+        scrape_supervisor.start()
+    else:
+        driver_pool.start()
+
+@app.on_event("shutdown")
+def closeDriverPool():
+    scrape_executor.shutdown()
+    if scrape_supervisor is not None:
+        scrape_supervisor.close()
+    driver_pool.close()
+    result_cache.close()
+
 @app.get("/")
 async def root():
     return "Application live"
 
 @app.get("/item")
-async def read_item(url: str):
+async def read_item(url: str, timeout: Optional[float] = None, max_age: Optional[float] = None, timings: bool = False):
+    if url == None or url == "":
+        raise HTTPException(status_code=400, detail="URL Missing")
+    try:
+        return await scrapeItem(url, timeout or SCRAPE_TIMEOUT, max_age, timings=timings)
+    except ExecutorSaturated as e:
+        recordFailure(e)
+        raise HTTPException(status_code=503, detail="Scraper busy", headers={"Retry-After": str(e.retry_after)})
+    except (asyncio.TimeoutError, TimeoutError) as e:
+        recordFailure(e)
+        raise HTTPException(status_code=504, detail="Scrape timed out")
+
+@app.delete("/item")
+async def invalidate_item(url: str):
     if url == None or url == "":
         raise HTTPException(status_code=400, detail="URL Missing")
-    return getData(url)
+    return {"invalidated": await asyncio.to_thread(result_cache.invalidate, url)}
+
+@app.get("/cache")
+async def cache_stats():
+    return result_cache.stats()
+
+@app.get("/strategies")
+async def strategy_stats():
+    return strategy_registry.snapshot()
+
+@app.get("/metrics")
+async def read_metrics():
+    # The cache and single-flight counters are incremented as they happen, only the gauges are read here
+    registry.set("result_cache_memory_entries", result_cache.stats()["memory_entries"])
+    registry.set("scrape_executor_pending", scrape_executor.pending)
+    registry.set("driver_pool_idle", driver_pool.idle())
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+class ItemsRequest(BaseModel):
+    urls: List[str]
+    timeout: Optional[float] = None
+    max_age: Optional[float] = None
+
+@app.post("/items")
+async def read_items(request: ItemsRequest):
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="URLs Missing")
+    return StreamingResponse(streamItems(request.urls, request.timeout or SCRAPE_TIMEOUT, request.max_age),
+                             media_type="application/x-ndjson")
+
+async def scrapeItem(url, timeout, max_age=None, bypass_queue_limit=False, timings=False):
+    """
+    Returns the item fields of a product page from the result cache, or scrapes the page on the
+    executor and caches what was extracted. Concurrent calls for the same canonical URL share a single
+    scrape and its result or failure.
+
+    :param url: URL of the product page
+    :param timeout: deadline of the scrape in seconds, including its wait in the queue
+    :param max_age: only accept a cached entry younger than this many seconds
+    :param bypass_queue_limit: admit the scrape even if the executor queue is full
+    :param timings: add a TIMINGS field with the per-stage breakdown of the scrape in milliseconds
+    :return: the extracted item fields, with PARTIAL listing the stages the deadline cut short, if any
+    """
+    # Only the memory tier is read on the event loop, a lookup that has to go to SQLite runs on a thread
+    item = result_cache.peek(url, max_age)
+    if item is None and result_cache.persistent:
+        item = await asyncio.to_thread(result_cache.get, url, max_age)
+    elif item is None:
+        item = result_cache.get(url, max_age)
+    if item is not None:
+        return dict(item, TIMINGS={"cache": "hit"}) if timings else item
+
+    deadline = Deadline(timeout)
+
+    async def scrapeAndCache():
+        item, breakdown = await scrape_executor.run(getTimedData, url, deadline, bypass_queue_limit=bypass_queue_limit)
+        # Partial fields are returned but not cached, the next request gets a full scrape. set() only
+        # touches memory, the SQLite write is committed by the cache's background writer
+        if item and not item.get("PARTIAL"):
+            result_cache.set(url, item)
+        return item, breakdown
+
+    item, breakdown = await in_flight.do(canonicalizeUrl(url), scrapeAndCache, timeout + DEADLINE_GRACE)
+    return dict(item, TIMINGS=breakdown) if timings and item else item
+
+def batchSlots():
+    """
+    The admission limit shared by every /items batch: at most max_in_flight of their scrapes are in the
+    executor at once however many batches are streaming, so together they bypass its queue limit by a
+    bounded amount. Created on first use, inside the event loop that serves the batches.
+
+    :return: the process-wide asyncio.Semaphore of the batches
+    """
+    global batch_slots
+    if batch_slots is None:
+        batch_slots = asyncio.Semaphore(scrape_executor.max_in_flight)
+    return batch_slots
+
+async def streamItems(urls, timeout, max_age=None):
+    """
+    Scrapes a batch of URLs concurrently and yields one NDJSON record per URL as soon as it finishes.
+    The batch waits for admission slots shared with the other batches instead of the executor queue.
+
+    :param urls: list of product page URLs
+    :param timeout: seconds allowed per URL once its scrape has started
+    :param max_age: only accept cached entries younger than this many seconds
+    :return: an async generator of newline-terminated JSON strings holding the input index, the URL and
+    either the extracted item or an error message, in completion order
+    """
+    slots = batchSlots()
+
+    async def scrapeOne(index, url):
+        record = {"index": index, "url": url}
+        if url == None or url == "":
+            record["error"] = "URL Missing"
+            return record
+        async with slots:
+            try:
+                record["item"] = await scrapeItem(url, timeout, max_age, bypass_queue_limit=True)
+            except (asyncio.TimeoutError, TimeoutError):
+                record["error"] = "Scrape timed out"
+            except Exception as e:
+                record["error"] = str(e)
+        return record
 
-def getData(test_input_link):
-    chrome_options = webdriver.ChromeOptions()
-    chrome_options.add_argument("--headless")  # Run in headless mode
-    chrome_options.add_argument("--disable-images")  # Disable images
-    chrome_options.add_argument("start-maximized")
-    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
-
-    driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=chrome_options)
-
-    stealth(driver,
-            languages=["en-US", "en"],
-            vendor="Google Inc.",
-            platform="Win32",
-            webgl_vendor="Intel Inc.",
-            renderer="Intel Iris OpenGL Engine",
-            fix_hairline=True,
-            )
-    fieldnames = ["Link", "Image", "Title", "Price", "Brand", "Color", "Gender"] 
-    item_fields = []
-    result_dict = {"Link": test_input_link, "Title": "0", "Brand": "0", "Price": "0", "Color": "0", "Gender": "0"}
+    tasks = [asyncio.ensure_future(scrapeOne(index, url)) for index, url in enumerate(urls)]
     try:
-        driver.get(test_input_link)
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # The client went away or the stream finished, stop scrapes that have not started yet
+        for task in tasks:
+            task.cancel()
 
-        html = BeautifulSoup(driver.page_source, 'html.parser')
-        
-        img = extract_image_url(html)
-        if img:
-            result_dict["Image"] = "1"
-        else:
-            print(f"Image not extracted for {test_input_link}")
-            result_dict["Image"] = "0"
-        
-        price = extractPriceWithJS(driver)
-        if price:
-            result_dict["Price"] = "1"
-
-        if (product_info := getProductSchema(html)) is not None:
-            item_fields = extractSchemaFields(product_info)
+def getData(test_input_link):
+    item_fields, result_dict = scrapeLink(test_input_link)
+
+    return item_fields
+
+
+def getTimedData(link, deadline=None):
+    """
+    :param link: URL of the product page
+    :param deadline: Deadline of the scrape, defaults to SCRAPE_TIMEOUT seconds from now
+    :return: a tuple of the extracted item fields and the per-stage timing breakdown of the scrape
+    """
+    if scrape_supervisor is not None:
+        return scrape_supervisor.getTimedData(link, deadline)
+    with traceScrape(link) as trace:
+        item_fields, result_dict = scrapeLink(link, deadline)
+    return item_fields, trace.breakdown()
+
+
+def scrapeLink(link, deadline=None):
+    """
+    Scrapes a product page with the cheapest tier that works for its host: a plain HTTP fetch when the
+    static HTML already carries the product facts, a pooled browser otherwise. Every stage only uses what
+    is left of the deadline. With HEDGE_DELAY set, a page without a readiness signal after that many
+    seconds is also tried in a second browser, and whichever attempt finishes first is used.
+
+    :param link: URL of the product page
+    :param deadline: Deadline of the scrape, defaults to SCRAPE_TIMEOUT seconds from now
+    :return: a tuple of the extracted item fields and the 0/1 success flags written to results.csv
+    """
+    deadline = deadline or Deadline(SCRAPE_TIMEOUT)
+    with traceScrape(link):
+        plan = strategy_registry.plan(link)
+        primary = functools.partial(scrapeWithTiers, link, plan)
+        if HEDGE_DELAY > 0:
+            # The hedge never waits for a browser, it only runs when one is free
+            hedge = forwardThrottle(functools.partial(scrapeWithBrowser, link, plan, lease_timeout=0))
+            result, tier = runHedged(primary, hedge, HEDGE_DELAY, deadline, accept=lambda attempt: bool(attempt[0][0]))
         else:
-            item_fields = extractFromTags(html) or {}
-
-        if item_fields.get("TITLE"):
-            result_dict["Title"] = "1"
-        if item_fields.get("BRAND"):
-            result_dict["Brand"] = "1"
-        if item_fields.get("COLOR"):
-            result_dict["Color"] = "1"
-        if item_fields.get("GENDER"):
-            result_dict["Gender"] = "1"
-
-        if price:
-            result_dict["Price"] = "1"
+            result, tier = primary(deadline)
+        tier_registry.record(link, tier)
+        recordTier(tier)
+        recordAttributes(result[1])
+        return result
+
+
+def scrapeWithTiers(link, plan, deadline, ready=None):
+    """
+    :param link: URL of the product page
+    :param plan: extraction plan from strategy_registry.plan
+    :param deadline: Deadline of the scrape
+    :param ready: optional threading.Event set once the page is fetched or its readiness signal is seen
+    :return: a tuple of the scrapeLink result and the tier that produced it
+    """
+    if (plan["tier"] or tier_registry.preferredTier(link)) == HTTP_TIER:
+        deadline.check("http_fetch")
+        if (fetched := fetchAdequateHtml(link, timeout=deadline.budget(10))) is not None:
+            if ready is not None:
+                ready.set()
+            content, html = fetched
+            if snapshot_archive is not None:
+                with stage("archive"):
+                    snapshot_archive.save(link, content, HTTP_TIER, plan=plan)
+            overrides = None
+            if plan["selectors"]:
+                overrides = extractWithSelectors(BeautifulSoup(content, DEFAULT_PARSER), plan["selectors"])
+            sources = {}
+            result = extractPage(html, link, strategies=plan["order"], overrides=overrides, sources=sources)
+            strategy_registry.record(link, strategiesRun(plan["order"], sources), sources, HTTP_TIER)
+            return result, HTTP_TIER
+    return scrapeWithBrowser(link, plan, deadline, ready)
+
+
+def scrapeWithBrowser(link, plan, deadline, ready=None, lease_timeout=None):
+    """
+    :param link: URL of the product page
+    :param plan: extraction plan from strategy_registry.plan
+    :param deadline: Deadline of the scrape
+    :param ready: optional threading.Event set once the page's readiness signal is seen
+    :param lease_timeout: seconds to wait for a free browser, defaults to what is left of the deadline
+    :return: a tuple of the scrapeLink result and BROWSER_TIER
+    """
+    deadline.check("lease")
+    with driver_pool.lease(timeout=deadline.budget() if lease_timeout is None else lease_timeout) as driver:
+        return scrapePage(driver, link, plan, deadline, ready), BROWSER_TIER
+
+
+def scrapePage(driver, link, plan=None, deadline=None, ready=None):
+    """
+    Navigates a leased driver to a product page and extracts the product attributes from it. When the
+    deadline runs out, navigation is stopped and the in-browser price finder skipped, and the fields
+    found in what loaded are returned with PARTIAL listing the stages cut short. A challenge page is a
+    failed scrape: it is reported to the crawl scheduler and returns no item fields.
+
+    :param driver: Selenium WebDriver instance, usually leased from driver_pool
+    :param link: URL of the product page
+    :param plan: extraction plan from strategy_registry.plan, looked up when None
+    :param deadline: Deadline of the scrape, defaults to SCRAPE_TIMEOUT seconds from now
+    :param ready: optional threading.Event set once the page's readiness signal is seen
+    :return: a tuple of the extracted item fields and the 0/1 success flags written to results.csv
+    """
+    plan = plan or strategy_registry.plan(link)
+    deadline = deadline or Deadline(SCRAPE_TIMEOUT)
+    # Optional strategies that ran, the field strategies that ran are known after extraction
+    attempted = []
+    find_price = "js_price" not in plan["skip"]
+    try:
+        capture = None
+        if NETWORK_CAPTURE and "network" not in plan["skip"]:
+            capture = NetworkCapture(driver, link, network_rules)
+            attempted.append("network")
+        with stage("navigate"):
+            signal = loadPage(driver, link, deadline.budget(PAGE_LOAD_DEADLINE),
+                              ready=capture.poll if capture is not None else None, cancelled=deadline.cancelled)
+        if signal == "cancelled" or (signal == "deadline" and deadline.expired()):
+            deadline.skip("navigate")
+        elif ready is not None:
+            ready.set()
+        if BROWSER_FACTS:
+            # One round-trip returns the fact fragments and the selector overrides
+            with stage("browser_facts"):
+                page_source, html, overrides = collectPageFacts(driver, selectors=plan["selectors"])
         else:
-            item_fields["PRICE"] = item_fields.get("PRICE") 
-            if item_fields["PRICE"] is None or item_fields["PRICE"] in ["0", "1"]:
-                item_fields["PRICE"] = 0
-
+            with stage("page_source"):
+                page_source = driver.page_source
+            with stage("parse"):
+                html = pageFacts(parsePage(page_source))
+            overrides = None
+            if plan["selectors"]:
+                overrides = extractWithSelectors(BeautifulSoup(page_source, DEFAULT_PARSER), plan["selectors"])
+        # Only pay for the in-browser price finder, which forces a layout, when the page has no usable static
+        # price. It is the one optional stage and only runs while the budget allows
+        price = None
+        if find_price and extractStaticPrice(html) is None and deadline.allows("js_price"):
+            with stage("js_price"):
+                price = extractPriceWithJS(driver)
+            attempted.append("js_price")
+        captured = capture.finish() if capture is not None else None
+        if isChallengePage(html, markup=page_source):
+            reportThrottle(link, "challenge")
+            # Fails the scrape like a navigation error, nothing of the bot wall reaches the result cache
+            raise ChallengePage(f'{link} answered with a challenge page')
+        if snapshot_archive is not None:
+            with stage("archive"):
+                # The fact fragments only hold what this version's extractors read, replay needs the whole page
+                if BROWSER_FACTS:
+                    page_source = driver.page_source
+                snapshot_archive.save(link, page_source, BROWSER_TIER, price, plan=plan, captured=captured)
     except Exception as e:
-        print(f"Error processing {test_input_link}: {str(e)}")
+        print(f"Error processing {link}: {str(e)}")
+        recordFailure(e)
+        return [], {"Link": link, "Title": "0", "Brand": "0", "Price": "0", "Color": "0", "Gender": "0"}
 
-    driver.quit()
-
-    return item_fields
+    sources = {}
+    item_fields, result_dict = extractPage(html, link, price, strategies=plan["order"], overrides=overrides,
+                                           sources=sources)
+    try:
+        mergeCapturedFields(item_fields, result_dict, captured, sources)
+    except Exception as e:
+        # The captured fields only fill gaps, the DOM fields are still worth returning
+        print(f"Could not merge the fields captured from the network of {link}: {str(e)}")
+    if deadline.skipped:
+        # Only complete scrapes teach the strategy registry what works on a host
+        if item_fields:
+            item_fields["PARTIAL"] = list(deadline.skipped)
+    else:
+        strategy_registry.record(link, strategiesRun(plan["order"], sources) + attempted, sources, BROWSER_TIER)
+    return item_fields, result_dict
 
 
 def testLinks():
@@ -115,89 +461,45 @@ def testLinks():
 
     ########### SESSION CREATION AND FUNCTION CALLS ############
 
-    chrome_options = webdriver.ChromeOptions()
-    chrome_options.add_argument("--headless")  # Run in headless mode
-    chrome_options.add_argument("--disable-images")  # Disable images
-    chrome_options.add_argument("start-maximized")
-    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    chrome_options.add_experimental_option('useAutomationExtension', False)
-
     ## Backup driver
     # driver = Driver(uc=True)
     # driver.get("https://nowsecure.nl/#relax")
     # time.sleep(6)
 
-    driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=chrome_options)
-
-    stealth(driver,
-            languages=["en-US", "en"],
-            vendor="Google Inc.",
-            platform="Win32",
-            webgl_vendor="Intel Inc.",
-            renderer="Intel Iris OpenGL Engine",
-            fix_hairline=True,
-            )
-
-    fieldnames = ["Link", "Image", "Title", "Price", "Brand", "Color", "Gender"] 
-    summary = defaultdict(int)
-    total_links = len(test_input_links)
-
-    if not os.path.exists('results.csv'):
-        with open('results.csv', 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-
-    # Loop through all links and get the HTML content
-    with open('results.csv', mode='a', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for link in test_input_links:
-            # company = link.split('/')[-2] if '/' in link else link
-            result_dict = {"Link": link, "Title": "0", "Brand": "0", "Price": "0", "Color": "0", "Gender": "0"}
-            try:
-                driver.get(link)
-
-                html = BeautifulSoup(driver.page_source, 'html.parser')
-                
-                img = extract_image_url(html)
-                if img:
-                    result_dict["Image"] = "1"
-                else:
-                    print(f"Image not extracted for {link}")
-                    result_dict["Image"] = "0"
-                
-                price = extractPriceWithJS(driver)
-                if price:
-                    result_dict["Price"] = "1"
-
-                if (product_info := getProductSchema(html)) is not None:
-                    item_fields = extractSchemaFields(product_info)
-                else:
-                    item_fields = extractFromTags(html) or {}
-
-                if item_fields.get("TITLE"):
-                    result_dict["Title"] = "1"
-                if item_fields.get("BRAND"):
-                    result_dict["Brand"] = "1"
-                if item_fields.get("COLOR"):
-                    result_dict["Color"] = "1"
-                if item_fields.get("GENDER"):
-                    result_dict["Gender"] = "1"
-
-                if price:
-                    result_dict["Price"] = "1"
-                else:
-                    item_fields["PRICE"] = item_fields.get("PRICE") 
-                    if item_fields["PRICE"] is None or item_fields["PRICE"] in ["0", "1"]:
-                        item_fields["PRICE"] = 0
-                
-                writer.writerow(result_dict)
+    scrape = scrape_supervisor.scrapeLink if scrape_supervisor is not None else scrapeLink
 
-            except Exception as e:
-                print(f"Error processing {link}: {str(e)}")
-                writer.writerow(result_dict)
+    def timedScrape(link):
+        started = time.perf_counter()
+        return scrape(link), time.perf_counter() - started
+
+    images = []
 
-    driver.quit()
+    # Loop through all links and stream the results to the buffered output sink
+    with openSink(RESULTS_PATH) as sink:
+        for link, result, error in crawl_scheduler.run(timedScrape, test_input_links):
+            # company = link.split('/')[-2] if '/' in link else link
+            if error is not None:
+                print(f"Failed to scrape {link}: {error}")
+                sink.write(makeRecord(link, error=f"{type(error).__name__}: {error}"))
+                continue
+            (item_fields, result_dict), seconds = result
+            sink.write(makeRecord(link, item_fields, result_dict, seconds))
+            if item_fields:
+                images.extend(normalizeCandidates(item_fields.get("IMAGE"), link))
+    print(f"Results written to {sink.path}")
+    print(sink.aggregate.table())
+
+    if IMAGE_DIR:
+        downloader = ImageDownloader(IMAGE_DIR, workers=crawl_scheduler.workers)
+        statuses = defaultdict(int)
+        for image_url, record, error in downloader.downloadMany(images):
+            statuses[record["status"] if error is None else "failed"] += 1
+        downloader.close()
+        print(f"Product images in {IMAGE_DIR}: {dict(statuses)}")
+
+    stats = crawl_scheduler.stats()
+    print(f"Crawled {stats['pages']} pages in {stats['seconds']}s: {stats['pages_per_minute']} pages/minute, "
+          f"throttled {stats['throttles']}")
 
 
 
@@ -0,0 +1,258 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+ATTRIBUTES = ["Image", "Title", "Price", "Brand", "Color", "Gender"]
+
+########### FUNCTION DEFINITIONS ############
+
+def _labelKey(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _formatLabels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and histograms rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._values = {}
+
+    def describe(self, name, metric_type, help_text):
+        with self._lock:
+            self._types[name] = metric_type
+            self._help[name] = help_text
+            self._values.setdefault(name, {})
+
+    def inc(self, name, labels=None, value=1):
+        """
+        :param name: counter name, e.g. scrape_failures_total
+        :param labels: dictionary of label name to value
+        :param value: amount to add
+        """
+        key = _labelKey(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, labels=None):
+        """
+        :param name: gauge name
+        :param value: current value
+        :param labels: dictionary of label name to value
+        """
+        with self._lock:
+            self._values.setdefault(name, {})[_labelKey(labels)] = value
+
+    def observe(self, name, value, labels=None):
+        """
+        :param name: histogram name, e.g. scrape_stage_seconds
+        :param value: observed value in seconds
+        :param labels: dictionary of label name to value
+        """
+        key = _labelKey(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def value(self, name, labels=None):
+        """
+        :return: the current value of a counter or gauge series, 0 if it was never set
+        """
+        with self._lock:
+            return self._values.get(name, {}).get(_labelKey(labels), 0)
+
+    def drain(self):
+        """
+        Takes the counters and histograms recorded since the last call, so a worker process can send
+        them to the process serving /metrics. Gauges stay where they are set.
+
+        :return: dictionary of metric name to its series, for merge
+        """
+        delta = {}
+        with self._lock:
+            for name, series in self._values.items():
+                if series and self._types.get(name) != "gauge":
+                    delta[name] = series
+                    self._values[name] = {}
+        return delta
+
+    def merge(self, delta):
+        """
+        Adds counters and histograms recorded elsewhere to this registry.
+
+        :param delta: dictionary returned by drain
+        """
+        with self._lock:
+            for name, series in delta.items():
+                target = self._values.setdefault(name, {})
+                for key, value in series.items():
+                    if not isinstance(value, dict):
+                        target[key] = target.get(key, 0) + value
+                        continue
+                    histogram = target.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+                    histogram["buckets"] = [count + added for count, added in zip(histogram["buckets"], value["buckets"])]
+                    histogram["sum"] += value["sum"]
+                    histogram["count"] += value["count"]
+
+    def render(self):
+        """
+        :return: every metric in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(self._values):
+                metric_type = self._types.get(name, "untyped")
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, value in sorted(self._values[name].items()):
+                    if isinstance(value, dict):
+                        for bound, count in zip(self.buckets, value["buckets"]):
+                            lines.append(f"{name}_bucket{_formatLabels(key, [('le', bound)])} {count}")
+                        lines.append(f"{name}_bucket{_formatLabels(key, [('le', '+Inf')])} {value['count']}")
+                        lines.append(f"{name}_sum{_formatLabels(key)} {value['sum']}")
+                        lines.append(f"{name}_count{_formatLabels(key)} {value['count']}")
+                    else:
+                        lines.append(f"{name}{_formatLabels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe("scrape_stage_seconds", "histogram", "Time spent in each scrape stage, per host.")
+registry.describe("scrape_seconds", "histogram", "End-to-end scrape time, per host and tier.")
+registry.describe("scrape_tier_total", "counter", "Scrapes served by each fetch tier.")
+registry.describe("scrape_failures_total", "counter", "Scrape failures by exception type.")
+registry.describe("scrape_attribute_total", "counter", "Scrapes per attribute and whether it was extracted.")
+registry.describe("result_cache_hits", "counter", "Result cache lookups answered from the cache.")
+registry.describe("result_cache_disk_hits", "counter", "Result cache hits that had to be read from SQLite.")
+registry.describe("result_cache_misses", "counter", "Result cache lookups that had to scrape.")
+registry.describe("result_cache_evictions", "counter", "Entries evicted from the in-memory result cache.")
+registry.describe("result_cache_memory_entries", "gauge", "Entries held in the in-memory result cache.")
+registry.describe("single_flight_leaders", "counter", "Scrapes started by single-flight coalescing.")
+registry.describe("single_flight_followers", "counter", "Requests that joined a scrape already in flight.")
+registry.describe("scrape_executor_pending", "gauge", "Scrapes running or waiting on the executor.")
+registry.describe("driver_pool_idle", "gauge", "Browsers idle in the driver pool.")
+
+_local = threading.local()
+
+
+class ScrapeTrace:
+    """
+    Per-stage timing breakdown of one scrape, collected on the thread doing the scrape.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.host = urlsplit(url).netloc.lower()
+        self.tier = None
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    def breakdown(self):
+        """
+        :return: dictionary of stage name to milliseconds, plus the tier and the total
+        """
+        timings = {stage: round(seconds * 1000, 3) for stage, seconds in self.timings.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 3)
+        timings["tier"] = self.tier
+        return timings
+
+
+def currentTrace():
+    """
+    :return: the ScrapeTrace of the scrape running on this thread, or None
+    """
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def traceScrape(url):
+    """
+    Starts a ScrapeTrace for the current thread. Nested calls reuse the outer trace, so only the
+    outermost one records the end-to-end time.
+
+    :param url: URL being scraped
+    :return: a context manager yielding the ScrapeTrace
+    """
+    trace = currentTrace()
+    if trace is not None:
+        yield trace
+        return
+    trace = _local.trace = ScrapeTrace(url)
+    try:
+        yield trace
+    finally:
+        _local.trace = None
+        labels = {"host": trace.host, "tier": trace.tier or "none"}
+        registry.observe("scrape_seconds", time.perf_counter() - trace.started, labels)
+        if trace.tier is not None:
+            registry.inc("scrape_tier_total", {"tier": trace.tier})
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a scrape stage into the scrape_stage_seconds histogram and the current trace, if any.
+
+    :param name: stage name, e.g. navigate or parse
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        trace = currentTrace()
+        registry.observe("scrape_stage_seconds", elapsed, {"stage": name, "host": trace.host if trace else ""})
+        if trace is not None:
+            trace.timings[name] = trace.timings.get(name, 0.0) + elapsed
+
+
+def recordTier(tier):
+    """
+    :param tier: the fetch tier that produced the page of the current scrape
+    """
+    trace = currentTrace()
+    if trace is not None:
+        trace.tier = tier
+
+
+def recordFailure(error):
+    """
+    :param error: exception raised while scraping
+    """
+    registry.inc("scrape_failures_total", {"type": type(error).__name__})
+
+
+def recordAttributes(result_dict):
+    """
+    Counts which attributes a scrape extracted, from the 0/1 flags also written to results.csv.
+
+    :param result_dict: the success flags returned by extractPage
+    """
+    for attribute in ATTRIBUTES:
+        registry.inc("scrape_attribute_total", {"attribute": attribute,
+                                                "extracted": "true" if result_dict.get(attribute) == "1" else "false"})
@@ -0,0 +1,243 @@
+import json
+import logging
+import re
+from urllib.parse import urlsplit
+from selenium.common.exceptions import WebDriverException
+from metrics import registry
+from page_facts import normalizeImage
+from static_price import normalizeCurrency, parsePriceText
+
+# URL patterns of the internal JSON APIs single-page retailers render their product pages from, keyed by
+# host suffix. Hosts without a rule have every JSON response with "product" in its URL inspected.
+HOST_RULES = {
+    "zara.com": r"/products?(-details)?\b|/product/.*\.json",
+    "shein.com": r"goods_detail|/product/get_goods|/detail/",
+    "nordstrom.com": r"/api/(ng-looks|product|style)",
+    "gap.com": r"/commerce/product|/resources/product|/product-details",
+    "oldnavy.com": r"/commerce/product|/resources/product|/product-details",
+}
+DEFAULT_RULE = r"product"
+
+# Keys a product-shaped JSON object may use for each attribute, in order of preference
+FIELD_KEYS = {
+    "TITLE": ["name", "productName", "product_name", "goods_name", "title", "displayName"],
+    "PRICE": ["price", "salePrice", "sale_price", "currentPrice", "current_price", "finalPrice", "retailPrice",
+              "salePriceAmount", "priceValue"],
+    "BRAND": ["brand", "brandName", "brand_name", "vendor", "designer"],
+    "IMAGE": ["image", "imageUrl", "image_url", "images", "mainImage", "primaryImage", "goods_img", "media"],
+    "COLOR": ["color", "colour", "colorName", "color_name"],
+    "GENDER": ["gender", "genderName"],
+}
+CURRENCY_KEYS = ["priceCurrency", "currency", "currencyCode", "currency_code"]
+
+# Largest response body fetched, and most bodies fetched per page
+MAX_BODY_BYTES = 2 * 1024 * 1024
+MAX_BODIES = 10
+
+# Bounds of the walk through a JSON payload looking for the product object
+MAX_DEPTH = 8
+MAX_NODES = 5000
+
+registry.describe("network_capture_total", "counter", "Browser page loads by whether a product JSON response was captured.")
+
+########### FUNCTION DEFINITIONS ############
+
+def ruleFor(url, rules=None):
+    """
+    :param url: URL of the product page
+    :param rules: dictionary of host suffix to URL pattern, defaults to HOST_RULES
+    :return: compiled pattern the API URLs of this host are matched against
+    """
+    host = urlsplit(url).netloc.lower().split(":")[0]
+    for suffix, pattern in (HOST_RULES if rules is None else rules).items():
+        if host == suffix or host.endswith("." + suffix):
+            return re.compile(pattern, re.I)
+    return re.compile(DEFAULT_RULE, re.I)
+
+
+def _firstKey(node, keys):
+    for key in keys:
+        value = node.get(key)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+
+def _scalar(value, keys=("name", "value", "amount", "text", "label", "displayName")):
+    if isinstance(value, dict):
+        return _scalar(_firstKey(value, keys))
+    if isinstance(value, list):
+        return _scalar(value[0]) if value else None
+    return value
+
+
+def productScore(node):
+    """
+    :param node: a dictionary from a JSON payload
+    :return: how many product attributes it carries, 0 unless it at least has a name and a price,
+    brand or image
+    """
+    present = {field for field, keys in FIELD_KEYS.items() if _firstKey(node, keys) is not None}
+    if "TITLE" not in present or present.isdisjoint({"PRICE", "BRAND", "IMAGE"}):
+        return 0
+    return len(present)
+
+
+def findProductPayload(data):
+    """
+    Finds the most product-like object in a JSON payload.
+
+    :param data: the parsed JSON response
+    :return: the dictionary with the highest productScore, or None
+    """
+    best, best_score = None, 0
+    stack = [(data, 0)]
+    visited = 0
+    while stack and visited < MAX_NODES:
+        node, depth = stack.pop()
+        visited += 1
+        if isinstance(node, dict):
+            score = productScore(node)
+            if score > best_score:
+                best, best_score = node, score
+            children = node.values()
+        elif isinstance(node, list):
+            children = node
+        else:
+            continue
+        if depth < MAX_DEPTH:
+            stack.extend((child, depth + 1) for child in children if isinstance(child, (dict, list)))
+    return best
+
+
+def payloadFields(node):
+    """
+    Maps a product-shaped JSON object to item fields.
+
+    :param node: the dictionary returned by findProductPayload
+    :return: dictionary with the TITLE, BRAND, PRICE, CURRENCY, COLOR, GENDER and IMAGE keys it carries
+    """
+    fields = {}
+    for field in ("TITLE", "BRAND", "COLOR", "GENDER"):
+        if (value := _scalar(_firstKey(node, FIELD_KEYS[field]))) is not None:
+            fields[field] = str(value).strip()
+    if (image := normalizeImage(_firstKey(node, FIELD_KEYS["IMAGE"]))) is not None:
+        fields["IMAGE"] = image
+    price = _firstKey(node, FIELD_KEYS["PRICE"])
+    currency = _scalar(_firstKey(node, CURRENCY_KEYS))
+    if isinstance(price, dict):
+        currency = currency or _scalar(_firstKey(price, CURRENCY_KEYS))
+        price = _scalar(price, ("value", "amount", "current", "sale", "price", "formatted"))
+    if isinstance(price, (int, float)) and not isinstance(price, bool) and price > 0:
+        fields["PRICE"], fields["CURRENCY"] = float(price), normalizeCurrency(currency)
+    elif isinstance(price, str) and (parsed := parsePriceText(price, require_currency=False)) is not None:
+        fields["PRICE"], fields["CURRENCY"] = parsed[0], normalizeCurrency(currency) or parsed[1]
+    return fields
+
+
+class NetworkCapture:
+    """
+    Watches the JSON responses a page loads while it navigates and keeps the first product-shaped one.
+
+    Needs a driver created with capture_network=True, which turns on Chrome's performance log.
+    """
+
+    def __init__(self, driver, url, rules=None):
+        """
+        :param driver: Selenium WebDriver instance
+        :param url: URL of the product page, selects the host rule
+        :param rules: dictionary of host suffix to URL pattern, defaults to HOST_RULES
+        """
+        self.driver = driver
+        self.pattern = ruleFor(url, rules)
+        self.fields = None
+        self.source = None
+        self._candidates = {}
+        self._fetched = 0
+        # Drop the events of the previous page
+        self._events()
+
+    def poll(self):
+        """
+        Reads the network events logged since the last call and inspects the matching JSON responses that
+        finished loading. Meant to be passed to loadPage as its ready callback.
+
+        :return: True once a product payload was captured
+        """
+        if self.fields is not None:
+            return True
+        for method, params in self._events():
+            if method == "Network.responseReceived":
+                response = params.get("response", {})
+                if "json" in response.get("mimeType", "") and self.pattern.search(response.get("url", "")):
+                    self._candidates[params["requestId"]] = response["url"]
+            elif method == "Network.loadingFinished" and params.get("requestId") in self._candidates:
+                url = self._candidates.pop(params["requestId"])
+                if params.get("encodedDataLength", 0) > MAX_BODY_BYTES or self._fetched >= MAX_BODIES:
+                    continue
+                if self._inspect(params["requestId"], url):
+                    return True
+        return False
+
+    def finish(self):
+        """
+        Inspects whatever finished loading since the last poll and counts the outcome.
+
+        :return: the captured item fields, or None
+        """
+        self.poll()
+        registry.inc("network_capture_total", {"result": "match" if self.fields is not None else "miss"})
+        return self.fields
+
+    def _events(self):
+        try:
+            entries = self.driver.get_log("performance")
+        except WebDriverException as e:
+            logging.warning(f'Could not read the performance log: {str(e)}')
+            return []
+        events = []
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, json.JSONDecodeError):
+                continue
+            events.append((message.get("method"), message.get("params", {})))
+        return events
+
+    def _inspect(self, request_id, url):
+        self._fetched += 1
+        try:
+            body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            data = json.loads(body.get("body", ""))
+        except (WebDriverException, json.JSONDecodeError, TypeError):
+            return False
+        if (node := findProductPayload(data)) is None:
+            return False
+        self.fields = payloadFields(node)
+        self.source = url
+        return True
+
+
+def mergeCapturedFields(item_fields, result_dict, captured, sources=None):
+    """
+    Fills the item fields the DOM extractors missed with the ones captured from the network.
+
+    :param item_fields: item fields returned by extractPage, updated in place; the empty list extractPage
+    returns when extraction failed is left alone
+    :param result_dict: 0/1 success flags returned by extractPage, updated in place
+    :param captured: fields returned by NetworkCapture.finish, or None
+    :param sources: optional dictionary of item field to strategy, the fields filled here are set to "network"
+    """
+    if not captured or not isinstance(item_fields, dict):
+        return
+    flags = {"TITLE": "Title", "BRAND": "Brand", "PRICE": "Price", "COLOR": "Color", "GENDER": "Gender",
+             "IMAGE": "Image"}
+    for field, flag in flags.items():
+        if captured.get(field) in (None, "") or item_fields.get(field) not in (None, "", 0):
+            continue
+        item_fields[field] = captured[field]
+        result_dict[flag] = "1"
+        if sources is not None:
+            sources[field] = "network"
+        if field == "PRICE":
+            item_fields["CURRENCY"] = captured.get("CURRENCY")
@@ -1,94 +1,102 @@
 #Set your OPENAI_API_KEY environment variable by adding the following line into your shell initialization 
 #script (e.g. .bashrc, zshrc, etc.) or running it in the command line before the fine-tuning command:
     #export OPENAI_API_KEY="<OPENAI_API_KEY>"
+import os
+import threading
 import config
-import openai
+from attribute_tagger import AttributeTagger, missingKeys
+from llm_enrichment import EnrichmentClient
+from metrics import registry
+from result_cache import ResultCache
 
-def updateWithNLP(extracted_info):
+# Fields the LLM is asked for when the tagger leaves them empty. Most titles name no material, so a missing
+# MATERIAL alone is not worth a request; it is filled from the answer when the item is sent anyway.
+LLM_FIELDS = ["BRAND", "COLOR", "TYPE", "GENDER"]
+
+registry.describe("nlp_items_total", "counter", "Items enriched, by whether the local tagger left anything for the LLM.")
+
+_tagger = None
+_tagger_lock = threading.Lock()
+_client = None
+_client_lock = threading.Lock()
+
+def getTagger():
+    """
+    Returns the process-wide attribute tagger, whose brand dictionary is seeded from the items already in
+    the result cache (CACHE_PATH).
+
+    :return: an AttributeTagger
+    """
+    global _tagger
+    with _tagger_lock:
+        if _tagger is None:
+            _tagger = AttributeTagger()
+            path = os.environ.get("CACHE_PATH", "scrape_cache.sqlite3")
+            if path and os.path.exists(path):
+                cache = ResultCache(path)
+                try:
+                    _tagger.learn(cache.items())
+                finally:
+                    cache.close()
+    return _tagger
+
+def getClient():
+    """
+    Returns the process-wide enrichment client, configured from the LLM_* environment variables and
+    OPENAI_API_BASE (a local stand-in server when set).
+
+    :return: an EnrichmentClient
     """
-    The function takes extracted information, generates NLP output, parses it, and returns updated
-    information.
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EnrichmentClient(api_key=config.OPENAI_KEY, api_base=os.environ.get("OPENAI_API_BASE") or None,
+                                       batch_size=int(os.environ.get("LLM_BATCH_SIZE", "20")),
+                                       max_concurrency=int(os.environ.get("LLM_CONCURRENCY", "4")),
+                                       requests_per_minute=float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "60")),
+                                       cache_path=os.environ.get("LLM_CACHE_PATH", "llm_cache.sqlite3") or None)
+    return _client
+
+def updateManyWithNLP(items, tagger=None, client=None, deadline=None):
+    """
+    Fills what it can of every item with the local attribute tagger, then asks the LLM for the items that
+    still miss fields, many titles per request.
+
+    :param items: item dictionaries as returned by extractPage
+    :param tagger: AttributeTagger run before the LLM, defaults to getTagger()
+    :param client: EnrichmentClient the leftovers are sent to, defaults to getClient()
+    :param deadline: optional Deadline, items the LLM could not answer in time keep what the tagger found
+    :return: the items, updated in place
+    """
+    tagger = tagger or getTagger()
+    leftovers = []
+    for item in items:
+        # Brands the extractors found teach the tagger, brands it tagged itself do not
+        tagger.addBrand(item.get("BRAND"))
+        tagger.fill(item)
+        if not missingKeys(item, LLM_FIELDS) or item.get("TITLE") is None:
+            registry.inc("nlp_items_total", {"llm": "skipped"})
+        else:
+            registry.inc("nlp_items_total", {"llm": "called"})
+            leftovers.append(item)
+    if leftovers:
+        (client or getClient()).enrich(leftovers, parseOutput, deadline)
+    return items
+
+def updateWithNLP(extracted_info, tagger=None):
+    """
+    The function takes extracted information, fills what it can with the local attribute tagger, and
+    only generates and parses NLP output for the fields still missing afterwards. Answers are cached by
+    title; use updateManyWithNLP to enrich many items in batched requests.
     
     :param extracted_info: It is a variable that contains information extracted from a source, such as a
     text document or a database. This information can be in the form of text, numbers, or other data
     types. The function "updateWithNLP" takes this extracted information as input and uses natural
     language processing (NLP
+    :param tagger: AttributeTagger run before the LLM, defaults to getTagger()
     :return: the updated information after processing it with NLP.
     """
-    # Generate NLP output
-    string_response = nlpOutput(extracted_info)
-
-    # Parse and update extracted info
-    updated_info = parseOutput(extracted_info, string_response)
-
-    return updated_info
-
-def nlpOutput(extracted_fields):
-    """
-    This function takes in extracted fields from a product description and uses OpenAI's
-    text-davinci-003 engine to generate a prompt asking for details about the product, returning the
-    generated response.
-    
-    :param extracted_fields: The parameter extracted_fields is a dictionary containing the extracted
-    fields from a product description. It is used to retrieve the product title, which is then used as
-    input for the NLP model to identify the product details
-    :return: The function `nlpOutput` takes in a dictionary `extracted_fields` as input and returns a
-    string that contains the product details extracted from the given product title using OpenAI's GPT-3
-    language model. If the product title is None, the function returns the string 'No product title
-    found'.
-    """
-
-    product_title = extracted_fields['TITLE']
-
-    if product_title is None:
-        return 'No product title found'
-
-    prompt = f"""
-    I am an AI model trained to identify details about a product from a given description. Here are a few examples:
-
-    Description: "Buy Blue & Grey Handbags for Women by BAGGIT Online | Ajio.com"
-    Details: 
-    Brand - Aijo
-    Color - Blue and Grey
-    Type - Handbag
-    Material - Not Specified
-    Fit - Not Specified 
-    Gender - Women
-
-    Description: "NIKE Air Force 1 Low LV8 1-Womens 7.5 CW0984-100"
-    Details: 
-    Brand - Nike
-    Color - White
-    Type - Shoe
-    Material - Not specified
-    Fit - Not specified
-    Gender - Women
-
-    Description: "Amazon.com: Swarovski Attract Trilogy Drop Pierced Earrings with White Crystals on a Rhodium Plated Setting with Hinged Closure, 1 1/8 inches: Clothing, Shoes & Jewelry"
-    Details: 
-    Brand - Swarovski
-    Color - White
-    Type - Jewelry
-    Material - Crystals
-    Fit - Not specified
-    Gender - Women
-
-    You can assume products like skirts, corsets, and dresses have the gender attribute "Women"
-
-    Now, for the following description, please identify the product details:
-
-    Description: {product_title}
-    """
-
-    openai.api_key = config.OPENAI_KEY
-
-    response = openai.Completion.create(
-    engine="text-davinci-003",
-    prompt=prompt,
-    temperature=0.5,
-    max_tokens=100
-    )
-    return response.choices[0].text.strip()
+    return updateManyWithNLP([extracted_info], tagger)[0]
 
 def parseOutput(extracted_info, string_response):
     """
@@ -107,7 +115,8 @@ def parseOutput(extracted_info, string_response):
     # Parse response string
     for line in string_response.split('\n'):
         if ' - ' in line:
-            key, value = [item.strip() for item in line.split(' - ')]
+            # Values may contain " - " themselves, e.g. "Blue - Grey", only the first one ends the key
+            key, value = [item.strip() for item in line.split(' - ', 1)]
             key = key.upper()  # Make key uppercase to match dictionary keys
             # Check for the key in the dictionary in a case-insensitive manner
             for info_key in extracted_info:
@@ -0,0 +1,277 @@
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+from metrics import ATTRIBUTES, registry
+
+# Item fields written as their own CSV columns, after the 0/1 success flags
+FIELD_COLUMNS = ["TITLE", "BRAND", "PRICE", "CURRENCY", "COLOR", "GENDER", "IMAGE"]
+CSV_COLUMNS = ["Link"] + ATTRIBUTES + FIELD_COLUMNS + ["Seconds", "Scraped At", "Error"]
+
+# Rows buffered before a sink writes them out, and the longest they wait when fewer arrive
+DEFAULT_FLUSH_ROWS = 100
+DEFAULT_FLUSH_SECONDS = 5
+
+registry.describe("output_rows_total", "counter", "Scrape results written by the output sinks, by sink.")
+registry.describe("output_flushes_total", "counter", "Buffered writes of the output sinks, by sink.")
+
+########### FUNCTION DEFINITIONS ############
+
+def makeRecord(link, item_fields=None, result_dict=None, seconds=None, error=None):
+    """
+    :param link: URL of the product page
+    :param item_fields: the extracted item fields, empty or None when the scrape failed
+    :param result_dict: the 0/1 success flags of the scrape
+    :param seconds: wall time of the scrape
+    :param error: description of the error that stopped the scrape, if any
+    :return: the record the output sinks write
+    """
+    flags = result_dict or {}
+    return {"link": link, "host": urlsplit(link).netloc, "scraped_at": time.time(),
+            "seconds": None if seconds is None else round(seconds, 3), "error": error,
+            "fields": item_fields or {}, "flags": {attribute: flags.get(attribute, "0") for attribute in ATTRIBUTES}}
+
+
+class SuccessAggregate:
+    """
+    Per-attribute success counts kept up to date as results arrive, so the success rates of a long run
+    can be read at any point without going back over its output.
+    """
+
+    def __init__(self):
+        self.pages = 0
+        self.captured = 0
+        self.extracted = {attribute: 0 for attribute in ATTRIBUTES}
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        """
+        :param record: a record built by makeRecord
+        """
+        with self._lock:
+            self.pages += 1
+            # Matches the README: a page counts as captured when the scrape got its HTML and any field out of it
+            if record["error"] is None and record["fields"]:
+                self.captured += 1
+                for attribute in ATTRIBUTES:
+                    self.extracted[attribute] += record["flags"].get(attribute) == "1"
+
+    def rates(self):
+        """
+        :return: dictionary of attribute to the percentage of captured pages it was extracted from
+        """
+        with self._lock:
+            return {attribute: 100 * count / self.captured if self.captured else 0.0
+                    for attribute, count in self.extracted.items()}
+
+    def table(self):
+        """
+        :return: the success rates in the format of the README's "Current Success Rates" section
+        """
+        rates = self.rates()
+        with self._lock:
+            pages, captured = self.pages, self.captured
+        lines = [f"Out of {pages} tested websites, the program succesfully captured the HTML of {captured} of them "
+                 f"({100 * captured / pages if pages else 0:.1f}%).",
+                 f"For the {captured} websites where the HTML was recovered, the program retrieved the following "
+                 f"attributes expressed as a percent:", ""]
+        lines.extend(f"- Product {attribute}: {rate:.1f}%" for attribute, rate in rates.items())
+        return "\n".join(lines)
+
+
+class OutputSink:
+    """
+    Buffers scrape records and writes them out in batches, every flush_rows records, at least every
+    flush_seconds while records are waiting, and on close. Subclasses implement _writeRows.
+    """
+
+    kind = None
+
+    def __init__(self, path, flush_rows=DEFAULT_FLUSH_ROWS, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        """
+        :param path: file the records are written to
+        :param flush_rows: records buffered before they are written
+        :param flush_seconds: seconds a buffered record waits at most, 0 only writes on flush_rows and close
+        """
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.aggregate = SuccessAggregate()
+        self._buffer = []
+        self._lock = threading.Lock()
+        # Serializes the writes themselves, so records reach the file in the order they were flushed
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_seconds:
+            self._flusher = threading.Thread(target=self._flushPeriodically, name=f"{self.kind}-sink", daemon=True)
+            self._flusher.start()
+
+    def write(self, record):
+        """
+        :param record: a record built by makeRecord
+        """
+        self.aggregate.add(record)
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError(f'Output sink {self.path} is closed')
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.flush_rows
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes out the buffered records.
+        """
+        with self._write_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if rows:
+                self._writeRows(rows)
+                registry.inc("output_rows_total", {"sink": self.kind}, len(rows))
+                registry.inc("output_flushes_total", {"sink": self.kind})
+
+    def close(self):
+        """
+        Writes out the buffered records and closes the file. Safe to call more than once.
+        """
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _flushPeriodically(self):
+        while not self._closed.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f'Writing results to {self.path} failed: {str(e)}')
+
+    def _writeRows(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class CsvSink(OutputSink):
+    """
+    Appends records to a CSV file: the success flags, the main item fields, the timing and the error.
+    The header is written only when the file is new. A file whose header has other columns, such as a
+    results.csv of the flags-only format, is left alone and the records go to a new file beside it.
+    """
+
+    kind = "csv"
+
+    def __init__(self, path, **options):
+        path = self._compatiblePath(path)
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+            self._file.flush()
+        super().__init__(path, **options)
+
+    @staticmethod
+    def _compatiblePath(path):
+        stem, extension = os.path.splitext(path)
+        candidate, number = path, 1
+        while os.path.exists(candidate) and os.path.getsize(candidate) > 0:
+            with open(candidate, newline="", encoding="utf-8") as f:
+                if next(csv.reader(f), None) == CSV_COLUMNS:
+                    break
+            candidate = f"{stem}-{number}{extension}"
+            number += 1
+        if candidate != path:
+            logging.warning(f'{path} has other columns, writing the results to {candidate}')
+        return candidate
+
+    def _writeRows(self, rows):
+        for record in rows:
+            row = {"Link": record["link"], "Seconds": record["seconds"], "Error": record["error"],
+                   "Scraped At": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record["scraped_at"]))}
+            row.update(record["flags"])
+            row.update((field, record["fields"].get(field)) for field in FIELD_COLUMNS)
+            self._writer.writerow(row)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class JsonlSink(OutputSink):
+    """
+    Appends one JSON object per record, with every extracted item field.
+    """
+
+    kind = "jsonl"
+
+    def __init__(self, path, **options):
+        self._file = open(path, "a", encoding="utf-8")
+        super().__init__(path, **options)
+
+    def _writeRows(self, rows):
+        self._file.write("".join(json.dumps(record, default=str) + "\n" for record in rows))
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class SqliteSink(OutputSink):
+    """
+    Inserts the records into a results table, one transaction per flush, with the item fields and
+    success flags as JSON.
+    """
+
+    kind = "sqlite"
+
+    def __init__(self, path, **options):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY, link TEXT, host TEXT, "
+                         "scraped_at REAL, seconds REAL, error TEXT, fields TEXT, flags TEXT)")
+        self._db.commit()
+        super().__init__(path, **options)
+
+    def _writeRows(self, rows):
+        with self._db:
+            self._db.executemany("INSERT INTO results (link, host, scraped_at, seconds, error, fields, flags) "
+                                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 ((record["link"], record["host"], record["scraped_at"], record["seconds"],
+                                   record["error"], json.dumps(record["fields"], default=str),
+                                   json.dumps(record["flags"])) for record in rows))
+
+    def _close(self):
+        self._db.close()
+
+
+SINKS = {".csv": CsvSink, ".jsonl": JsonlSink, ".ndjson": JsonlSink, ".sqlite": SqliteSink,
+         ".sqlite3": SqliteSink, ".db": SqliteSink}
+
+
+def openSink(path, **options):
+    """
+    :param path: output file, its extension picks the format: .csv, .jsonl or .sqlite3
+    :param options: flush_rows and flush_seconds
+    :return: the output sink
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SINKS:
+        raise ValueError(f'No output sink for {path}, use one of {", ".join(SINKS)}')
+    return SINKS[extension](path, **options)
@@ -0,0 +1,248 @@
+import json
+import logging
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+
+# Tags the extractors read, everything else is skipped during the pass
+FACT_TAGS = {"script", "meta", "title", "div", "span"}
+
+# Classes of the div/span candidates read by extractFromTags
+FACT_CLASSES = {"brand-name", "product-price", "product-color", "product-gender"}
+
+# Microdata properties read by extractStaticPrice, on any tag
+PRICE_ITEMPROPS = {"price", "priceCurrency"}
+
+# Most div/span elements with "price" in a class name kept for the static price text heuristics
+MAX_PRICE_TEXTS = 20
+
+########### FUNCTION DEFINITIONS ############
+
+class PageFacts:
+    """
+    Everything the extractors read from a product page, collected in one pass over the document.
+
+    :ivar product: the Product node used for schema extraction (first Product of the last JSON-LD block
+    that has one), or None
+    :ivar products: every Product node found in the JSON-LD blocks, in document order
+    :ivar meta: first <meta> tag per ("name", value) and ("property", value) key
+    :ivar title: text of the first <title> tag, or None
+    :ivar brand_tag: first div with the brand-name class, or None
+    :ivar price_tag: first div or span with the product-price class, or None
+    :ivar color_tag: first span with the product-color class, or None
+    :ivar gender_tag: first span with the product-gender class, or None
+    :ivar price_items: every tag with itemprop="price", in document order
+    :ivar currency_item: first tag with itemprop="priceCurrency", or None
+    :ivar price_texts: the first div and span tags with "price" in a class name, in document order
+    """
+
+    def __init__(self):
+        self.product = None
+        self.products = []
+        self.meta = {}
+        self.title = None
+        self.brand_tag = None
+        self.price_tag = None
+        self.color_tag = None
+        self.gender_tag = None
+        self.price_items = []
+        self.currency_item = None
+        self.price_texts = []
+
+    def metaTag(self, key, value):
+        """
+        :param key: "name" or "property"
+        :param value: the attribute value, e.g. "og:title"
+        :return: the first matching <meta> tag or None
+        """
+        return self.meta.get((key, value))
+
+    def metaContent(self, key, value):
+        """
+        :param key: "name" or "property"
+        :param value: the attribute value, e.g. "og:title"
+        :return: the content attribute of the first matching <meta> tag or None
+        """
+        tag = self.meta.get((key, value))
+        return tag.get("content") if tag is not None else None
+
+    def productImage(self):
+        """
+        :return: the image URL of the first Product node that declares one, or None
+        """
+        for product in self.products:
+            if "image" in product:
+                return normalizeImage(product["image"])
+        return None
+
+
+def isProductNode(node):
+    node_type = node.get("@type")
+    return node_type == "Product" or (isinstance(node_type, list) and "Product" in node_type)
+
+
+def findProductNodes(data):
+    """
+    Collects the Product nodes of parsed JSON-LD data, looking inside lists and @graph containers.
+
+    :param data: the result of json.loads on a JSON-LD block
+    :return: a list of Product dictionaries in document order
+    """
+    if isinstance(data, list):
+        return [product for item in data for product in findProductNodes(item)]
+    if not isinstance(data, dict):
+        return []
+    if isProductNode(data):
+        return [data]
+    if "@graph" in data:
+        return findProductNodes(data["@graph"])
+    return []
+
+
+def imageUrls(image):
+    """
+    Flattens a schema.org image value into its URLs.
+
+    :param image: a URL string, a list of URLs or ImageObjects, or an ImageObject dictionary
+    :return: list of the image URLs in document order, without duplicates
+    """
+    if isinstance(image, str):
+        return [image.strip()] if image.strip() else []
+    urls = []
+    if isinstance(image, list):
+        for candidate in image:
+            urls.extend(url for url in imageUrls(candidate) if url not in urls)
+    elif isinstance(image, dict):
+        for key in ("url", "contentUrl", "@id"):
+            if isinstance(image.get(key), str) and image[key].strip():
+                urls.append(image[key].strip())
+                break
+    return urls
+
+
+def normalizeImage(image):
+    """
+    Reduces a schema.org image value to a single URL.
+
+    :param image: a URL string, a list of URLs or ImageObjects, or an ImageObject dictionary
+    :return: the first image URL found, or None
+    """
+    urls = imageUrls(image)
+    return urls[0] if urls else None
+
+
+def _hasClass(tag, class_name):
+    classes = tag.get("class") or []
+    return class_name in classes
+
+
+def _hasPriceClass(classes):
+    if isinstance(classes, str):
+        classes = classes.split()
+    return any("price" in name.lower() for name in classes or [])
+
+
+def extractPageFacts(html):
+    """
+    Walks a parsed page once and collects the JSON-LD Product nodes, meta tags, price microdata and the
+    tag candidates used by getProductSchema, extractFromTags, extract_image_url and extractStaticPrice.
+
+    :param html: BeautifulSoup object of the product page
+    :return: a PageFacts object
+    """
+    facts = PageFacts()
+    for tag in html.descendants:
+        if not isinstance(tag, Tag):
+            continue
+        itemprop = tag.get("itemprop")
+        if itemprop == "price":
+            facts.price_items.append(tag)
+        elif itemprop == "priceCurrency" and facts.currency_item is None:
+            facts.currency_item = tag
+        name = tag.name
+        if name not in FACT_TAGS:
+            continue
+        if name == "meta":
+            for key in ("name", "property"):
+                value = tag.get(key)
+                if value is not None:
+                    facts.meta.setdefault((key, value), tag)
+        elif name == "script":
+            if tag.get("type") != "application/ld+json" or tag.string is None:
+                continue
+            try:
+                products = findProductNodes(json.loads(tag.string))
+            except json.JSONDecodeError:
+                continue
+            if products:
+                facts.product = products[0]
+                facts.products.extend(products)
+        elif name == "title":
+            if facts.title is None:
+                facts.title = tag.text
+        else:
+            if len(facts.price_texts) < MAX_PRICE_TEXTS and _hasPriceClass(tag.get("class")):
+                facts.price_texts.append(tag)
+            if facts.price_tag is None and _hasClass(tag, "product-price"):
+                facts.price_tag = tag
+            if name == "div":
+                if facts.brand_tag is None and _hasClass(tag, "brand-name"):
+                    facts.brand_tag = tag
+            else:
+                if facts.color_tag is None and _hasClass(tag, "product-color"):
+                    facts.color_tag = tag
+                if facts.gender_tag is None and _hasClass(tag, "product-gender"):
+                    facts.gender_tag = tag
+    return facts
+
+
+def _isFactFragment(name, attrs):
+    if attrs.get("itemprop") in PRICE_ITEMPROPS:
+        return True
+    if name in ("meta", "title"):
+        return True
+    if name == "script":
+        return attrs.get("type") == "application/ld+json"
+    if name in ("div", "span"):
+        classes = attrs.get("class") or []
+        if isinstance(classes, str):
+            classes = classes.split()
+        return not FACT_CLASSES.isdisjoint(classes) or _hasPriceClass(classes)
+    return False
+
+
+FACT_STRAINER = SoupStrainer(_isFactFragment)
+
+
+def parsePage(page_source, parser=None):
+    """
+    Parses only the fragments of a page the extractors read: meta tags, the title, JSON-LD scripts, price
+    microdata and the div/span candidates with their subtrees. The rest of the document is tokenized but
+    never built into the tree, which saves most of the CPU and memory of a full BeautifulSoup parse.
+
+    :param page_source: HTML of the page as a string or bytes
+    :param parser: BeautifulSoup tree builder to use, defaults to lxml when it is installed and
+    html.parser otherwise
+    :return: a BeautifulSoup object holding only the fact fragments, accepted by extractPageFacts and
+    every extractor
+    """
+    return BeautifulSoup(page_source, parser or DEFAULT_PARSER, parse_only=FACT_STRAINER)
+
+
+def pageFacts(page):
+    """
+    Lets extractors accept either a parsed page or facts that were already collected.
+
+    :param page: a BeautifulSoup object or a PageFacts object
+    :return: a PageFacts object, or None if page is None
+    """
+    if page is None:
+        logging.warning('Invalid or empty HTML.')
+        return None
+    if isinstance(page, PageFacts):
+        return page
+    return extractPageFacts(page)
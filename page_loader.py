@@ -0,0 +1,137 @@
+import logging
+import time
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from metrics import registry
+
+# Resource types and tracker hosts a product page does not need for extraction. The image URL is read
+# from JSON-LD/og:image, never from the loaded pixels.
+BLOCKED_EXTENSIONS = [
+    # images, fonts and media
+    "png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp",
+    "woff", "woff2", "ttf", "otf", "eot",
+    "mp4", "webm", "m3u8", "mp3", "mov",
+]
+# Patterns are matched against the whole URL, and CDNs (Shopify, Cloudinary, Scene7...) version their
+# assets with a query string, so every extension is blocked with and without one. Extensionless image
+# URLs are covered by disabling images in the browser, see driver_pool.createDriver.
+BLOCKED_URL_PATTERNS = [pattern for extension in BLOCKED_EXTENSIONS
+                        for pattern in (f"*.{extension}", f"*.{extension}?*")] + [
+    # image CDN paths
+    "*/image/upload/*", "*/is/image/*",
+    # analytics, ads and session recording
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*googleadservices.com*", "*connect.facebook.net*", "*analytics.tiktok.com*", "*bat.bing.com*",
+    "*ct.pinterest.com*", "*snap.licdn.com*", "*hotjar.com*", "*fullstory.com*", "*clarity.ms*",
+    "*segment.io*", "*cdn.segment.com*", "*criteo.com*", "*criteo.net*", "*taboola.com*", "*outbrain.com*",
+    "*quantserve.com*", "*scorecardresearch.com*", "*nr-data.net*", "*js-agent.newrelic.com*",
+]
+
+# Seconds loadPage waits for a readiness signal before giving up on the rest of the page
+PAGE_LOAD_DEADLINE = 15
+# Signals that say little about the product: with a ready callback, loadPage waits up to CAPTURE_GRACE
+# seconds past them for the callback or a JSON-LD block or price element
+WEAK_SIGNALS = ("og:title", "complete")
+CAPTURE_GRACE = 2
+
+# Returns the first readiness signal present in the current document, or null while it is still loading
+READY_SCRIPT = r"""
+    if (location.href === 'about:blank' || location.protocol === 'data:') {
+        return null;
+    }
+    const state = document.readyState;
+    if (state === 'complete') {
+        return 'complete';
+    }
+    if (state === 'loading') {
+        return null;
+    }
+    for (const script of document.querySelectorAll('script[type="application/ld+json"]')) {
+        if (/"@type"\s*:\s*(\[[^\]]*)?"Product"/.test(script.textContent)) {
+            return 'jsonld';
+        }
+    }
+    if (document.querySelector('[itemprop="price"], meta[property="product:price:amount"], meta[property="og:price:amount"]')) {
+        return 'price';
+    }
+    if (document.querySelector('meta[property="og:title"]')) {
+        return 'og:title';
+    }
+    return null;
+"""
+
+registry.describe("page_ready_total", "counter", "Browser page loads by the readiness signal they ended on.")
+
+########### FUNCTION DEFINITIONS ############
+
+def enableResourceBlocking(driver, patterns=None):
+    """
+    Makes Chrome refuse requests for heavy resources and trackers through the DevTools protocol.
+
+    :param driver: Selenium WebDriver instance of a Chromium browser
+    :param patterns: URL patterns with * wildcards, defaults to BLOCKED_URL_PATTERNS
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS if patterns is None else patterns})
+
+
+def loadPage(driver, url, deadline=PAGE_LOAD_DEADLINE, poll_interval=0.1, ready=None, cancelled=None):
+    """
+    Navigates to a product page and returns as soon as its product facts are in the DOM, instead of
+    waiting for the load event. Meant for drivers created with the "none" or "eager" page load strategy.
+
+    A page is ready once its DOM is parsed and it has a Product JSON-LD block, a price element or an
+    og:title meta tag, once it has fully loaded, or once the ready callback returns True. The callback
+    is polled on every check, racing the DOM signals, and wins when both are present. An og:title or
+    the load event alone waits up to CAPTURE_GRACE seconds more for the callback, since single-page
+    retailers render those before their product API answers. Loading is stopped when the deadline
+    passes or the cancelled callback returns True first. driver.get itself is bounded by the deadline
+    too, for drivers with the "normal" strategy that block until the load event.
+
+    :param driver: Selenium WebDriver instance
+    :param url: URL of the product page
+    :param deadline: seconds to wait for a readiness signal
+    :param poll_interval: seconds between two readiness checks
+    :param ready: optional callable polled along with the DOM, e.g. NetworkCapture.poll
+    :param cancelled: optional callable polled along with the DOM, e.g. Deadline.cancelled of a hedged scrape
+    :return: the signal the page was considered ready on: jsonld, price, og:title, complete, network,
+    deadline or cancelled
+    """
+    started = time.monotonic()
+    driver.set_page_load_timeout(max(0.1, deadline))
+    try:
+        driver.get(url)
+    except TimeoutException:
+        # Whatever loaded so far is read like a page that missed its readiness signal
+        logging.info(f'Navigation to {url} hit the {deadline:.1f}s deadline')
+    weak_since = None
+    while True:
+        if ready is not None and ready():
+            signal = "network"
+            break
+        try:
+            signal = driver.execute_script(READY_SCRIPT)
+        except WebDriverException:
+            # The execution context is replaced while the navigation commits
+            signal = None
+        now = time.monotonic()
+        if signal in WEAK_SIGNALS and ready is not None:
+            weak_since = weak_since or now
+            if now - weak_since < CAPTURE_GRACE and now - started < deadline:
+                signal = None
+            else:
+                break
+        if signal:
+            break
+        if cancelled is not None and cancelled():
+            signal = "cancelled"
+        elif now - started >= deadline:
+            signal = "deadline"
+        if signal:
+            try:
+                driver.execute_script("window.stop();")
+            except WebDriverException as e:
+                logging.warning(f'Could not stop loading {url}: {str(e)}')
+            break
+        time.sleep(poll_interval)
+    registry.inc("page_ready_total", {"signal": signal})
+    return signal
@@ -1,19 +1,15 @@
-def extractPriceWithJS(driver):
-    """
-    This function executes a JavaScript code snippet in the current browser context. The JavaScript code
-    extracts the price from the HTML page based on certain criteria and returns it.
+import logging
 
-    :param driver: Selenium WebDriver instance.
-    :return: The extracted price, or None if the price could not be extracted.
-    """
-    price_extraction_script = """
+# Original price finder, kept so benchmarks/bench_price_script.py can compare against it. It reads the
+# layout and computed style of every element in the body before filtering anything.
+LEGACY_PRICE_SCRIPT = """
     let elements = Array.from(document.querySelectorAll('body *'));
 
     function createRecordFromElement(element) {
         const text = element.textContent.trim();
         let record = {};
         const bBox = element.getBoundingClientRect();
-        
+
         if(text.length <= 30 && !(bBox.x == 0 && bBox.y == 0)) {
             record['fontSize'] = parseInt(window.getComputedStyle(element)['fontSize']);
             record['y'] = bBox.y;
@@ -28,10 +24,10 @@ def extractPriceWithJS(driver):
 
     function canBePrice(record) {
         const priceRegex = /^(US ){0,1}(rs\.|Rs\.|RS\.|\$|₹|INR|USD|CAD|C\$){0,1}(\\s){0,1}[\d,]+(\\.\d+){0,1}(\\s){0,1}(AED){0,1}$/;
-        
-        if (record['y'] > 600 || 
-            record['fontSize'] == undefined || 
-            !record['text'].match(priceRegex) || 
+
+        if (record['y'] > 600 ||
+            record['fontSize'] == undefined ||
+            !record['text'].match(priceRegex) ||
             record['text'].includes("del")) {
             return false;
         } else {
@@ -40,7 +36,7 @@ def extractPriceWithJS(driver):
     }
 
     let possiblePriceRecords = records.filter(canBePrice);
-    
+
     possiblePriceRecords.sort((a, b) => {
         if(a['fontSize'] === b['fontSize']) {
             return a['y'] - b['y'];
@@ -54,4 +50,144 @@ def extractPriceWithJS(driver):
         return null;
     }
     """
-    return driver.execute_script(price_extraction_script)
\ No newline at end of file
+
+# Walks the text nodes once and only reads layout for the few elements whose text already looks like a
+# price, then only reads computed style for the ones inside the top 600px the ranking uses.
+PRICE_SCRIPT = r"""
+    const MAX_Y = arguments[0];
+    const CURRENCY = '(?:US\\s?\\$|C\\$|CA\\$|A\\$|AU\\$|NZ\\$|HK\\$|S\\$|R\\$|\\$|€|£|¥|₹|₩|₽|₺|₪|kr|zł|Rs\\.?|RS\\.?|rs\\.?|' +
+                     'INR|USD|CAD|AUD|NZD|EUR|GBP|JPY|AED|CHF|SEK|NOK|DKK|MXN|BRL|PLN)';
+    const AMOUNT = '(\\d{1,3}(?:[,.\\s]\\d{3})+(?:[.,]\\d{1,2})?|\\d+(?:[.,]\\d{1,2})?)';
+    const PRICE = new RegExp('^(?:(' + CURRENCY + ')\\s?' + AMOUNT + '(?:\\s?' + CURRENCY + ')?|' + AMOUNT + '\\s?(' + CURRENCY + ')?)$');
+    const STRUCK_CLASS = /compare|was-price|price--was|old-price|original|regular-price|strike|crossed/i;
+    const SKIP = {SCRIPT: 1, STYLE: 1, NOSCRIPT: 1, TEMPLATE: 1};
+
+    function parseAmount(amount) {
+        amount = amount.replace(/\s/g, '');
+        const decimal = Math.max(amount.lastIndexOf('.'), amount.lastIndexOf(','));
+        if (decimal >= 0 && amount.length - decimal - 1 <= 2) {
+            return parseFloat(amount.slice(0, decimal).replace(/[.,]/g, '') + '.' + amount.slice(decimal + 1));
+        }
+        return parseFloat(amount.replace(/[.,]/g, ''));
+    }
+
+    function elementPath(element) {
+        const parts = [];
+        for (let node = element; node && node !== document.body && parts.length < 6; node = node.parentElement) {
+            let part = node.tagName.toLowerCase();
+            if (node.id) {
+                parts.unshift(part + '#' + node.id);
+                break;
+            }
+            if (typeof node.className === 'string' && node.className.trim()) {
+                part += '.' + node.className.trim().split(/\s+/)[0];
+            }
+            parts.unshift(part);
+        }
+        return parts.join(' > ');
+    }
+
+    function isStruck(element, style) {
+        if (style.textDecorationLine.includes('line-through')) {
+            return true;
+        }
+        for (let node = element, depth = 0; node && depth < 3; node = node.parentElement, depth++) {
+            if (node.tagName === 'DEL' || node.tagName === 'S' || node.tagName === 'STRIKE' ||
+                (typeof node.className === 'string' && STRUCK_CLASS.test(node.className))) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    // Pass 1: text only, no layout. Prices split over several text nodes, like <sup>$</sup>49, are
+    // matched on the closest ancestor whose whole text is short enough to be a price.
+    const elements = new Set();
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, {
+        acceptNode(node) {
+            return SKIP[node.parentElement.tagName] ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT;
+        }
+    });
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        if (!/\d/.test(node.data)) {
+            continue;
+        }
+        for (let element = node.parentElement, depth = 0; element && element !== document.body && depth < 3;
+             element = element.parentElement, depth++) {
+            const text = element.textContent.trim();
+            if (text.length > 30) {
+                break;
+            }
+            if (PRICE.test(text)) {
+                elements.add(element);
+                break;
+            }
+        }
+    }
+
+    // Pass 2: layout and style reads for the candidates only
+    const records = [];
+    for (const element of elements) {
+        const bBox = element.getBoundingClientRect();
+        if ((bBox.x == 0 && bBox.y == 0) || bBox.y > MAX_Y) {
+            continue;
+        }
+        const style = window.getComputedStyle(element);
+        const text = element.textContent.trim();
+        const match = text.match(PRICE);
+        records.push({
+            text: text,
+            value: parseAmount(match[2] || match[3]),
+            currency: match[1] || match[4] || null,
+            fontSize: parseInt(style.fontSize),
+            x: bBox.x,
+            y: bBox.y,
+            struck: isStruck(element, style),
+            path: elementPath(element),
+        });
+    }
+
+    // Biggest text first, then highest on the page, with crossed-out prices after every live one
+    records.sort((a, b) => (a.struck - b.struck) || (b.fontSize - a.fontSize) || (a.y - b.y));
+    if (records.length == 0 || records[0].struck) {
+        return null;
+    }
+    const best = records[0];
+    // A sale price is usually shown right next to the crossed-out price it replaces
+    const compareAt = records.find(record => record.struck && Math.abs(record.y - best.y) < 60 && record.value > best.value);
+    best.compare_at = compareAt ? compareAt.text : null;
+    best.candidates = records.length;
+    return best;
+"""
+
+# Product prices are rendered above the fold, candidates below this many pixels are ignored
+PRICE_MAX_Y = 600
+
+########### FUNCTION DEFINITIONS ############
+
+def findPriceCandidate(driver, max_y=PRICE_MAX_Y):
+    """
+    Finds the most prominent price near the top of the rendered page.
+
+    :param driver: Selenium WebDriver instance.
+    :param max_y: candidates further than this many pixels from the top of the viewport are ignored
+    :return: dictionary with the price text, its numeric value and currency, font size, position, the
+    path of the element holding it and the crossed-out price it replaces (compare_at), or None
+    """
+    return driver.execute_script(PRICE_SCRIPT, max_y)
+
+
+def extractPriceWithJS(driver):
+    """
+    This function executes a JavaScript code snippet in the current browser context. The JavaScript code
+    extracts the price from the HTML page based on certain criteria and returns it.
+
+    :param driver: Selenium WebDriver instance.
+    :return: The extracted price, or None if the price could not be extracted.
+    """
+    candidate = findPriceCandidate(driver)
+    if candidate is None:
+        return None
+    logging.debug(f"Price {candidate['text']} found at {candidate['path']} "
+                  f"(compare at {candidate['compare_at']}, {candidate['candidates']} candidates)")
+    return candidate["text"]
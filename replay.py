@@ -0,0 +1,94 @@
+"""
+Re-runs the extraction pipeline over an archive of fetched pages without a browser or network access.
+
+Record pages while scraping by setting SNAPSHOT_ARCHIVE_DIR, then iterate on the extractors with
+
+    python replay.py <archive dir> --workers 8 --output replay.jsonl
+
+Each snapshot is parsed and extracted exactly as scrapeLink would, reusing the price extractPriceWithJS
+found, the host's strategy order and selectors and the fields captured from the network when the page
+was recorded. The per-attribute success rates are printed at the end.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup
+from html_requests import extractPage, extractWithSelectors
+from metrics import ATTRIBUTES
+from network_capture import mergeCapturedFields
+from page_facts import DEFAULT_PARSER, parsePage
+from snapshot_archive import SnapshotArchive, loadSnapshot
+
+########### FUNCTION DEFINITIONS ############
+
+def replaySnapshot(root, snapshot):
+    """
+    Extracts one archived page.
+
+    :param root: archive directory
+    :param snapshot: index entry as returned by SnapshotArchive.snapshots
+    :return: the snapshot entry with the extracted item fields and success flags added
+    """
+    page_source = loadSnapshot(root, snapshot["digest"])
+    html = parsePage(page_source)
+    overrides = None
+    if snapshot.get("selectors"):
+        overrides = extractWithSelectors(BeautifulSoup(page_source, DEFAULT_PARSER), snapshot["selectors"])
+    item_fields, result_dict = extractPage(html, snapshot["url"], snapshot["js_price"],
+                                           strategies=snapshot.get("strategies"), overrides=overrides)
+    mergeCapturedFields(item_fields, result_dict, snapshot.get("captured"))
+    return dict(snapshot, item=item_fields, result=result_dict)
+
+
+def replayArchive(root, workers=None, url=None, all_fetches=False):
+    """
+    Replays every archived page in parallel across processes.
+
+    :param root: archive directory
+    :param workers: number of worker processes, defaults to the number of cores
+    :param url: only replay fetches of this URL
+    :param all_fetches: replay every recorded fetch instead of only the latest one per URL
+    :return: a generator of replayed snapshot entries in archive order
+    """
+    archive = SnapshotArchive(root)
+    snapshots = archive.snapshots(url=url, latest_only=not all_fetches)
+    archive.close()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(replaySnapshot, [root] * len(snapshots), snapshots,
+                            chunksize=max(1, len(snapshots) // ((workers or os.cpu_count() or 1) * 4)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="directory given as SNAPSHOT_ARCHIVE_DIR while scraping")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the number of cores")
+    parser.add_argument("--url", default=None, help="only replay this URL")
+    parser.add_argument("--all", action="store_true", help="replay every fetch, not only the latest per URL")
+    parser.add_argument("--output", default=None, help="write one JSON record per snapshot to this file")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.archive):
+        sys.exit(f"No archive at {args.archive}")
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    summary = Counter()
+    total = 0
+    for record in replayArchive(args.archive, args.workers, args.url, args.all):
+        total += 1
+        for attribute in ATTRIBUTES:
+            summary[attribute] += record["result"].get(attribute) == "1"
+        if output is not None:
+            output.write(json.dumps(record) + "\n")
+    if output is not None:
+        output.close()
+
+    print(f"Replayed {total} pages")
+    for attribute in ATTRIBUTES:
+        print(f"- Product {attribute}: {100 * summary[attribute] / total if total else 0:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
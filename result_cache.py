@@ -0,0 +1,258 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from metrics import registry
+
+# Query parameters that only track where a click came from and never change the product shown
+TRACKING_PARAMS = {"click_key", "click_sum", "icid", "psrc", "ref", "ref_", "pro", "frs", "sts", "cm_re",
+                   "origin", "breadcrumb", "fm", "os", "pos", "itrownum", "itcurrpage", "itview", "lc",
+                   "gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "_ga", "srsltid"}
+TRACKING_PREFIXES = ("utm_", "pf_rd_", "src_", "itm_")
+
+########### FUNCTION DEFINITIONS ############
+
+def canonicalizeUrl(url):
+    """
+    Reduces a product URL to a stable cache key: lowercases the scheme and host, drops default ports,
+    the #fragment and tracking parameters, and sorts the remaining query parameters.
+
+    :param url: URL of the product page
+    :return: the canonical form of the URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = parts.netloc.lower()
+    if (scheme == "http" and host.endswith(":80")) or (scheme == "https" and host.endswith(":443")):
+        host = host.rsplit(":", 1)[0]
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(sorted(query)), ""))
+
+
+class ResultCache:
+    """
+    Two-tier cache of extracted item fields keyed by canonical product URL: an in-memory LRU in front of
+    a durable SQLite table. Entries expire after a per-host TTL, and callers can ask for a fresher copy
+    with max_age.
+
+    Writes to the SQLite tier are handed to a background writer that commits them in batches, so set()
+    only touches memory. peek() never touches the disk either, which lets an event loop look up the
+    memory tier inline and send only the misses to a thread.
+    """
+
+    # Writes the background writer commits in one transaction at most
+    WRITE_BATCH = 256
+
+    def __init__(self, path=None, max_entries=1024, default_ttl=3600, host_ttls=None):
+        """
+        :param path: SQLite file backing the durable tier, None keeps the cache in memory only
+        :param max_entries: number of entries held by the in-memory tier before the least recently used
+        one is evicted
+        :param default_ttl: seconds an entry stays fresh for hosts without their own TTL
+        :param host_ttls: dictionary of host to TTL in seconds
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.host_ttls = host_ttls or {}
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        # Entries handed to the writer and not committed yet, read like the disk tier
+        self._unwritten = {}
+        self._lock = threading.Lock()
+        # Serializes the SQLite connection, it is never held while the memory lock is wanted
+        self._db_lock = threading.Lock()
+        self._db = None
+        self._writes = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, stored_at REAL, value TEXT)")
+            self._db.commit()
+            self._writes = queue.Queue()
+            self._writer = threading.Thread(target=self._writeBehind, name="result-cache-writer", daemon=True)
+            self._writer.start()
+
+    @property
+    def persistent(self):
+        """
+        :return: True when lookups that miss the memory tier read SQLite
+        """
+        return self._db is not None
+
+    def ttlFor(self, key):
+        return self.host_ttls.get(urlsplit(key).netloc, self.default_ttl)
+
+    def peek(self, url, max_age=None):
+        """
+        Looks the URL up in the memory tier only, without any disk I/O. A miss is not counted, the caller
+        is expected to follow it with get().
+
+        :param url: URL of the product page, canonicalized before lookup
+        :param max_age: only accept an entry younger than this many seconds, in addition to the host TTL
+        :return: the cached item fields, or None if the memory tier has no fresh entry
+        """
+        key = canonicalizeUrl(url)
+        limit = self._limit(key, max_age)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or time.time() - entry[0] > limit:
+                return None
+            self._memory.move_to_end(key)
+            self._hit(False)
+            return entry[1]
+
+    def get(self, url, max_age=None):
+        """
+        :param url: URL of the product page, canonicalized before lookup
+        :param max_age: only accept an entry younger than this many seconds, in addition to the host TTL
+        :return: the cached item fields, or None on a miss
+        """
+        key = canonicalizeUrl(url)
+        limit = self._limit(key, max_age)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            from_disk = False
+            if entry is None:
+                # Evicted from memory before the writer committed it, it counts as read from disk
+                entry = self._unwritten.get(key)
+                from_disk = entry is not None
+        if entry is None and self._db is not None:
+            with self._db_lock:
+                row = self._db.execute("SELECT stored_at, value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                entry = (row[0], json.loads(row[1]))
+                from_disk = True
+        with self._lock:
+            if entry is None or now - entry[0] > limit:
+                self.misses += 1
+                registry.inc("result_cache_misses")
+                return None
+            self._hit(from_disk)
+            if from_disk:
+                self._remember(key, entry)
+            elif key in self._memory:
+                self._memory.move_to_end(key)
+            return entry[1]
+
+    def set(self, url, value):
+        """
+        Stores the item in memory and queues it for the SQLite tier, without waiting for the disk.
+
+        :param url: URL of the product page, canonicalized before storing
+        :param value: JSON-serializable item fields
+        """
+        key = canonicalizeUrl(url)
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+            if self._writes is not None:
+                self._unwritten[key] = entry
+                self._writes.put((key, entry))
+
+    def flush(self):
+        """
+        Waits until every queued write is committed.
+        """
+        if self._writes is not None:
+            self._writes.join()
+
+    def invalidate(self, url):
+        """
+        :param url: URL of the product page to drop from both tiers
+        :return: True if an entry was removed
+        """
+        key = canonicalizeUrl(url)
+        self.flush()
+        with self._lock:
+            removed = self._memory.pop(key, None) is not None
+        if self._db is not None:
+            with self._db_lock:
+                removed = self._db.execute("DELETE FROM results WHERE key = ?", (key,)).rowcount > 0 or removed
+                self._db.commit()
+        return removed
+
+    def items(self):
+        """
+        :return: list of every stored item, fresh or not, e.g. to learn brand names from past extractions
+        """
+        if self._db is None:
+            with self._lock:
+                return [entry[1] for entry in self._memory.values()]
+        self.flush()
+        with self._db_lock:
+            return [json.loads(row[0]) for row in self._db.execute("SELECT value FROM results")]
+
+    def stats(self):
+        """
+        :return: dictionary of hit/miss counters and the size of the in-memory tier
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                    "evictions": self.evictions, "memory_entries": len(self._memory)}
+
+    def close(self):
+        """
+        Commits the queued writes and closes the SQLite tier.
+        """
+        if self._writes is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writes = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _limit(self, key, max_age):
+        limit = self.ttlFor(key)
+        return limit if max_age is None else min(limit, max_age)
+
+    def _hit(self, from_disk):
+        self.hits += 1
+        registry.inc("result_cache_hits")
+        if from_disk:
+            self.disk_hits += 1
+            registry.inc("result_cache_disk_hits")
+
+    def _writeBehind(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < self.WRITE_BATCH:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [write for write in batch if write is not None]
+            try:
+                if writes:
+                    with self._db_lock:
+                        self._db.executemany("INSERT OR REPLACE INTO results (key, stored_at, value) VALUES (?, ?, ?)",
+                                             ((key, entry[0], json.dumps(entry[1])) for key, entry in writes))
+                        self._db.commit()
+            except sqlite3.Error as e:
+                logging.warning(f'Could not write {len(writes)} cached items: {str(e)}')
+            finally:
+                with self._lock:
+                    for key, entry in writes:
+                        if self._unwritten.get(key) is entry:
+                            del self._unwritten[key]
+                for _ in batch:
+                    self._writes.task_done()
+            if len(writes) < len(batch):
+                return
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+            registry.inc("result_cache_evictions")
@@ -0,0 +1,101 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorSaturated(Exception):
+    """
+    Raised when the executor already holds as many scrapes as it is allowed to run and queue.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f'Scrape queue is full, retry after {retry_after} seconds')
+        self.retry_after = retry_after
+
+
+class ScrapeExecutor:
+    """
+    Runs blocking scrapes on a bounded pool of worker threads so they never block the event loop.
+
+    At most max_in_flight scrapes run at once and at most max_queue more wait for a worker; anything
+    beyond that is rejected immediately with ExecutorSaturated instead of piling up.
+    """
+
+    def __init__(self, max_in_flight=2, max_queue=16):
+        """
+        :param max_in_flight: number of scrapes running concurrently
+        :param max_queue: number of scrapes allowed to wait for a free worker
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="scrape")
+        self._pending = 0
+        self._avg_duration = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """
+        :return: number of scrapes currently running or waiting for a worker
+        """
+        return self._pending
+
+    def retryAfter(self):
+        """
+        Estimates how long a rejected caller should wait before the queue has room again.
+
+        :return: whole seconds, at least 1
+        """
+        with self._lock:
+            avg = self._avg_duration or 1.0
+            waves = max(1, self._pending - self.max_in_flight + 1) / self.max_in_flight
+        return max(1, math.ceil(avg * waves))
+
+    def submit(self, fn, *args, bypass_queue_limit=False):
+        """
+        Schedules fn(*args) on a worker thread.
+
+        :param fn: blocking callable to run
+        :param bypass_queue_limit: admit the call even if the queue is full, for callers that bound
+        their own concurrency
+        :return: a concurrent.futures.Future for the result
+        """
+        with self._lock:
+            if not bypass_queue_limit and self._pending >= self.max_in_flight + self.max_queue:
+                saturated = True
+            else:
+                saturated = False
+                self._pending += 1
+        if saturated:
+            raise ExecutorSaturated(self.retryAfter())
+
+        started = time.monotonic()
+
+        def finished(future):
+            duration = time.monotonic() - started
+            with self._lock:
+                self._pending -= 1
+                if not future.cancelled():
+                    self._avg_duration = duration if self._avg_duration is None else 0.8 * self._avg_duration + 0.2 * duration
+
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(finished)
+        return future
+
+    async def run(self, fn, *args, timeout=None, bypass_queue_limit=False):
+        """
+        Runs fn(*args) on a worker thread and awaits its result without blocking the event loop.
+
+        :param fn: blocking callable to run
+        :param timeout: seconds to wait for the result, None waits forever. A scrape that has not
+        started yet is dropped from the queue when the timeout expires.
+        :param bypass_queue_limit: admit the call even if the queue is full
+        :return: the return value of fn
+        """
+        future = self.submit(fn, *args, bypass_queue_limit=bypass_queue_limit)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
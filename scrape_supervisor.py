@@ -0,0 +1,347 @@
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import wait
+from crawl_scheduler import reportThrottle, throttleWatch
+from deadline import Deadline
+from metrics import registry, traceScrape
+
+# Functions of main.py a worker process runs on request
+WORKER_FUNCTIONS = {"scrapeLink", "getTimedData"}
+
+# Workers dying this many times in a row within STARTUP_GRACE seconds of being started are not restarted
+# again, they are failing to import or launch rather than crashing on a page
+MAX_EARLY_DEATHS = 5
+STARTUP_GRACE = 10
+
+# Seconds a caller waits past the scrape's deadline for the worker to send back what it found, before the
+# worker is taken to be stuck and restarted
+RESULT_GRACE = 10
+
+registry.describe("scrape_worker_restarts_total", "counter", "Scrape worker processes restarted after they died.")
+registry.describe("scrape_worker_requests_total", "counter", "Scrapes run in worker processes, by outcome.")
+registry.describe("scrape_worker_timeouts_total", "counter", "Scrapes given up on because their worker did not answer in time.")
+
+########### FUNCTION DEFINITIONS ############
+
+class WorkerError(Exception):
+    """
+    Raised for a scrape that failed in a worker process, or whose worker kept dying.
+    """
+
+    def __init__(self, message, throttled=False):
+        """
+        :param message: the error raised in the worker, or why the scrape was given up
+        :param throttled: the reason the host throttled the scrape before it failed, False if it did not
+        """
+        super().__init__(message)
+        self.throttled = throttled
+
+
+def _workerMain(conn, threads):
+    """
+    Entry point of a worker process: imports main.py, which gives the process its own driver pool and
+    parser, and runs the scrapes it receives on threads sharing that pool. Every reply carries what the
+    scrape taught the worker, whether its host throttled it and the metrics recorded since the last
+    reply, for the parent that owns the strategy state file and serves /metrics.
+
+    :param conn: the worker's end of its pipe to the supervisor
+    :param threads: scrapes run at the same time in this process
+    """
+    # The worker scrapes in-process, it must not start a supervisor of its own or write the strategy state
+    os.environ["SCRAPE_PROCESSES"] = "0"
+    os.environ["SCRAPE_WORKER"] = "1"
+    import main as scraper
+
+    send_lock = threading.Lock()
+
+    def run(request_id, name, link, args):
+        with throttleWatch() as watch, traceScrape(link) as trace:
+            try:
+                ok, payload = True, getattr(scraper, name)(link, *args)
+            except Exception as e:
+                ok, payload = False, f"{type(e).__name__}: {e}"
+        feedback = {"tier": trace.tier, "learned": scraper.strategy_registry.drainJournal(),
+                    "throttled": watch["reason"], "metrics": registry.drain()}
+        with send_lock:
+            conn.send((request_id, ok, payload, feedback))
+
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="worker")
+    try:
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                break
+            if message is None:
+                break
+            pool.submit(run, *message)
+    finally:
+        pool.shutdown(wait=True)
+        scraper.driver_pool.close()
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.started = time.monotonic()
+        # Set when the supervisor stopped the worker itself, which is not an early death
+        self.stopped = False
+        # request id to (function name, URL, extra arguments, future, attempts)
+        self.outstanding = {}
+
+
+class ScrapeSupervisor:
+    """
+    Spreads scrapes over worker processes, so parsing and extraction run on every core instead of behind
+    one interpreter lock. Each worker owns its browsers and parses its own pages; requests and results
+    travel over one pipe per worker as small tuples. Requests go to the worker with the fewest scrapes in
+    flight. A worker that dies is restarted and the scrapes it held are sent again, up to max_retries
+    times each. A worker that has not answered a scrape by its deadline plus result_grace is taken to be
+    stuck: the caller gets a TimeoutError and the worker is restarted.
+
+    What the workers learn about each host, the tier that worked and the strategies that produced the
+    fields, comes back with their results and is recorded in the parent's strategy registry, the only
+    one that saves. So do their metrics, which the parent's /metrics serves, and the rate limits and
+    challenge pages their hosts answered with, reported to the crawl scheduler waiting for the result.
+    """
+
+    def __init__(self, processes=None, threads_per_process=1, max_retries=1, strategy_registry=None,
+                 scrape_timeout=60, result_grace=RESULT_GRACE):
+        """
+        :param processes: number of worker processes, defaults to the number of cores
+        :param threads_per_process: scrapes each worker runs at the same time, at most its driver pool size
+        is useful for pages that need the browser
+        :param max_retries: times a scrape is resent after its worker died
+        :param strategy_registry: StrategyRegistry recording the workers' outcomes, with its tier_registry
+        :param scrape_timeout: deadline in seconds the workers give a scrape sent without one
+        :param result_grace: seconds waited past a scrape's deadline before its worker is restarted
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.threads_per_process = threads_per_process
+        self.max_retries = max_retries
+        self.scrape_timeout = scrape_timeout
+        self.result_grace = result_grace
+        self.strategy_registry = strategy_registry
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = []
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._collector = None
+        self._early_deaths = 0
+
+    @property
+    def capacity(self):
+        """
+        :return: number of scrapes the workers run at the same time
+        """
+        return self.processes * self.threads_per_process
+
+    def start(self):
+        """
+        Starts the worker processes and the thread collecting their results.
+
+        :return: the supervisor
+        """
+        with self._lock:
+            if self._collector is not None:
+                return self
+            self._workers = [self._spawn() for _ in range(self.processes)]
+            self._collector = threading.Thread(target=self._collect, name="scrape-supervisor", daemon=True)
+            self._collector.start()
+        return self
+
+    def submit(self, name, link, *args):
+        """
+        :param name: function of main.py to run, one of WORKER_FUNCTIONS
+        :param link: URL of the product page
+        :param args: further picklable arguments, e.g. the scrape's Deadline
+        :return: a concurrent.futures.Future for a tuple of the function's return value and the reason the
+        host throttled the scrape, False if it did not
+        """
+        if name not in WORKER_FUNCTIONS:
+            raise ValueError(f'{name} cannot be run in a worker process')
+        self.start()
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Scrape supervisor is closed')
+            worker = min(self._workers, key=lambda candidate: len(candidate.outstanding))
+            self._send(worker, next(self._ids), name, link, args, future, 0)
+        return future
+
+    def call(self, name, link, *args, timeout=None):
+        """
+        Runs a function of main.py in a worker process and waits for its result. A throttle the worker saw
+        is reported on the calling thread, e.g. to the crawl scheduler running the scrape.
+
+        :param name: function of main.py to run, one of WORKER_FUNCTIONS
+        :param link: URL of the product page
+        :param args: further picklable arguments
+        :param timeout: seconds to wait, None waits for the Deadline in args, or scrape_timeout without one,
+        plus result_grace. When they run out the worker is restarted and TimeoutError raised
+        :return: the function's return value
+        """
+        if timeout is None:
+            timeout = self.timeoutFor(args)
+        future = self.submit(name, link, *args)
+        try:
+            result, throttled = future.result(timeout)
+        except FutureTimeoutError:
+            self._abandon(future, link)
+            raise TimeoutError(f'Scrape worker did not answer for {link} within {timeout:.0f}s')
+        except WorkerError as e:
+            if e.throttled:
+                reportThrottle(link, e.throttled)
+            raise
+        if throttled:
+            reportThrottle(link, throttled)
+        return result
+
+    def timeoutFor(self, args):
+        """
+        :param args: arguments of a scrape, its Deadline among them if it has one
+        :return: seconds to wait for the scrape's result before its worker is taken to be stuck
+        """
+        remaining = next((arg.remaining() for arg in args if isinstance(arg, Deadline)), math.inf)
+        return (self.scrape_timeout if remaining == math.inf else remaining) + self.result_grace
+
+    def scrapeLink(self, link, deadline=None):
+        """
+        :param link: URL of the product page
+        :param deadline: Deadline of the scrape, sent to the worker as the time remaining
+        :return: what main.scrapeLink returns, computed in a worker process
+        """
+        return self.call("scrapeLink", link, deadline)
+
+    def getTimedData(self, link, deadline=None):
+        """
+        :param link: URL of the product page
+        :param deadline: Deadline of the scrape, sent to the worker as the time remaining
+        :return: what main.getTimedData returns, computed in a worker process
+        """
+        return self.call("getTimedData", link, deadline)
+
+    def close(self):
+        """
+        Asks the workers to finish their scrapes and exit, and stops the ones that do not.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=30)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_workerMain, args=(child_conn, self.threads_per_process),
+                                        name="scrape-worker", daemon=True)
+        process.start()
+        # The child holds its own copy, closing ours lets recv see EOF when the child dies
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _send(self, worker, request_id, name, link, args, future, attempts):
+        worker.outstanding[request_id] = (name, link, args, future, attempts)
+        try:
+            worker.conn.send((request_id, name, link, args))
+        except OSError:
+            # The worker is dead, the collector restarts it and resends what it held
+            pass
+
+    def _abandon(self, future, link):
+        # Forgets the scrape so a late answer is dropped, and stops its worker; the collector restarts it
+        # and resends the other scrapes it held
+        with self._lock:
+            if self._closed:
+                return
+            found = [(worker, request_id) for worker in self._workers
+                     for request_id, entry in worker.outstanding.items() if entry[3] is future]
+            if not found:
+                return
+            worker, request_id = found[0]
+            del worker.outstanding[request_id]
+            worker.stopped = True
+        logging.warning(f'Scrape worker {worker.process.pid} did not answer for {link}, restarting it')
+        registry.inc("scrape_worker_timeouts_total")
+        worker.process.terminate()
+
+    def _collect(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                workers = list(self._workers)
+            ready = wait([worker.conn for worker in workers] + [worker.process.sentinel for worker in workers],
+                         timeout=1)
+            for worker in workers:
+                if worker.conn in ready:
+                    try:
+                        request_id, ok, payload, feedback = worker.conn.recv()
+                    except (EOFError, OSError):
+                        self._restart(worker)
+                        continue
+                    with self._lock:
+                        entry = worker.outstanding.pop(request_id, None)
+                        self._early_deaths = 0
+                    registry.merge(feedback["metrics"])
+                    self._learn(entry[1] if entry is not None else None, feedback)
+                    if entry is None:
+                        continue
+                    registry.inc("scrape_worker_requests_total", {"result": "ok" if ok else "error"})
+                    if ok:
+                        entry[3].set_result((payload, feedback["throttled"]))
+                    else:
+                        entry[3].set_exception(WorkerError(payload, feedback["throttled"]))
+                elif worker.process.sentinel in ready:
+                    self._restart(worker)
+
+    def _learn(self, link, feedback):
+        if self.strategy_registry is None:
+            return
+        for args in feedback["learned"]:
+            self.strategy_registry.record(*args)
+        tier_registry = self.strategy_registry.tier_registry
+        if link is not None and feedback["tier"] is not None and tier_registry is not None:
+            tier_registry.record(link, feedback["tier"])
+
+    def _restart(self, worker):
+        with self._lock:
+            if self._closed or worker not in self._workers:
+                return
+            worker.conn.close()
+            if not worker.stopped and time.monotonic() - worker.started < STARTUP_GRACE:
+                self._early_deaths += 1
+            if self._early_deaths >= MAX_EARLY_DEATHS:
+                logging.error(f'Scrape workers keep dying right after starting, giving up on them')
+                self._closed = True
+                for entry in [entry for dead in self._workers for entry in dead.outstanding.values()]:
+                    if not entry[3].done():
+                        entry[3].set_exception(WorkerError('Scrape workers keep dying right after starting'))
+                return
+            logging.warning(f'Scrape worker {worker.process.pid} died (exit code {worker.process.exitcode}), restarting it')
+            registry.inc("scrape_worker_restarts_total")
+            replacement = self._spawn()
+            self._workers[self._workers.index(worker)] = replacement
+            for request_id, (name, link, args, future, attempts) in worker.outstanding.items():
+                if attempts >= self.max_retries:
+                    future.set_exception(WorkerError(f'Scrape worker died {attempts + 1} times scraping {link}'))
+                else:
+                    self._send(replacement, request_id, name, link, args, future, attempts + 1)
@@ -0,0 +1,67 @@
+import asyncio
+from metrics import registry
+
+
+class _Call:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller starts the work and every caller that
+    arrives while it is running awaits the same result, or the same exception.
+
+    Each caller applies its own timeout. When the last waiting caller times out or is cancelled, the
+    shared work is cancelled too, so a scrape nobody waits for anymore does not keep its queue slot.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.followers = 0
+        self._calls = {}
+
+    @property
+    def in_flight(self):
+        """
+        :return: number of keys currently being worked on
+        """
+        return len(self._calls)
+
+    async def do(self, key, fn, timeout=None):
+        """
+        :param key: identifies identical work, e.g. a canonical URL
+        :param fn: callable returning the coroutine that does the work, only called by the first caller
+        :param timeout: seconds this caller waits for the shared result, None waits forever
+        :return: the result of the shared coroutine
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda task: self._finished(key, call))
+            self._calls[key] = call
+            self.leaders += 1
+            registry.inc("single_flight_leaders")
+        else:
+            self.followers += 1
+            registry.inc("single_flight_followers")
+
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+
+    def _finished(self, key, call):
+        self._forget(key, call)
+        if not call.task.cancelled():
+            # Mark the exception as retrieved even if every waiter already gave up on it
+            call.task.exception()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def objectPath(root, digest):
+    """
+    :param root: archive directory
+    :param digest: sha256 hex digest of a page
+    :return: path of the gzip file holding the page
+    """
+    return os.path.join(root, "objects", digest[:2], digest + ".html.gz")
+
+
+def loadSnapshot(root, digest):
+    """
+    Reads an archived page without opening the index, so replay workers only touch the object files.
+
+    :param root: archive directory
+    :param digest: sha256 hex digest of the page
+    :return: the page HTML as bytes
+    """
+    with gzip.open(objectPath(root, digest), "rb") as f:
+        return f.read()
+
+
+class SnapshotArchive:
+    """
+    Content-addressed archive of fetched product pages. Each distinct page body is stored once, gzip
+    compressed under its sha256 digest, and an SQLite index records every fetch of a URL with its time,
+    the tier that fetched it, the price found by extractPriceWithJS and what else the extraction used:
+    the host's strategy order and selectors and the fields captured from the network, as JSON.
+    """
+
+    # Columns added after the first archives were written, with their types
+    PLAN_COLUMNS = {"strategies": "TEXT", "selectors": "TEXT", "captured": "TEXT"}
+
+    def __init__(self, root):
+        """
+        :param root: directory holding the objects folder and index.sqlite3, created if missing
+        """
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS snapshots (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                url TEXT NOT NULL,
+                                fetched_at REAL NOT NULL,
+                                digest TEXT NOT NULL,
+                                tier TEXT,
+                                js_price TEXT)""")
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(snapshots)")}
+        for column, kind in self.PLAN_COLUMNS.items():
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE snapshots ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS snapshots_url ON snapshots (url, fetched_at)")
+        self._db.commit()
+
+    def save(self, url, page_source, tier=None, js_price=None, plan=None, captured=None):
+        """
+        :param url: URL the page was fetched from
+        :param page_source: the page HTML as a string or bytes
+        :param tier: the fetch tier that produced the page
+        :param js_price: the price returned by extractPriceWithJS, if the page was rendered
+        :param plan: extraction plan the page was extracted with, its strategy order and selectors are recorded
+        :param captured: fields NetworkCapture.finish returned for the page, if any
+        :return: the sha256 hex digest the page is stored under
+        """
+        data = page_source.encode("utf-8") if isinstance(page_source, str) else page_source
+        digest = hashlib.sha256(data).hexdigest()
+        path = objectPath(self.root, digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        with self._lock:
+            self._db.execute("INSERT INTO snapshots (url, fetched_at, digest, tier, js_price, strategies, selectors, "
+                             "captured) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (url, time.time(), digest, tier, js_price,
+                              json.dumps(plan["order"]) if plan else None,
+                              json.dumps(plan["selectors"]) if plan and plan["selectors"] else None,
+                              json.dumps(captured) if captured else None))
+            self._db.commit()
+        return digest
+
+    def load(self, digest):
+        """
+        :param digest: sha256 hex digest of the page
+        :return: the page HTML as bytes
+        """
+        return loadSnapshot(self.root, digest)
+
+    def snapshots(self, url=None, latest_only=True):
+        """
+        Lists archived fetches.
+
+        :param url: only list fetches of this URL
+        :param latest_only: only keep the most recent fetch per URL
+        :return: list of dictionaries with url, fetched_at, digest, tier, js_price, strategies, selectors
+        and captured keys, the last three None when they were not recorded
+        """
+        query = "SELECT url, fetched_at, digest, tier, js_price, strategies, selectors, captured FROM snapshots"
+        params = ()
+        if latest_only:
+            query += " WHERE id IN (SELECT MAX(id) FROM snapshots GROUP BY url)"
+        if url is not None:
+            query += (" AND" if latest_only else " WHERE") + " url = ?"
+            params = (url,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY fetched_at", params).fetchall()
+        return [{"url": row[0], "fetched_at": row[1], "digest": row[2], "tier": row[3], "js_price": row[4],
+                 "strategies": json.loads(row[5]) if row[5] else None, "selectors": json.loads(row[6]) if row[6] else None,
+                 "captured": json.loads(row[7]) if row[7] else None} for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,189 @@
+import re
+from page_facts import pageFacts
+
+# Symbols and prefixes mapped to ISO 4217 codes. A bare "$" is read as USD, the retailers scraped here are
+# US stores, unless the page declares another currency.
+CURRENCY_SYMBOLS = {
+    "US$": "USD", "C$": "CAD", "CA$": "CAD", "A$": "AUD", "AU$": "AUD", "NZ$": "NZD", "HK$": "HKD",
+    "S$": "SGD", "R$": "BRL", "$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR", "₩": "KRW",
+    "₽": "RUB", "₺": "TRY", "₪": "ILS", "zł": "PLN", "Rs": "INR", "Rs.": "INR", "kr": "SEK",
+}
+
+CURRENCY_PATTERN = (r"(?:US\s?\$|[A-Z]{1,2}\$|\$|€|£|¥|₹|₩|₽|₺|₪|zł|kr|Rs\.?|RS\.?|rs\.?|"
+                    r"USD|CAD|AUD|NZD|HKD|SGD|EUR|GBP|JPY|INR|KRW|AED|CHF|SEK|NOK|DKK|MXN|BRL|PLN)")
+AMOUNT_PATTERN = r"(\d{1,3}(?:[,.\s]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)"
+
+# A currency-bearing amount anywhere in a piece of text, e.g. "Sale $49.00" or "29,99 €"
+PRICE_TEXT = re.compile(rf"(?<![\w.,])({CURRENCY_PATTERN})\s?{AMOUNT_PATTERN}(?![\d])|"
+                        rf"(?<![\w.,]){AMOUNT_PATTERN}\s?({CURRENCY_PATTERN})(?!\w)")
+# A bare amount, as found in itemprop/meta content attributes
+AMOUNT_TEXT = re.compile(rf"^\s*({CURRENCY_PATTERN})?\s?{AMOUNT_PATTERN}\s*({CURRENCY_PATTERN})?\s*$")
+
+# Classes and tags of crossed-out "was" prices that must not be read as the current price
+STRUCK_CLASS = re.compile(r"compare|was-price|price--was|old-price|original|regular-price|strike|crossed", re.I)
+STRUCK_TAGS = {"del", "s", "strike"}
+
+# Longest text of a price element the heuristics still look at
+MAX_PRICE_TEXT = 60
+
+########### FUNCTION DEFINITIONS ############
+
+def normalizeCurrency(currency):
+    """
+    :param currency: a currency symbol or code as written on the page, e.g. "€" or "usd"
+    :return: the ISO 4217 code, or None if currency is empty
+    """
+    if not currency:
+        return None
+    currency = re.sub(r"\s", "", str(currency))
+    if currency in CURRENCY_SYMBOLS:
+        return CURRENCY_SYMBOLS[currency]
+    return currency.upper() if re.fullmatch(r"[A-Za-z]{3}", currency) else None
+
+
+def parseAmount(amount):
+    """
+    Converts an amount written with either thousands or decimal separators to a number.
+
+    :param amount: e.g. "1,299.99", "1.299,99", "1 299" or 49
+    :return: the amount as a float, or None if it is not a positive number
+    """
+    if isinstance(amount, bool):
+        return None
+    if isinstance(amount, (int, float)):
+        return float(amount) if amount > 0 else None
+    amount = re.sub(r"\s", "", str(amount))
+    if not re.fullmatch(r"[\d.,]*\d[\d.,]*", amount):
+        return None
+    decimal = max(amount.rfind("."), amount.rfind(","))
+    if decimal >= 0 and len(amount) - decimal - 1 <= 2:
+        value = float(re.sub(r"[.,]", "", amount[:decimal]) + "." + amount[decimal + 1:])
+    else:
+        value = float(re.sub(r"[.,]", "", amount))
+    return value if value > 0 else None
+
+
+def parsePriceText(text, require_currency=True):
+    """
+    Finds the first price in a piece of text.
+
+    :param text: e.g. "Sale price $49.00" or "29,99 €"
+    :param require_currency: only accept amounts written with a currency symbol or code
+    :return: a tuple of the numeric value and the ISO currency code (None if not written), or None
+    """
+    if text is None:
+        return None
+    text = str(text).strip()
+    if (match := PRICE_TEXT.search(text)) is not None:
+        currency = match.group(1) or match.group(4)
+        if (value := parseAmount(match.group(2) or match.group(3))) is not None:
+            return value, normalizeCurrency(currency)
+    if not require_currency and (match := AMOUNT_TEXT.match(text)) is not None:
+        if (value := parseAmount(match.group(2))) is not None:
+            return value, normalizeCurrency(match.group(1) or match.group(3))
+    return None
+
+
+def offerPrice(offers):
+    """
+    Reads the price of a schema.org offers value: an Offer, an AggregateOffer or a list of offers, whose
+    lowest price is returned.
+
+    :param offers: the "offers" value of a Product node
+    :return: a tuple of the numeric value and the ISO currency code, or None
+    """
+    if isinstance(offers, list):
+        prices = [price for offer in offers if (price := offerPrice(offer)) is not None]
+        return min(prices, key=lambda price: price[0]) if prices else None
+    if not isinstance(offers, dict):
+        return None
+    currency = normalizeCurrency(offers.get("priceCurrency"))
+    for key in ("price", "lowPrice"):
+        if (price := _schemaAmount(offers.get(key))) is not None:
+            return price[0], currency or price[1]
+    # Prices nested in a PriceSpecification or in the offers of an AggregateOffer
+    for key in ("priceSpecification", "offers"):
+        if (price := offerPrice(offers.get(key))) is not None:
+            return price[0], price[1] or currency
+    return None
+
+
+def _schemaAmount(value):
+    if isinstance(value, (int, float)):
+        return (amount, None) if (amount := parseAmount(value)) is not None else None
+    if isinstance(value, str):
+        return parsePriceText(value, require_currency=False)
+    return None
+
+
+def _contentOrText(tag):
+    return tag.get("content") if tag.get("content") is not None else tag.get_text(" ", strip=True)
+
+
+def _isStruck(tag):
+    if tag is None or tag.name is None:
+        return False
+    return tag.name in STRUCK_TAGS or any(STRUCK_CLASS.search(name) for name in tag.get("class") or [])
+
+
+def _liveText(tag):
+    """
+    :return: the text of a price element without the crossed-out prices nested in it
+    """
+    parts = []
+    for text in tag.find_all(string=True):
+        parent = text.parent
+        while parent is not tag and not _isStruck(parent):
+            parent = parent.parent
+        if parent is tag and text.strip():
+            parts.append(text.strip())
+    return " ".join(parts)
+
+
+def _result(price, source, text):
+    value, currency = price
+    return {"value": value, "currency": currency, "source": source, "text": text}
+
+
+def extractStaticPrice(html):
+    """
+    Extracts the current price of a product from static HTML, so no browser is needed for it. Sources are
+    tried from the most to the least reliable: JSON-LD offers, itemprop="price" microdata, product:price
+    meta tags, the twitter:data1 meta tag, and finally the text of price elements.
+
+    :param html: BeautifulSoup object of the product page, or the PageFacts already collected from it
+    :return: dictionary with the numeric value, the ISO currency code (None if the page does not say), the
+    source it was read from and the raw text (None for JSON-LD), or None if no price was found
+    """
+    facts = pageFacts(html)
+    if facts is None:
+        return None
+
+    for product in facts.products:
+        if (price := offerPrice(product.get("offers"))) is not None:
+            return _result(price, "jsonld", None)
+
+    currency = _contentOrText(facts.currency_item) if facts.currency_item is not None else None
+    for tag in facts.price_items:
+        text = _contentOrText(tag)
+        if (price := parsePriceText(text, require_currency=False)) is not None:
+            return _result((price[0], normalizeCurrency(currency) or price[1]), "microdata", text)
+
+    for prefix in ("product", "og"):
+        text = facts.metaContent("property", f"{prefix}:price:amount")
+        if text and (price := parsePriceText(text, require_currency=False)) is not None:
+            currency = facts.metaContent("property", f"{prefix}:price:currency")
+            return _result((price[0], normalizeCurrency(currency) or price[1]), "meta", text)
+
+    text = facts.metaContent("name", "twitter:data1")
+    if text and (price := parsePriceText(text)) is not None:
+        return _result(price, "meta", text)
+
+    candidates = [facts.price_tag] if facts.price_tag is not None else []
+    for tag in candidates + facts.price_texts:
+        if _isStruck(tag) or _isStruck(tag.parent):
+            continue
+        text = _liveText(tag)
+        if len(text) <= MAX_PRICE_TEXT and (price := parsePriceText(text)) is not None:
+            return _result(price, "text", text)
+    return None
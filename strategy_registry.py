@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from fetcher import hostOf
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where concurrent saves are not serialized
+    fcntl = None
+
+# Strategies that fill the item fields from the parsed page, in the order they run by default
+FIELD_STRATEGIES = ["jsonld", "tags"]
+
+# Strategies that cost a browser round-trip or extra work and can be skipped for hosts where they never help
+OPTIONAL_STRATEGIES = ["js_price", "network"]
+
+# Item fields whose source is learned
+FIELDS = ["TITLE", "BRAND", "PRICE", "COLOR", "GENDER", "IMAGE"]
+
+########### FUNCTION DEFINITIONS ############
+
+def mergeHostStates(base, delta):
+    """
+    :param base: per-host state as held by StrategyRegistry
+    :param delta: per-host counts recorded since base was read
+    :return: a new per-host state with the counts of delta added to those of base
+    """
+    merged = json.loads(json.dumps(base))
+    for host, state in delta.items():
+        target = merged.setdefault(host, {"pages": 0, "strategies": {}, "tiers": {}})
+        target["pages"] += state["pages"]
+        for tier, count in state["tiers"].items():
+            target["tiers"][tier] = target["tiers"].get(tier, 0) + count
+        for name, stats in state["strategies"].items():
+            totals = target["strategies"].setdefault(name, {"attempts": 0, "hits": 0, "fields": {}})
+            totals["attempts"] += stats["attempts"]
+            totals["hits"] += stats["hits"]
+            for field, count in stats["fields"].items():
+                totals["fields"][field] = totals["fields"].get(field, 0) + count
+    return merged
+
+
+@contextmanager
+def lockedFile(path):
+    """
+    Holds an exclusive lock on path.lock, so processes sharing a state file take turns to read, merge
+    and rewrite it.
+
+    :param path: the state file
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class StrategyRegistry:
+    """
+    Learns per host which extraction strategies produce which fields and plans each scrape accordingly:
+    field strategies are tried best first, optional strategies that never produced anything for a host
+    are skipped, and every reprobe_every pages a host runs the full default plan again.
+
+    Hand-written overrides take precedence over what was learned. They are keyed by host and may set
+    "order" (list of field strategies), "skip" (list of optional strategies), "tier" ("http" or
+    "browser") and "selectors" (item field to CSS selector).
+
+    Several processes may share one state file: each save adds what this process recorded since its
+    last save to what is on disk, and picks up what the others saved. A read-only registry, as in the
+    worker processes of scrape_supervisor, never writes the file and keeps a journal of its records
+    for the process that does.
+    """
+
+    def __init__(self, path=None, min_samples=5, reprobe_every=50, overrides=None, tier_registry=None,
+                 save_every=20, read_only=False):
+        """
+        :param path: JSON file the learned state is loaded from and saved to, None keeps it in memory
+        :param min_samples: attempts needed before a strategy is reordered or skipped for a host
+        :param reprobe_every: pages after which a host runs the default plan again, 0 never re-probes
+        :param overrides: dictionary of host to override dictionary
+        :param tier_registry: HostTierRegistry whose host tiers are persisted along with the strategies
+        :param save_every: number of recorded pages between two saves
+        :param read_only: load path but never write it, journal the records instead
+        """
+        self.path = path
+        self.min_samples = min_samples
+        self.reprobe_every = reprobe_every
+        self.overrides = overrides or {}
+        self.tier_registry = tier_registry
+        self.save_every = save_every
+        self.read_only = read_only
+        self._hosts = {}
+        # Counts recorded since the last save, added to the file's on the next one
+        self._pending = {}
+        self._journal = []
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def plan(self, url):
+        """
+        :param url: URL about to be scraped
+        :return: dictionary with the field strategy "order", the optional strategies to "skip", the
+        "selectors" overrides, the forced "tier" (None to let HostTierRegistry decide) and whether this
+        page is a "reprobe" of the default plan
+        """
+        host = hostOf(url)
+        override = self._override(host)
+        with self._lock:
+            state = self._hosts.get(host, {})
+            pages = state.get("pages", 0)
+            reprobe = bool(self.reprobe_every and pages and pages % self.reprobe_every == 0)
+            strategies = state.get("strategies", {})
+            order, skip = list(FIELD_STRATEGIES), set()
+            if not reprobe:
+                order.sort(key=lambda name: -self._hitRate(strategies.get(name)))
+                skip = {name for name in OPTIONAL_STRATEGIES if self._neverHelps(strategies.get(name))}
+        if "order" in override:
+            order = [name for name in override["order"] if name in FIELD_STRATEGIES]
+        if "skip" in override:
+            skip = set(override["skip"])
+        return {"order": order, "skip": skip, "selectors": override.get("selectors", {}),
+                "tier": override.get("tier"), "reprobe": reprobe}
+
+    def record(self, url, attempted, sources, tier=None):
+        """
+        :param url: URL that was scraped
+        :param attempted: names of the strategies that ran
+        :param sources: dictionary of item field to the strategy that produced it
+        :param tier: the fetch tier that produced the page
+        """
+        host = hostOf(url)
+        with self._lock:
+            for hosts in (self._hosts, self._pending):
+                self._count(hosts, host, attempted, sources, tier)
+            if self.read_only:
+                self._journal.append((url, list(attempted), dict(sources), tier))
+            self._unsaved += 1
+            save = self.path is not None and not self.read_only and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def drainJournal(self):
+        """
+        :return: list of the (url, attempted, sources, tier) arguments of the record calls made since the
+        last call, for the process owning the state file to record
+        """
+        with self._lock:
+            journal, self._journal = self._journal, []
+        return journal
+
+    def snapshot(self):
+        """
+        :return: a copy of the learned per-host state
+        """
+        with self._lock:
+            return json.loads(json.dumps(self._hosts))
+
+    def save(self):
+        """
+        Adds what was recorded since the last save to the state in path, with the host tiers of
+        tier_registry, and writes it back atomically.
+        """
+        if self.path is None or self.read_only:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._unsaved = 0
+        tiers = self.tier_registry.snapshot() if self.tier_registry else {}
+        try:
+            with lockedFile(self.path):
+                state = self._read() or {}
+                hosts = mergeHostStates(state.get("hosts", {}), pending)
+                data = json.dumps({"hosts": hosts, "tiers": dict(state.get("tiers", {}), **tiers)}, indent=1,
+                                  sort_keys=True)
+                temporary = f"{self.path}.{os.getpid()}.tmp"
+                with open(temporary, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(temporary, self.path)
+        except OSError as e:
+            logging.warning(f'Could not save strategy state to {self.path}: {str(e)}')
+            with self._lock:
+                self._pending = mergeHostStates(pending, self._pending)
+            return
+        with self._lock:
+            # What other processes saved is learned here too
+            self._hosts = mergeHostStates(hosts, self._pending)
+
+    def load(self):
+        """
+        Restores the state written by save.
+        """
+        if (state := self._read()) is None:
+            return
+        with self._lock:
+            self._hosts = mergeHostStates(state.get("hosts", {}), self._pending)
+        if self.tier_registry is not None:
+            self.tier_registry.restore(state.get("tiers", {}))
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f'Could not load strategy state from {self.path}: {str(e)}')
+            return None
+
+    def _override(self, host):
+        host = host.split(":")[0]
+        if host in self.overrides:
+            return self.overrides[host]
+        # "www.example.com" also matches an override written for "example.com"
+        for suffix, override in self.overrides.items():
+            if host.endswith("." + suffix):
+                return override
+        return {}
+
+    @staticmethod
+    def _count(hosts, host, attempted, sources, tier):
+        state = hosts.setdefault(host, {"pages": 0, "strategies": {}, "tiers": {}})
+        state["pages"] += 1
+        if tier is not None:
+            state["tiers"][tier] = state["tiers"].get(tier, 0) + 1
+        for name in attempted:
+            stats = state["strategies"].setdefault(name, {"attempts": 0, "hits": 0, "fields": {}})
+            stats["attempts"] += 1
+            produced = [field for field, source in sources.items() if source == name]
+            if produced:
+                stats["hits"] += 1
+            for field in produced:
+                stats["fields"][field] = stats["fields"].get(field, 0) + 1
+
+    def _hitRate(self, stats):
+        if not stats or stats["attempts"] < self.min_samples:
+            return 0.5
+        return stats["hits"] / stats["attempts"]
+
+    def _neverHelps(self, stats):
+        return bool(stats) and stats["attempts"] >= self.min_samples and stats["hits"] == 0
@@ -0,0 +1,22 @@
+import importlib
+import os
+import sys
+import pytest
+
+# The modules live at the top of the repository, next to main.py
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+# The local fake servers of the benchmarks are reused as test servers
+BENCHMARKS_DIR = os.path.join(REPO_DIR, "benchmarks")
+if BENCHMARKS_DIR not in sys.path:
+    sys.path.append(BENCHMARKS_DIR)
+
+
+@pytest.fixture(scope="session")
+def main():
+    # Imported without its SQLite files, the app keeps the cache and strategy state in memory
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("CACHE_PATH", "")
+        patch.setenv("STRATEGY_STATE_PATH", "")
+        yield importlib.import_module("main")
@@ -0,0 +1,55 @@
+from bs4 import BeautifulSoup
+from attribute_tagger import AttributeTagger, itemKey, missingKeys
+from html_requests import extractPage
+
+
+def extractItem(markup):
+    item_fields, _ = extractPage(BeautifulSoup(markup, "html.parser"), "https://shop.example/p")
+    return item_fields
+
+
+def test_tag_reads_every_field_from_the_title():
+    tagger = AttributeTagger(brands=["Free People"])
+    assert tagger.tag("Free People Blue Linen Shirt Dress with Pockets") == {
+        "BRAND": "Free People", "COLOR": "Blue", "MATERIAL": "Linen", "TYPE": "Dress", "GENDER": "Women"}
+    assert tagger.tag("Men's Black and White Cotton Hoodie")["COLOR"] == "Black and White"
+    assert tagger.tag("") == {}
+
+
+def test_short_brands_are_not_learned():
+    tagger = AttributeTagger()
+    tagger.learn([{"BRAND": "AE"}, {"BRAND": "Acme"}, {"BRAND": None}, "not an item"])
+    assert tagger.brands == {"Acme"}
+
+
+def test_fill_jsonld_item_uses_type_and_material():
+    item = extractItem('<script type="application/ld+json">{"@type": "Product", "name": "Acme Red Silk Slip Dress", '
+                       '"offers": {"price": "49", "priceCurrency": "USD"}}</script>')
+    assert "TYPE" in item and "MATERIAL" in item
+    filled = AttributeTagger(brands=["Acme"]).fill(item)
+    assert sorted(filled) == ["BRAND", "COLOR", "GENDER", "MATERIAL", "TYPE"]
+    assert (item["TYPE"], item["MATERIAL"], item["COLOR"]) == ("Dress", "Silk", "Red")
+    assert missingKeys(item) == []
+
+
+def test_fill_meta_tag_item_uses_its_type_key():
+    item = extractItem('<meta property="og:title" content="Acme Womens Green Wool Coat">'
+                       '<meta property="og:price:amount" content="120">')
+    assert itemKey(item, "TYPE") == "Type"
+    AttributeTagger(brands=["Acme"]).fill(item)
+    assert (item["Type"], item["MATERIAL"], item["GENDER"]) == ("Coat", "Wool", "Women")
+    assert "TYPE" not in item
+
+
+def test_fill_keeps_extracted_values():
+    item = {"TITLE": "Acme Blue Denim Jacket", "BRAND": "Levi's", "TYPE": None, "COLOR": "Indigo", "GENDER": None}
+    filled = AttributeTagger(brands=["Acme"]).fill(item)
+    assert (item["BRAND"], item["COLOR"], item["TYPE"]) == ("Levi's", "Indigo", "Jacket")
+    assert "BRAND" not in filled and "COLOR" not in filled
+    # Fields the item has no key for are not added
+    assert "MATERIAL" not in item
+
+
+def test_missing_keys_limited_to_fields():
+    item = {"TITLE": "Dress", "BRAND": "Acme", "TYPE": None, "COLOR": None, "MATERIAL": None}
+    assert missingKeys(item, ["BRAND", "TYPE", "GENDER"]) == ["TYPE"]
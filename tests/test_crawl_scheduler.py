@@ -0,0 +1,102 @@
+import threading
+import time
+from crawl_scheduler import CrawlScheduler, forwardThrottle, reportThrottle, throttleWatch
+
+
+def timedRun(scheduler, urls, fn=lambda url: url):
+    started = time.monotonic()
+    outcomes = list(scheduler.run(fn, urls))
+    return outcomes, time.monotonic() - started
+
+
+def test_every_url_is_scraped_once():
+    scheduler = CrawlScheduler(workers=4, rate=100, burst=10)
+    urls = [f"https://{host}.example/p/{number}" for host in ("a", "b", "c") for number in range(5)]
+    outcomes, _ = timedRun(scheduler, urls)
+    assert sorted(url for url, _, _ in outcomes) == sorted(urls)
+    assert all(result == url and error is None for url, result, error in outcomes)
+    assert scheduler.stats()["pages"] == 15
+
+
+def test_token_bucket_limits_each_host_but_not_the_others():
+    scheduler = CrawlScheduler(workers=4, rate=20, burst=1)
+    # 5 pages of one host need 4 refills of 50ms, the second host refills at the same time
+    _, one_host = timedRun(scheduler, [f"https://a.example/p/{number}" for number in range(5)])
+    scheduler = CrawlScheduler(workers=4, rate=20, burst=1)
+    _, two_hosts = timedRun(scheduler, [f"https://{host}.example/p/{number}" for number in range(5) for host in "bc"])
+    assert 0.18 <= one_host < 0.5
+    assert two_hosts < one_host + 0.1
+
+
+def test_host_concurrency_cap():
+    scheduler = CrawlScheduler(workers=8, rate=1000, burst=100, concurrency=2)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def scrape(url):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    timedRun(scheduler, [f"https://a.example/p/{number}" for number in range(8)], scrape)
+    assert peak[0] == 2
+
+
+def test_tokens_carry_over_between_runs():
+    scheduler = CrawlScheduler(workers=2, rate=10, burst=1)
+    _, first = timedRun(scheduler, ["https://a.example/p/1"])
+    _, second = timedRun(scheduler, ["https://a.example/p/2"])
+    assert first < 0.05
+    # The burst token was spent by the first batch, the second waits for a refill
+    assert second >= 0.08
+
+
+def test_share_hosts_divides_the_rate():
+    scheduler = CrawlScheduler(workers=2, rate=20, burst=1)
+    scheduler.shareHosts(2)
+    _, elapsed = timedRun(scheduler, [f"https://a.example/p/{number}" for number in range(3)])
+    # 10 pages per second once shared: two refills of 100ms
+    assert elapsed >= 0.18
+
+
+def test_throttled_host_is_slowed_down_and_counted():
+    scheduler = CrawlScheduler(workers=2, rate=50, burst=1)
+
+    def scrape(url):
+        if url.endswith("/1"):
+            reportThrottle(url, "429")
+        return url
+
+    _, elapsed = timedRun(scheduler, [f"https://a.example/p/{number}" for number in range(1, 4)], scrape)
+    assert scheduler.stats()["throttles"] == {"a.example": 1}
+    # After the throttle the host refills at half its rate, 40ms per page instead of 20ms
+    assert elapsed >= 0.07
+
+
+def test_errors_are_yielded_not_raised():
+    scheduler = CrawlScheduler(workers=2, rate=100, burst=5)
+
+    def scrape(url):
+        raise RuntimeError("boom")
+
+    outcomes, _ = timedRun(scheduler, ["https://a.example/p"], scrape)
+    assert outcomes[0][1] is None and isinstance(outcomes[0][2], RuntimeError)
+
+
+
+def test_throttle_watch_nesting_and_forwarding():
+    reportThrottle("https://a.example/p", "ignored")
+    with throttleWatch() as outer:
+        with throttleWatch() as inner:
+            reportThrottle("https://a.example/p", "challenge")
+        assert inner["reason"] == "challenge"
+        assert outer["reason"] == "challenge"
+
+    with throttleWatch() as watch:
+        hedge = forwardThrottle(lambda: reportThrottle("https://a.example/p", "429"))
+        thread = threading.Thread(target=hedge)
+        thread.start()
+        thread.join()
+    assert watch["reason"] == "429"
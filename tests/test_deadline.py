@@ -0,0 +1,115 @@
+import math
+import pickle
+import threading
+import time
+import pytest
+from deadline import Deadline, DeadlineExceeded, runHedged
+
+
+def test_remaining_budget_and_check():
+    deadline = Deadline(0.2)
+    assert 0 < deadline.remaining() <= 0.2
+    assert deadline.budget(cap=0.05) == 0.05
+    deadline.check("navigate")
+    time.sleep(0.21)
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.check("navigate")
+
+
+def test_no_limit():
+    deadline = Deadline()
+    assert deadline.remaining() == math.inf
+    assert deadline.budget() is None
+    assert deadline.budget(cap=10) == 10
+
+
+def test_allows_records_skipped_stages_once():
+    deadline = Deadline(0.1)
+    assert not deadline.allows("js_price", needed=1)
+    assert not deadline.allows("js_price", needed=1)
+    assert deadline.allows("extract", needed=0.01)
+    assert deadline.skipped == ["js_price"]
+
+
+def test_child_cancels_alone_and_follows_its_parent():
+    parent = Deadline(10)
+    first, second = parent.child(), parent.child()
+    first.cancel()
+    assert first.cancelled() and first.remaining() == 0
+    assert not second.cancelled() and not parent.cancelled()
+    parent.cancel()
+    assert second.cancelled()
+
+
+def test_pickles_as_the_time_left():
+    deadline = Deadline(5)
+    deadline.skip("network")
+    copy = pickle.loads(pickle.dumps(deadline))
+    assert 4 < copy.remaining() <= 5
+    assert copy.skipped == ["network"]
+    assert pickle.loads(pickle.dumps(Deadline())).remaining() == math.inf
+
+
+def slowAttempt(result, seconds, started=None):
+    def attempt(deadline, ready):
+        if started is not None:
+            started.append(result)
+        stop = time.monotonic() + seconds
+        while time.monotonic() < stop:
+            if deadline.cancelled():
+                raise DeadlineExceeded("cancelled")
+            time.sleep(0.005)
+        return result
+    return attempt
+
+
+def test_fast_primary_never_hedges():
+    started = []
+    assert runHedged(slowAttempt("primary", 0.01), slowAttempt("hedge", 0, started), 0.1, Deadline(1)) == "primary"
+    time.sleep(0.15)
+    assert started == []
+
+
+def test_ready_primary_is_not_hedged():
+    started = []
+
+    def primary(deadline, ready):
+        ready.set()
+        time.sleep(0.1)
+        return "primary"
+
+    assert runHedged(primary, slowAttempt("hedge", 0, started), 0.02, Deadline(1)) == "primary"
+    assert started == []
+
+
+def test_faster_hedge_wins_and_cancels_the_primary():
+    cancelled = threading.Event()
+
+    def primary(deadline, ready):
+        while not deadline.cancelled():
+            time.sleep(0.005)
+        cancelled.set()
+        return "primary"
+
+    started = time.monotonic()
+    assert runHedged(primary, slowAttempt("hedge", 0.02), 0.02, Deadline(2)) == "hedge"
+    assert cancelled.is_set()
+    assert time.monotonic() - started < 1
+
+
+def test_rejected_result_waits_for_the_hedge():
+    result = runHedged(slowAttempt("", 0.05), slowAttempt("hedge", 0.1), 0.01, Deadline(2),
+                       accept=lambda attempt: bool(attempt))
+    assert result == "hedge"
+
+
+def test_primary_error_when_both_fail():
+    def failing(deadline, ready):
+        raise ValueError("primary failed")
+
+    def hedge(deadline, ready):
+        raise RuntimeError("hedge failed")
+
+    with pytest.raises(ValueError):
+        runHedged(failing, hedge, 0, Deadline(1))
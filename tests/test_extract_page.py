@@ -0,0 +1,46 @@
+import pytest
+from bs4 import BeautifulSoup
+from bench_utils import fixtureNames, loadFixture
+from bench_page_facts import legacyPage
+from html_requests import extractPage, strategiesRun
+
+JSONLD_WITH_SITE_NAME = """<html><head><title>Shop</title>
+<meta property="og:site_name" content="Shop Name">
+<script type="application/ld+json">{"@type": "Product", "name": "Linen Dress",
+ "offers": {"price": "49", "priceCurrency": "USD"}}</script></head><body></body></html>"""
+
+
+def extract(markup, strategies=None, sources=None):
+    item_fields, _ = extractPage(BeautifulSoup(markup, "html.parser"), "https://shop.example/p", strategies=strategies,
+                                 sources=sources)
+    return item_fields
+
+
+def test_jsonld_page_keeps_its_fields_only():
+    sources = {}
+    item = extract(JSONLD_WITH_SITE_NAME, sources=sources)
+    assert item["TITLE"] == "Linen Dress"
+    assert item["BRAND"] is None
+    assert set(sources.values()) <= {"jsonld", "static"}
+    assert strategiesRun(["jsonld", "tags"], sources) == ["jsonld"]
+
+
+def test_tags_first_only_changes_the_order():
+    sources = {}
+    item = extract(JSONLD_WITH_SITE_NAME, strategies=["tags", "jsonld"], sources=sources)
+    assert (item["TITLE"], item["BRAND"]) == ("Shop", "Shop Name")
+    assert strategiesRun(["tags", "jsonld"], sources) == ["tags"]
+
+
+def test_nothing_found_runs_every_strategy():
+    assert strategiesRun(["jsonld", "tags"], {}) == ["jsonld", "tags"]
+
+
+@pytest.mark.parametrize("name", [name for name in fixtureNames() if name != "jsonld_graph.html"])
+def test_fields_match_the_legacy_extractors(name):
+    # The legacy extractors cannot read @graph documents, jsonld_graph.html falls back to tags there
+    markup = loadFixture(name)
+    legacy = legacyPage(BeautifulSoup(markup, "html.parser"))
+    item = extract(markup)
+    for field in ("TITLE", "BRAND", "COLOR", "GENDER"):
+        assert item.get(field) == legacy.get(field), field
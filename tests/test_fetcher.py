@@ -0,0 +1,82 @@
+import pytest
+from bs4 import BeautifulSoup
+from bench_utils import loadFixture
+from fetcher import BROWSER_TIER, HTTP_TIER, HostTierRegistry, isChallengePage, isStaticAdequate
+from page_facts import parsePage
+
+OG_HEAD = '<meta property="og:title" content="Linen Dress">'
+OG_IMAGE = '<meta property="og:image" content="https://shop.example/dress.jpg">'
+OG_PRICE = '<meta property="product:price:amount" content="49.00"><meta property="product:price:currency" content="USD">'
+CHALLENGE = ('<html><head><title>Just a moment...</title></head><body>'
+             '<script src="/cdn-cgi/challenge-platform/h/b/orchestrate/jsch/v1"></script></body></html>')
+CHALLENGE_WITH_PRODUCT = ('<html><head><title>Linen Dress</title><script type="application/ld+json">'
+                          '{"@type": "Product", "name": "Linen Dress"}</script></head><body>'
+                          '<div id="px-captcha"></div></body></html>')
+
+
+def page(head):
+    return f"<html><head><title>Shop</title>{head}</head><body></body></html>"
+
+
+@pytest.mark.parametrize("markup, status, adequate", [
+    (loadFixture("jsonld_graph.html"), 200, True),
+    (loadFixture("jsonld_list.html"), 200, True),
+    (loadFixture("jsonld_shopify.html"), 200, True),
+    (loadFixture("meta_only.html"), 200, True),
+    (loadFixture("messy.html"), 200, False),
+    (loadFixture("jsonld_shopify.html"), 404, False),
+    (loadFixture("jsonld_shopify.html"), 429, False),
+    (page(OG_HEAD + OG_IMAGE), 200, True),
+    (page(OG_HEAD + OG_PRICE), 200, True),
+    (page(OG_HEAD), 200, False),
+    (page(OG_IMAGE + OG_PRICE), 200, False),
+    (CHALLENGE, 200, False),
+    (CHALLENGE_WITH_PRODUCT, 200, False),
+], ids=["jsonld_graph", "jsonld_list", "jsonld_shopify", "meta_only", "messy", "not_found", "rate_limited",
+        "og_title_image", "og_title_price", "og_title_only", "no_og_title", "challenge", "challenge_with_product"])
+@pytest.mark.parametrize("partial", [False, True], ids=["full", "partial"])
+def test_is_static_adequate(markup, status, adequate, partial):
+    html = parsePage(markup, "html.parser") if partial else BeautifulSoup(markup, "html.parser")
+    assert isStaticAdequate(html, status, markup=markup) is adequate
+
+
+def test_challenge_page_is_detected_from_the_markup_alone():
+    # The partial parse drops the body, the marker is only found in the raw markup
+    assert isChallengePage(parsePage(CHALLENGE_WITH_PRODUCT, "html.parser"), markup=CHALLENGE_WITH_PRODUCT)
+    assert isChallengePage(BeautifulSoup(CHALLENGE, "html.parser"))
+    assert not isChallengePage(BeautifulSoup(loadFixture("meta_only.html"), "html.parser"))
+
+
+@pytest.mark.parametrize("records, expected", [
+    ([], HTTP_TIER),
+    ([HTTP_TIER], HTTP_TIER),
+    ([BROWSER_TIER], BROWSER_TIER),
+    ([BROWSER_TIER, HTTP_TIER], HTTP_TIER),
+    ([HTTP_TIER, BROWSER_TIER], BROWSER_TIER),
+])
+def test_preferred_tier_follows_the_last_record(records, expected):
+    registry = HostTierRegistry(reprobe_every=0)
+    for tier in records:
+        registry.record("https://shop.example/p/1", tier)
+    assert registry.preferredTier("https://shop.example/p/2") == expected
+    assert registry.preferredTier("https://other.example/p/2") == HTTP_TIER
+
+
+def test_browser_hosts_are_reprobed_over_http():
+    registry = HostTierRegistry(reprobe_every=3)
+    tiers = []
+    for _ in range(7):
+        tier = registry.preferredTier("https://shop.example/p")
+        tiers.append(tier)
+        # The HTTP probe keeps failing, the browser scrape that follows is recorded
+        registry.record("https://shop.example/p", BROWSER_TIER)
+    assert tiers == [HTTP_TIER, BROWSER_TIER, BROWSER_TIER, HTTP_TIER, BROWSER_TIER, BROWSER_TIER, HTTP_TIER]
+
+
+def test_snapshot_and_restore():
+    registry = HostTierRegistry()
+    registry.record("https://Shop.example/p", BROWSER_TIER)
+    assert registry.snapshot() == {"shop.example": BROWSER_TIER}
+    restored = HostTierRegistry()
+    restored.restore(registry.snapshot())
+    assert restored.preferredTier("https://shop.example/q") == BROWSER_TIER
@@ -0,0 +1,74 @@
+import os
+import pytest
+from fake_retailer import startServer
+from image_downloader import ImageDownloader, ImageDownloadError, ImageTooLarge
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = startServer()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    downloader = ImageDownloader(str(tmp_path), workers=4, host_rate=1000, host_concurrency=4, max_bytes=50000)
+    yield downloader
+    downloader.close()
+
+
+def imageUrl(server, name, content=None, size=2000):
+    return f"http://127.0.0.1:{server.server_port}/images/{name}.png?content={content or name}&size={size}"
+
+
+def test_download_stores_the_image_by_digest(server, downloader):
+    record = downloader.download(imageUrl(server, "front"))
+    assert record["status"] == "downloaded"
+    assert (record["bytes"], record["content_type"]) == (2000, "image/png")
+    assert record["path"] == os.path.join("objects", record["digest"][:2], record["digest"] + ".png")
+    with open(os.path.join(downloader.root, record["path"]), "rb") as f:
+        assert f.read().startswith(b"\x89PNG")
+    assert downloader.lookup(record["url"])["etag"]
+
+
+def test_same_bytes_under_another_url_are_stored_once(server, downloader):
+    first = downloader.download(imageUrl(server, "front"))
+    second = downloader.download(imageUrl(server, "front-large", content="front"))
+    assert second["status"] == "duplicate"
+    assert second["path"] == first["path"]
+    stored = [name for _, _, names in os.walk(os.path.join(downloader.root, "objects")) for name in names]
+    assert len(stored) == 1
+
+
+def test_second_download_is_revalidated(server, downloader):
+    url = imageUrl(server, "back")
+    first = downloader.download(url)
+    not_modified = server.not_modified
+    second = downloader.download(url)
+    assert second["status"] == "not_modified"
+    assert second["digest"] == first["digest"]
+    assert server.not_modified == not_modified + 1
+
+
+def test_size_cap_and_errors(server, downloader):
+    with pytest.raises(ImageTooLarge):
+        downloader.download(imageUrl(server, "huge", size=200000))
+    with pytest.raises(ImageDownloadError):
+        downloader.download(f"http://127.0.0.1:{server.server_port}/products/messy")
+    with pytest.raises(ImageDownloadError):
+        downloader.download(f"http://127.0.0.1:{server.server_port}/missing.png")
+    # Nothing of the rejected bodies is left behind
+    leftovers = [name for _, _, names in os.walk(os.path.join(downloader.root, "objects")) for name in names]
+    assert leftovers == []
+
+
+def test_download_many_and_first(server, downloader):
+    urls = [imageUrl(server, f"side-{number}") for number in range(6)]
+    outcomes = list(downloader.downloadMany(urls + urls[:2]))
+    assert sorted(url for url, _, _ in outcomes) == sorted(urls)
+    assert all(error is None and record["status"] == "downloaded" for _, record, error in outcomes)
+
+    missing = f"http://127.0.0.1:{server.server_port}/missing.png"
+    assert downloader.downloadFirst([missing, urls[0]])["url"] == urls[0]
+    assert downloader.downloadFirst([missing]) is None
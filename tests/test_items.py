@@ -0,0 +1,80 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from scrape_executor import ScrapeExecutor
+
+
+class FakeScrapes:
+    """
+    Stands in for scrapeItem: URLs ending in a number of milliseconds take that long, "boom" fails and
+    "slow" times out.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+
+    async def __call__(self, url, timeout, max_age=None, bypass_queue_limit=False, timings=False):
+        self.calls.append((url, bypass_queue_limit))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(int(url.rsplit("/", 1)[-1]) / 1000 if url[-1].isdigit() else 0.01)
+            if url.endswith("boom"):
+                raise ValueError("no fields")
+            if url.endswith("slow"):
+                raise asyncio.TimeoutError()
+            return {"TITLE": url}
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def scrapes(main, monkeypatch):
+    scrapes = FakeScrapes()
+    executor = ScrapeExecutor(max_in_flight=2, max_queue=0)
+    monkeypatch.setattr(main, "scrapeItem", scrapes)
+    monkeypatch.setattr(main, "scrape_executor", executor)
+    # The admission slots are created in the event loop of the first batch, each test gets its own
+    monkeypatch.setattr(main, "batch_slots", None)
+    yield scrapes
+    executor.shutdown()
+
+
+def test_items_streams_one_record_per_url(main, scrapes):
+    urls = ["https://shop.example/p/80", "https://shop.example/p/1", "", "https://shop.example/boom",
+            "https://shop.example/slow"]
+    response = TestClient(main.app).post("/items", json={"urls": urls})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(record["index"] for record in records) == list(range(len(urls)))
+    by_index = {record["index"]: record for record in records}
+    assert by_index[0] == {"index": 0, "url": urls[0], "item": {"TITLE": urls[0]}}
+    assert by_index[1] == {"index": 1, "url": urls[1], "item": {"TITLE": urls[1]}}
+    assert by_index[2] == {"index": 2, "url": "", "error": "URL Missing"}
+    assert by_index[3] == {"index": 3, "url": urls[3], "error": "no fields"}
+    assert by_index[4] == {"index": 4, "url": urls[4], "error": "Scrape timed out"}
+    # Records arrive in completion order, the slow first URL comes last
+    assert records[-1]["index"] == 0
+    assert all(bypass for _, bypass in scrapes.calls)
+
+
+def test_items_without_urls_is_rejected(main, scrapes):
+    assert TestClient(main.app).post("/items", json={"urls": []}).status_code == 400
+
+
+def test_batches_share_the_admission_slots(main, scrapes):
+    async def consume(urls):
+        return [json.loads(line) async for line in main.streamItems(urls, 5)]
+
+    async def run():
+        return await asyncio.gather(*(consume([f"https://shop.example/{batch}/20" for _ in range(3)])
+                                      for batch in ("a", "b")))
+
+    first, second = asyncio.run(run())
+    assert len(first) == len(second) == 3
+    assert len(scrapes.calls) == 6
+    assert scrapes.max_active == main.scrape_executor.max_in_flight == 2
@@ -0,0 +1,110 @@
+import importlib
+import time
+import pytest
+from crawl_scheduler import CrawlScheduler
+from job_queue import DEAD, DONE, LEASED, QUEUED, JobQueue, urlFromLine
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.sqlite3"), max_attempts=2, backoff=10)
+    yield queue
+    queue.close()
+
+
+def test_url_from_line():
+    assert urlFromLine('{"url": "https://a.example/p"}') == "https://a.example/p"
+    assert urlFromLine('{"link": "https://a.example/p"}') == "https://a.example/p"
+    assert urlFromLine('"https://a.example/p"') == "https://a.example/p"
+    assert urlFromLine("https://a.example/p\n") == "https://a.example/p"
+    assert urlFromLine("not a url") is None
+    assert urlFromLine("") is None
+
+
+def test_add_ignores_duplicates(queue):
+    assert queue.add(["https://a.example/1", "https://a.example/2"]) == 2
+    assert queue.add(["https://a.example/2", "https://a.example/3"]) == 1
+    assert queue.progress()["total"] == 3
+
+
+def test_ingest_resumes_after_the_last_full_line(queue, tmp_path):
+    path = tmp_path / "urls.jsonl"
+    path.write_text('{"url": "https://a.example/1"}\n{"url": "https://a.example/2"}\n{"url": "https://a.exa')
+    assert queue.ingest(str(path), batch_size=1) == 2
+    with open(path, "a") as f:
+        f.write('mple/3"}\n')
+    assert queue.ingest(str(path)) == 1
+    assert queue.ingest(str(path)) == 0
+
+
+def test_leases_are_exclusive_and_completed(queue):
+    queue.add(["https://a.example/1", "https://a.example/2"])
+    first = queue.lease("worker-1", limit=1)
+    second = queue.lease("worker-2", limit=5)
+    assert len(first) == 1 and len(second) == 1
+    assert first[0][1] != second[0][1]
+    assert first[0][2] == 1
+    assert queue.lease("worker-3") == []
+    job_id, url, _ = first[0]
+    # Only the lease holder may complete the job
+    assert not queue.complete(job_id, "worker-2", {"item": {}})
+    assert queue.complete(job_id, "worker-1", {"item": {"TITLE": "Dress"}})
+    assert list(queue.results()) == [{"url": url, "attempts": 1, "error": None, "result": {"item": {"TITLE": "Dress"}}}]
+    assert queue.progress()[DONE] == 1 and queue.progress()[LEASED] == 1
+
+
+def test_expired_lease_is_handed_to_another_worker(queue):
+    queue.add(["https://a.example/1"])
+    queue.lease("worker-1", lease_seconds=0.01)
+    time.sleep(0.02)
+    (job_id, _, attempt), = queue.lease("worker-2")
+    assert attempt == 2
+    assert not queue.complete(job_id, "worker-1", {})
+    assert queue.complete(job_id, "worker-2", {})
+
+
+def test_failures_back_off_then_dead_letter(queue, monkeypatch):
+    queue.add(["https://a.example/1"])
+    (job_id, _, _), = queue.lease("worker")
+    assert queue.fail(job_id, "worker", "timeout") == QUEUED
+    # The retry waits for the backoff
+    assert queue.lease("worker") == []
+    assert 9 <= queue.nextAvailable() <= 10
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    (job_id, _, attempt), = queue.lease("worker")
+    assert attempt == 2
+    assert queue.fail(job_id, "worker", "timeout again") == DEAD
+    assert queue.nextAvailable() is None
+    dead, = queue.results(DEAD)
+    assert (dead["attempts"], dead["error"]) == (2, "timeout again")
+
+    assert queue.retryDead() == 1
+    assert queue.lease("worker")[0][2] == 1
+
+
+def test_fail_after_lost_lease_is_ignored(queue):
+    queue.add(["https://a.example/1"])
+    (job_id, _, _), = queue.lease("worker-1")
+    assert queue.fail(job_id, "worker-2", "not mine") is None
+
+
+def test_worker_fails_pages_without_item_fields(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_PATH", "")
+    monkeypatch.setenv("STRATEGY_STATE_PATH", "")
+    main = importlib.import_module("main")
+    crawl_queue = importlib.import_module("crawl_queue")
+    flags = {"Title": "1"}
+    monkeypatch.setattr(main, "scrapeLink", lambda url: ({"TITLE": "Dress"}, flags) if url.endswith("/ok") else ([], flags))
+    monkeypatch.setattr(main, "crawl_scheduler", CrawlScheduler(workers=2, rate=1000, burst=100))
+    path = str(tmp_path / "queue.sqlite3")
+    queue = JobQueue(path)
+    queue.add(["https://a.example/ok", "https://a.example/empty"])
+    queue.close()
+
+    assert crawl_queue.runWorker(path, max_attempts=1, backoff=0) == 1
+    queue = JobQueue(path)
+    assert [record["url"] for record in queue.results(DONE)] == ["https://a.example/ok"]
+    dead, = queue.results(DEAD)
+    assert (dead["url"], dead["error"]) == ("https://a.example/empty", "No item fields extracted")
+    queue.close()
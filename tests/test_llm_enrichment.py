@@ -0,0 +1,45 @@
+from llm_enrichment import EnrichmentClient, splitBatchResponse
+
+RESPONSE = """
+### 1
+Brand - Nike
+Color - White
+### 2
+Brand - Baggit
+Color - Blue - Grey
+### 3
+Brand - Swarovski
+Color - White
+"""
+
+
+def unpackingParse(item, block):
+    # Unpacks every "Key - Value" line into exactly two parts, as parseOutput did before splitting once
+    for line in block.split("\n"):
+        if " - " in line:
+            key, value = [part.strip() for part in line.split(" - ")]
+            item[key.upper()] = value
+
+
+def client(monkeypatch, text):
+    enrichment = EnrichmentClient(requests_per_minute=0)
+    monkeypatch.setattr(enrichment, "_complete", lambda prompt, max_tokens, deadline: text)
+    return enrichment
+
+
+def test_split_batch_response_by_item_number():
+    blocks = splitBatchResponse(RESPONSE, 4)
+    assert blocks[1] == "Brand - Baggit\nColor - Blue - Grey"
+    assert blocks[3] is None
+
+
+def test_malformed_block_leaves_only_its_item_unenriched(monkeypatch):
+    enrichment = client(monkeypatch, RESPONSE)
+    items = [{"TITLE": "Nike Air Force 1"}, {"TITLE": "Baggit Handbag"}, {"TITLE": "Swarovski Earrings"}]
+    try:
+        enrichment.enrich(items, unpackingParse)
+    finally:
+        enrichment.close()
+    assert items[0]["BRAND"] == "Nike"
+    assert items[1] == {"TITLE": "Baggit Handbag", "BRAND": "Baggit"}
+    assert items[2] == {"TITLE": "Swarovski Earrings", "BRAND": "Swarovski", "COLOR": "White"}
@@ -0,0 +1,39 @@
+from metrics import MetricsRegistry
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.describe("pages_total", "counter", "Pages.")
+    registry.describe("idle", "gauge", "Idle browsers.")
+    registry.describe("stage_seconds", "histogram", "Stage time.")
+    registry.inc("pages_total", {"host": "a.example"})
+    registry.inc("pages_total", {"host": "a.example"}, 2)
+    registry.set("idle", 3)
+    registry.observe("stage_seconds", 0.5, {"stage": "navigate"})
+    text = registry.render()
+    assert "# TYPE pages_total counter" in text
+    assert 'pages_total{host="a.example"} 3' in text
+    assert "idle 3" in text
+    assert 'stage_seconds_bucket{stage="navigate",le="0.1"} 0' in text
+    assert 'stage_seconds_bucket{stage="navigate",le="1.0"} 1' in text
+    assert 'stage_seconds_count{stage="navigate"} 1' in text
+
+
+def test_drain_and_merge_move_counters_and_histograms_only():
+    worker, parent = MetricsRegistry(buckets=(0.1, 1.0)), MetricsRegistry(buckets=(0.1, 1.0))
+    for registry in (worker, parent):
+        registry.describe("idle", "gauge", "Idle browsers.")
+    worker.inc("pages_total", {"tier": "http"}, 2)
+    worker.observe("stage_seconds", 0.05, {"stage": "extract"})
+    worker.set("idle", 1)
+    parent.inc("pages_total", {"tier": "http"})
+    parent.set("idle", 4)
+
+    parent.merge(worker.drain())
+    assert parent.value("pages_total", {"tier": "http"}) == 3
+    assert parent.value("idle") == 4
+    assert parent.value("stage_seconds", {"stage": "extract"})["count"] == 1
+    # A drained registry starts over, so the next delta does not count the same pages twice
+    assert worker.value("pages_total", {"tier": "http"}) == 0
+    assert worker.value("idle") == 1
+    assert worker.drain() == {}
@@ -0,0 +1,96 @@
+import pytest
+from network_capture import findProductPayload, mergeCapturedFields, payloadFields, ruleFor
+
+# Trimmed shapes of the product APIs the host rules target
+ZARA_PAYLOAD = {
+    "productMetaData": [{"id": 1, "name": "ZARA WOMAN"}],
+    "product": {
+        "id": 301298,
+        "name": "Linen Blend Midi Dress",
+        "brand": {"brandId": 1, "brandGroupCode": "zara", "name": "Zara"},
+        "detail": {
+            "colors": [{"id": "250", "name": "Ecru", "price": 4590}],
+        },
+        "price": {"value": "49.90", "currency": "USD"},
+        "colorName": "Ecru",
+        "sectionName": "WOMAN",
+        "xmedia": [{"path": "/photos/2024/V/0/1/p/3012/985/712/2"}],
+        "image": {"url": "https://static.zara.net/photos/3012985712.jpg"},
+    },
+}
+
+SHEIN_PAYLOAD = {
+    "code": "0",
+    "info": {
+        "goods_id": "10293847",
+        "goods_name": "SHEIN EZwear Solid Ribbed Knit Tank Top",
+        "goods_img": "//img.ltwebstatic.com/images3_pi/2023/05/10/tank.jpg",
+        "salePrice": {"amount": "7.49", "usdAmount": "7.49", "amountWithSymbol": "$7.49"},
+        "retailPrice": {"amount": "9.99", "amountWithSymbol": "$9.99"},
+        "currency": "USD",
+        "relatedColor": [{"goods_id": "10293848", "goods_color_name": "Black"}],
+    },
+}
+
+NORDSTROM_PAYLOAD = {
+    "productsById": {
+        "7381442": {
+            "productName": "Air Force 1 '07 Sneaker",
+            "brandName": "Nike",
+            "genderName": "Women",
+            "currentPrice": "$115.00",
+            "mediaExperiences": {"carouselsByColor": []},
+            "colorName": "White/White",
+        }
+    },
+    "recommendations": [{"name": "Gift card", "price": 25}],
+}
+
+
+def test_finds_nested_product_objects():
+    assert findProductPayload(ZARA_PAYLOAD) is ZARA_PAYLOAD["product"]
+    assert findProductPayload(SHEIN_PAYLOAD) is SHEIN_PAYLOAD["info"]
+    assert findProductPayload(NORDSTROM_PAYLOAD) is NORDSTROM_PAYLOAD["productsById"]["7381442"]
+
+
+def test_ignores_payloads_without_a_product():
+    assert findProductPayload({"cart": {"count": 2}, "user": {"name": "Ana"}}) is None
+    assert findProductPayload([1, "two", None]) is None
+
+
+@pytest.mark.parametrize("payload, expected", [
+    (ZARA_PAYLOAD, {"TITLE": "Linen Blend Midi Dress", "BRAND": "Zara", "COLOR": "Ecru", "PRICE": 49.9,
+                    "CURRENCY": "USD", "IMAGE": "https://static.zara.net/photos/3012985712.jpg"}),
+    (SHEIN_PAYLOAD, {"TITLE": "SHEIN EZwear Solid Ribbed Knit Tank Top", "PRICE": 7.49, "CURRENCY": "USD",
+                     "IMAGE": "//img.ltwebstatic.com/images3_pi/2023/05/10/tank.jpg"}),
+    (NORDSTROM_PAYLOAD, {"TITLE": "Air Force 1 '07 Sneaker", "BRAND": "Nike", "GENDER": "Women",
+                         "COLOR": "White/White", "PRICE": 115.0, "CURRENCY": "USD"}),
+])
+def test_payload_fields(payload, expected):
+    assert payloadFields(findProductPayload(payload)) == expected
+
+
+def test_host_rules_match_the_api_urls():
+    assert ruleFor("https://www.zara.com/us/en/dress-p0301298.html").search(
+        "https://www.zara.com/itxrest/3/catalog/store/11719/product/301298/detail")
+    assert not ruleFor("https://us.shein.com/tank-p-10293847.html").search("https://us.shein.com/api/cart/num")
+    assert ruleFor("https://shop.example.com/p/1").search("https://shop.example.com/api/product/1")
+
+
+def test_merge_fills_only_missing_fields():
+    item_fields = {"TITLE": "Sneaker", "BRAND": None, "PRICE": None, "CURRENCY": None}
+    result_dict = {"Title": "1", "Brand": "0", "Price": "0"}
+    sources = {"TITLE": "jsonld"}
+    captured = payloadFields(findProductPayload(NORDSTROM_PAYLOAD))
+    mergeCapturedFields(item_fields, result_dict, captured, sources)
+    assert item_fields["TITLE"] == "Sneaker"
+    assert (item_fields["BRAND"], item_fields["PRICE"], item_fields["CURRENCY"]) == ("Nike", 115.0, "USD")
+    assert result_dict["Brand"] == result_dict["Price"] == "1"
+    assert sources == {"TITLE": "jsonld", "BRAND": "network", "PRICE": "network", "COLOR": "network",
+                       "GENDER": "network"}
+
+
+def test_merge_leaves_failed_extractions_alone():
+    item_fields, result_dict = [], {"Title": "0"}
+    mergeCapturedFields(item_fields, result_dict, {"TITLE": "Sneaker"})
+    assert item_fields == [] and result_dict == {"Title": "0"}
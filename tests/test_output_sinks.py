@@ -0,0 +1,101 @@
+import csv
+import json
+import sqlite3
+import pytest
+from output_sinks import CSV_COLUMNS, CsvSink, SuccessAggregate, makeRecord, openSink
+
+ITEM = {"TITLE": "Linen Dress", "BRAND": "Shop", "PRICE": 49.0, "CURRENCY": "USD", "IMAGE": "https://shop.example/d.jpg",
+        "TYPE": "Dress"}
+FLAGS = {"Link": "https://shop.example/p/1", "Title": "1", "Brand": "1", "Price": "1", "Color": "0", "Gender": "0",
+         "Image": "1"}
+
+
+def records():
+    return [makeRecord("https://shop.example/p/1", ITEM, FLAGS, seconds=1.23456),
+            makeRecord("https://shop.example/p/2", error="Scrape timed out")]
+
+
+def readCsv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_csv_header_is_only_written_to_new_files(tmp_path):
+    path = str(tmp_path / "results.csv")
+    for _ in range(2):
+        with CsvSink(path, flush_seconds=0) as sink:
+            for record in records():
+                sink.write(record)
+    rows = readCsv(path)
+    assert rows[0] == CSV_COLUMNS
+    assert rows.count(CSV_COLUMNS) == 1
+    assert len(rows) == 5
+    row = dict(zip(CSV_COLUMNS, rows[1]))
+    assert (row["Link"], row["Title"], row["Color"], row["PRICE"], row["Seconds"]) == \
+        ("https://shop.example/p/1", "1", "0", "49.0", "1.235")
+    assert dict(zip(CSV_COLUMNS, rows[2]))["Error"] == "Scrape timed out"
+
+
+def test_csv_with_other_columns_is_left_alone(tmp_path):
+    path = tmp_path / "results.csv"
+    path.write_text("Link,Title,Brand,Price,Color,Gender\nhttps://old.example/p,1,1,1,0,0\n", encoding="utf-8")
+    original = path.read_text(encoding="utf-8")
+    with openSink(str(path), flush_seconds=0) as sink:
+        sink.write(records()[0])
+    assert sink.path == str(tmp_path / "results-1.csv")
+    assert path.read_text(encoding="utf-8") == original
+    assert readCsv(sink.path)[0] == CSV_COLUMNS
+    # The next run appends to the compatible file it found
+    with openSink(str(path), flush_seconds=0) as sink:
+        sink.write(records()[1])
+    assert sink.path == str(tmp_path / "results-1.csv")
+    assert len(readCsv(sink.path)) == 3
+
+
+def test_jsonl_sink_keeps_every_field(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with openSink(path, flush_seconds=0) as sink:
+        for record in records():
+            sink.write(record)
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["link"] for line in lines] == ["https://shop.example/p/1", "https://shop.example/p/2"]
+    assert lines[0]["fields"]["TYPE"] == "Dress"
+    assert lines[0]["host"] == "shop.example"
+    assert lines[1]["fields"] == {} and lines[1]["error"] == "Scrape timed out"
+
+
+def test_sqlite_sink_writes_one_row_per_record(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    with openSink(path, flush_rows=1, flush_seconds=0) as sink:
+        for record in records():
+            sink.write(record)
+    with sqlite3.connect(path) as db:
+        rows = db.execute("SELECT link, error, fields, flags FROM results ORDER BY id").fetchall()
+    assert [row[0] for row in rows] == ["https://shop.example/p/1", "https://shop.example/p/2"]
+    assert json.loads(rows[0][2])["PRICE"] == 49.0
+    assert json.loads(rows[0][3])["Title"] == "1"
+    assert rows[1][1] == "Scrape timed out"
+
+
+def test_unknown_extension_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        openSink(str(tmp_path / "results.xlsx"))
+
+
+def test_success_aggregate_counts_captured_pages_only():
+    aggregate = SuccessAggregate()
+    for record in records() + [makeRecord("https://shop.example/p/3", {"TITLE": "Tee"}, {"Title": "1"})]:
+        aggregate.add(record)
+    assert (aggregate.pages, aggregate.captured) == (3, 2)
+    assert aggregate.extracted == {"Image": 1, "Title": 2, "Price": 1, "Brand": 1, "Color": 0, "Gender": 0}
+    assert aggregate.rates()["Title"] == 100.0
+    assert aggregate.rates()["Price"] == 50.0
+    assert aggregate.table().startswith("Out of 3 tested websites, the program succesfully captured the HTML of 2")
+
+
+def test_sink_aggregate_matches_what_was_written(tmp_path):
+    with openSink(str(tmp_path / "results.csv"), flush_seconds=0) as sink:
+        for record in records():
+            sink.write(record)
+    assert (sink.aggregate.pages, sink.aggregate.captured) == (2, 1)
@@ -0,0 +1,25 @@
+import pytest
+from bs4 import BeautifulSoup
+from bench_utils import fixtureNames, loadFixture
+from bench_page_facts import FILLER_BLOCK
+from html_requests import extractPage
+from page_facts import DEFAULT_PARSER, parsePage
+
+LINK = "https://shop.example/p"
+PARSERS = sorted({"html.parser", DEFAULT_PARSER})
+
+
+def extract(page):
+    sources = {}
+    item_fields, result_dict = extractPage(page, LINK, sources=sources)
+    return item_fields, result_dict, sources
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("name", fixtureNames())
+@pytest.mark.parametrize("filler", [0, 20])
+def test_partial_parse_extracts_the_same_fields(name, parser, filler):
+    markup = loadFixture(name).replace("</body>", FILLER_BLOCK * filler + "</body>")
+    full = extract(BeautifulSoup(markup, parser))
+    assert full[0], f"{name} extracted nothing"
+    assert extract(parsePage(markup, parser)) == full
@@ -0,0 +1,78 @@
+import shutil
+import pytest
+from price_parser import LEGACY_PRICE_SCRIPT, PRICE_MAX_Y, PRICE_SCRIPT, extractPriceWithJS, findPriceCandidate
+
+CHROME = next((shutil.which(name) for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser")
+               if shutil.which(name)), None)
+
+# A sale price next to the prices it replaces, crossed out by tag, by class and by style, each in a bigger font
+SALE_PAGE = """<html><body style="margin: 20px">
+<h1 style="font-size: 24px">Linen Dress</h1>
+<div class="price">
+  <del style="font-size: 40px">$120.00</del>
+  <span class="was-price" style="font-size: 36px">$95.00</span>
+  <span style="font-size: 34px; text-decoration: line-through">$89.00</span>
+  <span class="price-sale" style="font-size: 30px">$49.00</span>
+</div>
+<p style="font-size: 18px">Free shipping over $50</p>
+<div style="margin-top: 900px; font-size: 60px">$10.00</div>
+</body></html>"""
+
+STRUCK_ONLY_PAGE = """<html><body style="margin: 20px">
+<h1>Linen Dress</h1><s style="font-size: 30px">$89.00</s>
+</body></html>"""
+
+
+class FakeDriver:
+    def __init__(self, candidate):
+        self.candidate = candidate
+        self.calls = []
+
+    def execute_script(self, script, *args):
+        self.calls.append((script, args))
+        return self.candidate
+
+
+def test_find_price_candidate_passes_the_fold():
+    driver = FakeDriver(None)
+    assert findPriceCandidate(driver) is None
+    assert driver.calls == [(PRICE_SCRIPT, (PRICE_MAX_Y,))]
+    findPriceCandidate(driver, max_y=300)
+    assert driver.calls[-1][1] == (300,)
+
+
+def test_extract_price_returns_the_candidate_text():
+    candidate = {"text": "$49.00", "value": 49.0, "currency": "$", "path": "span.price-sale", "compare_at": "$120.00",
+                 "candidates": 4}
+    assert extractPriceWithJS(FakeDriver(candidate)) == "$49.00"
+    assert extractPriceWithJS(FakeDriver(None)) is None
+
+
+@pytest.fixture(scope="module")
+def driver():
+    from driver_pool import createDriver
+    driver = createDriver(page_load_strategy="normal")
+    yield driver
+    driver.quit()
+
+
+def render(driver, tmp_path, markup):
+    path = tmp_path / "page.html"
+    path.write_text(markup, encoding="utf-8")
+    driver.get(path.as_uri())
+
+
+@pytest.mark.skipif(CHROME is None, reason="needs Chrome")
+def test_crossed_out_prices_are_not_picked(driver, tmp_path):
+    render(driver, tmp_path, SALE_PAGE)
+    candidate = driver.execute_script(PRICE_SCRIPT, PRICE_MAX_Y)
+    assert (candidate["text"], candidate["value"], candidate["currency"]) == ("$49.00", 49.0, "$")
+    assert candidate["compare_at"] == "$120.00"
+    # The original finder only ranked by font size and picks the biggest crossed-out price
+    assert driver.execute_script(LEGACY_PRICE_SCRIPT) == "$120.00"
+
+
+@pytest.mark.skipif(CHROME is None, reason="needs Chrome")
+def test_page_with_only_a_crossed_out_price_has_none(driver, tmp_path):
+    render(driver, tmp_path, STRUCK_ONLY_PAGE)
+    assert driver.execute_script(PRICE_SCRIPT, PRICE_MAX_Y) is None
@@ -0,0 +1,88 @@
+import time
+from metrics import registry
+from result_cache import ResultCache, canonicalizeUrl
+
+
+def test_canonicalize_drops_tracking_and_sorts_query():
+    assert (canonicalizeUrl("HTTPS://Shop.Example:443/p/1?utm_source=x&b=2&a=1&gclid=y#reviews")
+            == canonicalizeUrl("https://shop.example/p/1?a=1&b=2"))
+    assert canonicalizeUrl("https://shop.example/p/1?color=red") != canonicalizeUrl("https://shop.example/p/1?color=blue")
+
+
+def test_hit_after_set_under_a_tracking_variant():
+    cache = ResultCache()
+    cache.set("https://shop.example/p/1", {"TITLE": "Dress"})
+    assert cache.get("https://shop.example/p/1?utm_campaign=sale") == {"TITLE": "Dress"}
+    assert cache.get("https://shop.example/p/2") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_expiry_by_host_ttl_and_max_age(monkeypatch):
+    cache = ResultCache(default_ttl=60, host_ttls={"fast.example": 5})
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache.set("https://fast.example/p", {"TITLE": "A"})
+    cache.set("https://slow.example/p", {"TITLE": "B"})
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    assert cache.get("https://fast.example/p") is None
+    assert cache.get("https://slow.example/p") == {"TITLE": "B"}
+    assert cache.get("https://slow.example/p", max_age=5) is None
+
+
+def test_lru_eviction_and_disk_tier(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path=path, max_entries=2)
+    for number in range(3):
+        cache.set(f"https://shop.example/p/{number}", {"TITLE": str(number)})
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["memory_entries"] == 2
+    # The evicted entry is still on disk
+    assert cache.get("https://shop.example/p/0") == {"TITLE": "0"}
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+    reopened = ResultCache(path=path)
+    assert reopened.get("https://shop.example/p/2") == {"TITLE": "2"}
+    assert reopened.invalidate("https://shop.example/p/2")
+    assert reopened.get("https://shop.example/p/2") is None
+    reopened.close()
+
+
+def test_counters_reach_the_metrics_registry():
+    hits = registry.value("result_cache_hits")
+    misses = registry.value("result_cache_misses")
+    cache = ResultCache()
+    cache.set("https://shop.example/p", {"TITLE": "A"})
+    cache.get("https://shop.example/p")
+    cache.get("https://shop.example/q")
+    assert registry.value("result_cache_hits") == hits + 1
+    assert registry.value("result_cache_misses") == misses + 1
+
+
+def test_peek_reads_memory_only(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path=path)
+    cache.set("https://shop.example/p", {"TITLE": "A"})
+    cache.close()
+
+    reopened = ResultCache(path=path)
+    assert reopened.peek("https://shop.example/p") is None
+    assert reopened.stats()["misses"] == 0
+    assert reopened.get("https://shop.example/p") == {"TITLE": "A"}
+    # The disk hit was promoted to the memory tier
+    assert reopened.peek("https://shop.example/p") == {"TITLE": "A"}
+    reopened.close()
+
+
+def test_writes_reach_disk_in_the_background(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path=path, max_entries=1)
+    for number in range(50):
+        cache.set(f"https://shop.example/p/{number}", {"TITLE": str(number)})
+    # Evicted before or after its write, an entry is still found
+    assert cache.get("https://shop.example/p/0") == {"TITLE": "0"}
+    cache.flush()
+    assert len(cache.items()) == 50
+    cache.close()
+    assert len(ResultCache(path=path).items()) == 50
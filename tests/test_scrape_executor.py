@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from scrape_executor import ExecutorSaturated, ScrapeExecutor
+
+
+class BlockingScrape:
+    """
+    Fake scrape function that holds its worker until released.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, link, deadline=None):
+        self.started.set()
+        self.release.wait(5)
+        return {"TITLE": link}, {}
+
+
+@pytest.fixture
+def scrape():
+    scrape = BlockingScrape()
+    yield scrape
+    scrape.release.set()
+
+
+def test_rejects_beyond_in_flight_plus_queue(scrape):
+    executor = ScrapeExecutor(max_in_flight=1, max_queue=1)
+    try:
+        running = executor.submit(scrape, "a")
+        queued = executor.submit(scrape, "b")
+        with pytest.raises(ExecutorSaturated) as rejected:
+            executor.submit(scrape, "c")
+        # Two scrapes ahead on one worker at the default one second each
+        assert rejected.value.retry_after == 2
+        assert executor.pending == 2
+        scrape.release.set()
+        assert running.result(5)[0] == {"TITLE": "a"}
+        assert queued.result(5)[0] == {"TITLE": "b"}
+        assert executor.pending == 0
+    finally:
+        executor.shutdown()
+
+
+def test_bypass_queue_limit_admits_when_full(scrape):
+    executor = ScrapeExecutor(max_in_flight=1, max_queue=0)
+    try:
+        executor.submit(scrape, "a")
+        with pytest.raises(ExecutorSaturated):
+            executor.submit(scrape, "b")
+        bypassed = executor.submit(scrape, "b", bypass_queue_limit=True)
+        assert executor.pending == 2
+        scrape.release.set()
+        assert bypassed.result(5)[0] == {"TITLE": "b"}
+    finally:
+        executor.shutdown()
+
+
+def test_run_awaits_the_result():
+    executor = ScrapeExecutor(max_in_flight=2, max_queue=0)
+    try:
+        assert asyncio.run(executor.run(lambda link: link.upper(), "a", timeout=5)) == "A"
+    finally:
+        executor.shutdown()
+
+
+def test_saturated_item_request_answers_503(main, monkeypatch, scrape):
+    executor = ScrapeExecutor(max_in_flight=1, max_queue=0)
+    monkeypatch.setattr(main, "scrape_executor", executor)
+    monkeypatch.setattr(main, "getTimedData", scrape)
+    try:
+        executor.submit(scrape, "https://busy.example/p/1")
+        assert scrape.started.wait(5)
+        response = TestClient(main.app).get("/item", params={"url": "https://busy.example/p/2"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    finally:
+        scrape.release.set()
+        executor.shutdown()
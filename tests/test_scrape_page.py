@@ -0,0 +1,56 @@
+import pytest
+from price_parser import PRICE_SCRIPT
+
+JSONLD_PAGE = ('<html><head><title>Linen Dress</title><script type="application/ld+json">{"@type": "Product", '
+               '"name": "Linen Dress", "offers": {"price": "49.00", "priceCurrency": "USD"}}</script></head></html>')
+TAGS_PAGE = '<html><head><meta property="og:title" content="Linen Dress"></head></html>'
+
+
+class FakeDriver:
+    """
+    Answers the scripts scrapePage runs with a fixed page and a fixed price candidate.
+    """
+
+    def __init__(self, page, candidate=None):
+        self.page = page
+        self.candidate = candidate
+        self.scripts = []
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def get(self, url):
+        pass
+
+    @property
+    def page_source(self):
+        return self.page
+
+    def execute_script(self, script, *args):
+        if "readyState" in script:
+            return "jsonld"
+        if script == PRICE_SCRIPT:
+            self.scripts.append("price")
+            return self.candidate
+        self.scripts.append("facts")
+        return {"fragments": self.page, "selected": {}}
+
+
+@pytest.fixture(params=[True, False], ids=["browser_facts", "page_source"])
+def facts_mode(main, request, monkeypatch):
+    monkeypatch.setattr(main, "BROWSER_FACTS", request.param)
+    return request.param
+
+
+def test_static_price_skips_the_price_finder(main, facts_mode):
+    driver = FakeDriver(JSONLD_PAGE, {"text": "$10.00"})
+    item_fields, result_dict = main.scrapePage(driver, "https://static.example/p")
+    assert item_fields["PRICE"] == 49.0
+    assert "price" not in driver.scripts
+
+
+def test_price_finder_runs_without_static_price(main, facts_mode):
+    driver = FakeDriver(TAGS_PAGE, {"text": "$39.00", "path": "span", "compare_at": None, "candidates": 1})
+    item_fields, result_dict = main.scrapePage(driver, "https://dynamic.example/p")
+    assert (item_fields["PRICE"], item_fields["CURRENCY"]) == (39.0, "USD")
+    assert driver.scripts.count("price") == 1
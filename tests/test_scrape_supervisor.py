@@ -0,0 +1,56 @@
+import math
+import time
+import pytest
+from deadline import Deadline
+from scrape_supervisor import ScrapeSupervisor, _Worker
+
+
+def _silentWorker(conn):
+    # A worker stuck on every scrape: it reads the requests and never answers
+    while True:
+        try:
+            if conn.recv() is None:
+                break
+        except EOFError:
+            break
+
+
+@pytest.fixture
+def supervisor():
+    supervisor = ScrapeSupervisor(processes=1, scrape_timeout=30, result_grace=0.2)
+
+    def spawn():
+        parent_conn, child_conn = supervisor._context.Pipe()
+        process = supervisor._context.Process(target=_silentWorker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    supervisor._spawn = spawn
+    yield supervisor
+    supervisor.close()
+
+
+def test_timeout_defaults_to_the_deadline_plus_grace(supervisor):
+    assert supervisor.timeoutFor(()) == 30.2
+    assert supervisor.timeoutFor((Deadline(),)) == 30.2
+    assert math.isclose(supervisor.timeoutFor((Deadline(5),)), 5.2, abs_tol=0.05)
+
+
+def test_stuck_worker_is_restarted(supervisor):
+    supervisor.start()
+    stuck = supervisor._workers[0]
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        supervisor.scrapeLink("https://shop.example/p/1", Deadline(0.3))
+    assert time.monotonic() - started < 5
+    assert stuck.outstanding == {}
+    for _ in range(100):
+        if supervisor._workers[0] is not stuck:
+            break
+        time.sleep(0.05)
+    assert supervisor._workers[0] is not stuck
+    assert not stuck.process.is_alive()
+    assert supervisor._workers[0].process.is_alive()
+    # Stopping a stuck worker is not one of the early deaths that make the supervisor give up
+    assert supervisor._early_deaths == 0
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "item"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["item"] * 5
+    assert len(calls) == 1
+    assert (flight.leaders, flight.followers) == (1, 4)
+    assert flight.in_flight == 0
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("no fields")
+
+    async def run():
+        return await asyncio.gather(flight.do("key", work), flight.do("key", work), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_work_is_cancelled_when_every_caller_gives_up():
+    flight = SingleFlight()
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("key", work, timeout=0.05)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert cancelled == [True]
+    assert flight.in_flight == 0
+
+
+def test_one_caller_timing_out_leaves_the_others_waiting():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.1)
+        return "item"
+
+    async def run():
+        return await asyncio.gather(flight.do("key", work, timeout=0.01), flight.do("key", work, timeout=1),
+                                    return_exceptions=True)
+
+    impatient, patient = asyncio.run(run())
+    assert isinstance(impatient, asyncio.TimeoutError)
+    assert patient == "item"
@@ -0,0 +1,65 @@
+import pytest
+from bs4 import BeautifulSoup
+from static_price import extractStaticPrice, normalizeCurrency, offerPrice, parseAmount, parsePriceText
+
+
+def staticPrice(markup):
+    return extractStaticPrice(BeautifulSoup(markup, "html.parser"))
+
+
+@pytest.mark.parametrize("amount, expected", [
+    ("49", 49.0), ("1,299.99", 1299.99), ("1.299,99", 1299.99), ("1 299", 1299.0), (25, 25.0),
+    ("0", None), ("free", None), (True, None),
+])
+def test_parse_amount(amount, expected):
+    assert parseAmount(amount) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Sale price $49.00", (49.0, "USD")), ("29,99 €", (29.99, "EUR")), ("C$ 15", (15.0, "CAD")),
+    ("£1,200", (1200.0, "GBP")), ("EUR 12.50", (12.5, "EUR")), ("Size 12", None),
+])
+def test_parse_price_text(text, expected):
+    assert parsePriceText(text) == expected
+
+
+def test_bare_amount_needs_require_currency_off():
+    assert parsePriceText("19.99") is None
+    assert parsePriceText("19.99", require_currency=False) == (19.99, None)
+
+
+def test_normalize_currency():
+    assert normalizeCurrency("€") == "EUR"
+    assert normalizeCurrency("usd") == "USD"
+    assert normalizeCurrency("") is None
+
+
+def test_offer_price_takes_the_lowest_offer():
+    offers = [{"@type": "Offer", "price": "59.00", "priceCurrency": "USD"},
+              {"@type": "Offer", "price": 45, "priceCurrency": "USD"}]
+    assert offerPrice(offers) == (45.0, "USD")
+    assert offerPrice({"@type": "AggregateOffer", "lowPrice": "30", "priceCurrency": "EUR"}) == (30.0, "EUR")
+
+
+def test_jsonld_comes_first():
+    price = staticPrice('<script type="application/ld+json">{"@type": "Product", "name": "Dress", "offers": '
+                        '{"@type": "Offer", "price": "49.00", "priceCurrency": "EUR"}}</script>'
+                        '<div class="price">$10.00</div>')
+    assert (price["value"], price["currency"], price["source"]) == (49.0, "EUR", "jsonld")
+
+
+def test_microdata_and_meta_tags():
+    price = staticPrice('<span itemprop="price" content="19.99"></span><meta itemprop="priceCurrency" content="GBP">')
+    assert (price["value"], price["currency"], price["source"]) == (19.99, "GBP", "microdata")
+    price = staticPrice('<meta property="product:price:amount" content="25">'
+                        '<meta property="product:price:currency" content="CAD">')
+    assert (price["value"], price["currency"], price["source"]) == (25.0, "CAD", "meta")
+
+
+def test_crossed_out_price_is_skipped():
+    price = staticPrice('<div class="price"><del>$80.00</del> <span>$59.00</span></div>')
+    assert (price["value"], price["source"]) == (59.0, "text")
+
+
+def test_no_price():
+    assert staticPrice("<p>Out of stock</p>") is None
@@ -0,0 +1,78 @@
+import json
+from strategy_registry import StrategyRegistry
+
+URL = "https://www.shop.example/p/1"
+
+
+def recordPages(registry, count, attempted, sources, url=URL, tier="http"):
+    for _ in range(count):
+        registry.record(url, attempted, sources, tier)
+
+
+def test_default_plan_for_an_unknown_host():
+    plan = StrategyRegistry().plan(URL)
+    assert plan["order"] == ["jsonld", "tags"]
+    assert plan["skip"] == set()
+    assert plan["tier"] is None and plan["selectors"] == {}
+
+
+def test_learns_the_best_order_and_what_to_skip():
+    registry = StrategyRegistry(min_samples=3, reprobe_every=0)
+    recordPages(registry, 3, ["jsonld", "tags", "js_price"], {"TITLE": "tags", "BRAND": "tags"})
+    plan = registry.plan(URL)
+    assert plan["order"] == ["tags", "jsonld"]
+    assert plan["skip"] == {"js_price"}
+    assert registry.snapshot()["www.shop.example"]["strategies"]["tags"]["fields"] == {"TITLE": 3, "BRAND": 3}
+
+
+def test_reprobes_the_default_plan():
+    registry = StrategyRegistry(min_samples=1, reprobe_every=4)
+    recordPages(registry, 4, ["jsonld", "tags", "js_price"], {"TITLE": "tags"})
+    plan = registry.plan(URL)
+    assert plan["reprobe"] and plan["order"] == ["jsonld", "tags"] and plan["skip"] == set()
+
+
+def test_overrides_match_parent_domains():
+    registry = StrategyRegistry(overrides={"shop.example": {"order": ["tags"], "skip": ["network"], "tier": "browser",
+                                                            "selectors": {"BRAND": ".brand"}}})
+    plan = registry.plan(URL)
+    assert (plan["order"], plan["skip"], plan["tier"]) == (["tags"], {"network"}, "browser")
+    assert plan["selectors"] == {"BRAND": ".brand"}
+
+
+def test_state_survives_a_restart(tmp_path):
+    path = str(tmp_path / "strategy_state.json")
+    registry = StrategyRegistry(path=path, save_every=2)
+    recordPages(registry, 2, ["jsonld"], {"TITLE": "jsonld"})
+    assert json.load(open(path))["hosts"]["www.shop.example"]["pages"] == 2
+    assert StrategyRegistry(path=path).snapshot() == registry.snapshot()
+
+
+def test_saves_from_several_processes_add_up(tmp_path):
+    path = str(tmp_path / "strategy_state.json")
+    first, second = StrategyRegistry(path=path, save_every=100), StrategyRegistry(path=path, save_every=100)
+    recordPages(first, 3, ["jsonld"], {"TITLE": "jsonld"})
+    recordPages(second, 2, ["tags"], {"TITLE": "tags"}, url="https://other.example/p")
+    first.save()
+    second.save()
+    first.save()
+    state = json.load(open(path))["hosts"]
+    assert state["www.shop.example"]["pages"] == 3
+    assert state["other.example"]["pages"] == 2
+    # Each save picks up what the others saved
+    assert first.snapshot() == state
+
+
+def test_read_only_registry_journals_instead_of_saving(tmp_path):
+    path = str(tmp_path / "strategy_state.json")
+    worker = StrategyRegistry(path=path, save_every=1, read_only=True)
+    recordPages(worker, 2, ["jsonld"], {"TITLE": "jsonld"})
+    worker.save()
+    assert not (tmp_path / "strategy_state.json").exists()
+
+    parent = StrategyRegistry(path=path, save_every=100)
+    for url, attempted, sources, tier in worker.drainJournal():
+        parent.record(url, attempted, sources, tier)
+    assert worker.drainJournal() == []
+    parent.save()
+    assert json.load(open(path))["hosts"]["www.shop.example"]["pages"] == 2